@@ -1,26 +1,17 @@
-import chromadb
-from chromadb.config import Settings
-from datetime import datetime
+import os
+import sys
 
-client = chromadb.PersistentClient(path=".chroma_store")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "rl_search"))
+import version_store  # noqa: E402
+from version_store import store_versions  # noqa: E402,F401  (bulk API re-exported for scripts)
 
-collection = client.get_or_create_collection("chapter_versions")
+collection = version_store.get_collection()
 
 # rest of your code as before...
 
 
 def store_version(version_text, version_number):
-    doc_id=f"version_{version_number}"
-    metadata= {
-        "version": version_number,
-        "date":datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
-    collection.add(
-        ids=[doc_id],
-        documents=[version_text],
-        metadatas=[metadata]
-    )
-
+    version_store.store_version(version_text, version_number)
     print(f"✅ Stored version {version_number}")
 
 def view_all_versions():
@@ -0,0 +1,120 @@
+import re
+
+try:
+    import lxml.html
+except ImportError:  # optional: without lxml the scraper always uses the browser
+    lxml = None
+
+CONTENT_ID = "mw-content-text"
+
+# Elements that start/end their own line in Chromium's innerText; <p> gets a blank line
+_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "caption", "center", "dd", "div", "dl", "dt",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "pre", "section", "table", "tbody", "thead", "tfoot",
+    "tr", "ul",
+}
+_SKIP_TAGS = {"script", "style", "noscript", "template", "head", "title", "meta", "link"}
+_COLLAPSIBLE = re.compile(r"[ \t\r\n\f]+")
+_HIDDEN_STYLE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.I)
+
+
+def available():
+    return lxml is not None
+
+
+def _is_hidden(el):
+    return el.get("hidden") is not None or bool(_HIDDEN_STYLE.search(el.get("style") or ""))
+
+
+def inner_text(root):
+    """
+    Approximate ``element.innerText`` as Chromium renders it, from static HTML.
+
+    Whitespace is collapsed as for ``white-space: normal`` (kept inside
+    <pre>), <br> becomes a newline, block elements sit on their own lines,
+    paragraphs are separated by a blank line, table cells by tabs, and
+    script/style/hidden elements are dropped.
+    """
+    items = []   # str chunks and int "required line break" counts
+
+    def add_text(s, pre):
+        if s:
+            items.append(s if pre else _COLLAPSIBLE.sub(" ", s))
+
+    def walk(el, pre):
+        if not isinstance(el.tag, str):   # comments / processing instructions
+            return
+        tag = el.tag.lower()
+        if tag in _SKIP_TAGS or _is_hidden(el):
+            return
+        if tag == "br":
+            items.append("\n")
+            return
+
+        pre = pre or tag in ("pre", "textarea")
+        breaks = 2 if tag == "p" else (1 if tag in _BLOCK_TAGS else 0)
+        if breaks:
+            items.append(breaks)
+        add_text(el.text, pre)
+        for child in el:
+            walk(child, pre)
+            add_text(child.tail, pre)
+        if tag in ("td", "th"):
+            items.append("\t")
+        if breaks:
+            items.append(breaks)
+
+    walk(root, False)
+
+    out = []
+    pending = 0
+    for item in items:
+        if isinstance(item, int):
+            pending = max(pending, item)
+            continue
+        if item == " " and (pending or not out or out[-1].endswith("\n")):
+            continue   # collapsible whitespace between blocks is not rendered
+        if pending and out:
+            out.append("\n" * pending)
+        pending = 0
+        out.append(item)
+
+    # Collapsed spaces next to line breaks are not rendered
+    lines = [re.sub(r" {2,}", " ", line).strip(" \t") for line in "".join(out).split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+def extract_content(html):
+    """
+    Return ``(title, text)`` of ``#mw-content-text`` from a static page, or
+    None when the element is missing/empty (e.g. the page is built by JS).
+    """
+    if lxml is None:
+        return None
+    doc = lxml.html.fromstring(html)
+    nodes = doc.xpath(f'//*[@id="{CONTENT_ID}"]')
+    if not nodes:
+        return None
+    text = inner_text(nodes[0])
+    if not text.strip():
+        return None
+    title = (doc.findtext(".//title") or "").strip()
+    return title, text
+
+
+def extract_links(html, base_url, root_id=CONTENT_ID):
+    """All href values inside ``#root_id`` (document order), for index discovery."""
+    if lxml is None:
+        return None
+    doc = lxml.html.fromstring(html)
+    doc.make_links_absolute(base_url)
+    nodes = doc.xpath(f'//*[@id="{root_id}"]')
+    if not nodes:
+        return []
+    return [a.get("href") for a in nodes[0].iter("a") if a.get("href")]
+
+
+def normalize_for_parity(text):
+    """Whitespace-insensitive form used to compare HTTP vs. browser extraction."""
+    return "\n".join(" ".join(line.split()) for line in text.splitlines() if line.strip())
@@ -1,5 +1,21 @@
-from playwright.sync_api import sync_playwright
+from datetime import datetime
+from urllib.parse import urljoin, urlparse, unquote
+import argparse
+import asyncio
+import hashlib
+import json
 import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import html_extract
+import screenshot_stage
 
 # URL of the chapter to scrape
 url = "https://en.wikisource.org/wiki/The_Gates_of_Morning/Book_1/Chapter_1"
@@ -7,29 +23,466 @@ url = "https://en.wikisource.org/wiki/The_Gates_of_Morning/Book_1/Chapter_1"
 output_dir = "scraper/output" # directory to save output
 os.makedirs(output_dir,exist_ok=True)
 
-def scrape_chapter():
-    with sync_playwright() as p:
-        browser=p.chromium.launch(headless=True)
-        page=browser.new_page()
-        page.goto(url)
+CONTENT_SELECTOR = "#mw-content-text"
+LEGACY_TEXT_NAME = "chapter1_content.txt"   # what spin_writer_ollama.py reads by default
+
+
+# ------------------------------
+# Multi-chapter crawler (one browser, pooled pages)
+# ------------------------------
+def chapter_slug(chapter_url):
+    """'…/wiki/The_Gates_of_Morning/Book_1/Chapter_1' → 'The_Gates_of_Morning__Book_1__Chapter_1'."""
+    path = unquote(urlparse(chapter_url).path)
+    path = re.sub(r"^/wiki/", "", path).strip("/") or urlparse(chapter_url).netloc
+    return re.sub(r"[^\w.-]+", "_", path.replace("/", "__"))
+
+
+class HostRateLimiter:
+    """Allows at most ``per_second`` request starts per host (shared by all pages)."""
+
+    def __init__(self, per_second=1.0):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, target_url):
+        host = urlparse(target_url).netloc
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+async def discover_chapter_urls(page, index_url, link_selector=f"{CONTENT_SELECTOR} a[href]"):
+    """
+    Collect chapter links from a book index page: links under the index's
+    own path (e.g. …/The_Gates_of_Morning/…), in page order, de-duplicated.
+    """
+    await page.goto(index_url)
+    hrefs = await page.locator(link_selector).evaluate_all("els => els.map(e => e.getAttribute('href'))")
+
+    index_path = urlparse(index_url).path.rstrip("/") + "/"
+    chapter_urls = []
+    for href in hrefs:
+        absolute = urljoin(index_url, href).split("#")[0]
+        if urlparse(absolute).path.startswith(index_path) and absolute not in chapter_urls:
+            chapter_urls.append(absolute)
+    return chapter_urls
+
+
+# ------------------------------
+# Incremental ingest state (per chapter URL)
+# ------------------------------
+STATE_PATH = os.path.join(output_dir, "ingest_state.sqlite3")
+
+
+class IngestState:
+    """ETag / Last-Modified / body + content hashes per chapter URL, in SQLite."""
+
+    def __init__(self, path=STATE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS chapters (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body_sha256 TEXT,
+            content_sha256 TEXT,
+            entry TEXT,
+            checked_at TEXT
+        )
+        """)
+        self._conn.commit()
+
+    def get(self, chapter_url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body_sha256, content_sha256, entry FROM chapters WHERE url = ?",
+                (chapter_url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "body_sha256": row[2],
+            "content_sha256": row[3],
+            "entry": json.loads(row[4]) if row[4] else None,
+        }
+
+    def put(self, chapter_url, probe, entry):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chapters VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    chapter_url,
+                    probe.get("etag"),
+                    probe.get("last_modified"),
+                    probe.get("body_sha256"),
+                    entry.get("sha256"),
+                    json.dumps(entry, ensure_ascii=False),
+                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                ),
+            )
+            self._conn.commit()
+
+
+# Pooled HTTP client shared by probes and the non-browser extraction path
+_http = requests.Session()
+_http.mount("http://", HTTPAdapter(pool_maxsize=16))
+_http.mount("https://", HTTPAdapter(pool_maxsize=16))
+
+
+def probe_chapter(chapter_url, previous=None, timeout=30):
+    """
+    Cheap change check without a browser: a conditional GET with the stored
+    ETag / Last-Modified. 304 → unchanged; otherwise the body hash decides.
+    """
+    headers = {}
+    if previous and previous.get("etag"):
+        headers["If-None-Match"] = previous["etag"]
+    if previous and previous.get("last_modified"):
+        headers["If-Modified-Since"] = previous["last_modified"]
+
+    response = _http.get(chapter_url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and previous:
+        return {**previous, "changed": False}
+    response.raise_for_status()
+
+    body_sha256 = hashlib.sha256(response.content).hexdigest()
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "body_sha256": body_sha256,
+        "changed": not previous or previous.get("body_sha256") != body_sha256,
+        "html": response.text,   # reused by the HTTP extraction path
+    }
+
+
+def _write_chapter(book_dir, chapter_url, title, content, started, backend, extra=None):
+    slug = chapter_slug(chapter_url)
+    text_path = os.path.join(book_dir, f"{slug}_content.txt")
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    entry = {"url": chapter_url, "slug": slug, "title": title, **(extra or {})}
+    entry.update({
+        "text_path": text_path,
+        "chars": len(content),
+        "sha256": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+        "backend": backend,
+        "fetched_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.perf_counter() - started, 3),
+        "status": "ok",
+    })
+    return entry
+
+
+async def _fetch_chapter(page, chapter_url, book_dir, shot_options=None):
+    """Browser path: render with Chromium, optionally capture screenshot tiles."""
+    started = time.perf_counter()
+    await page.goto(chapter_url)
+    extra = {}
+
+    if shot_options is not None:
+        out_base = os.path.join(book_dir, chapter_slug(chapter_url))
+        extra["screenshot"] = await screenshot_stage.capture(page, out_base, **shot_options)
+
+    content = await page.locator(CONTENT_SELECTOR).inner_text()
+    return _write_chapter(book_dir, chapter_url, await page.title(), content, started, "browser", extra)
+
+
+def fetch_chapter_http(chapter_url, html=None, timeout=30):
+    """
+    Non-browser path: pooled HTTP GET + lxml parse of #mw-content-text.
+
+    Returns ``(title, text)``, or None when the page needs the browser
+    (content missing/empty in the static HTML, or lxml not installed).
+    """
+    if not html_extract.available():
+        return None
+    if html is None:
+        response = _http.get(chapter_url, timeout=timeout)
+        response.raise_for_status()
+        html = response.text
+    return html_extract.extract_content(html)
+
+
+class LazyBrowser:
+    """Launches Chromium only when a page actually needs it; pages are pooled."""
+
+    def __init__(self, max_pages):
+        self.max_pages = max(1, max_pages)
+        self.launches = 0
+        self._pages = asyncio.Queue()
+        self._created = 0
+        self._lock = asyncio.Lock()
+        self._playwright = self._browser = self._context = None
+
+    async def acquire(self):
+        async with self._lock:
+            if self._context is None:
+                # Imported here so HTTP-only crawls work without Playwright installed
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self._context = await self._browser.new_context()
+                self.launches += 1
+            if self._pages.empty() and self._created < self.max_pages:
+                self._created += 1
+                return await self._context.new_page()
+        return await self._pages.get()
+
+    def release(self, page):
+        self._pages.put_nowait(page)
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            await self._playwright.stop()
+
+
+def _write_manifest(book_dir, manifest):
+    manifest_path = os.path.join(book_dir, "manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest_path
+
+
+def _screenshot_summary(chapters, mode, shot_options):
+    shots = [c["screenshot"] for c in chapters if isinstance(c.get("screenshot"), dict)]
+    return {
+        "mode": mode,
+        **(shot_options or {}),
+        "captured": sum(1 for s in shots if s.get("status") == "ok"),
+        "pending": sum(1 for s in shots if s.get("status") == "pending"),
+        "tiles": sum(len(s.get("tiles", [])) for s in shots),
+        "truncated": sum(1 for s in shots if s.get("truncated")),
+        "bytes": sum(s.get("bytes", 0) for s in shots),
+        "seconds": round(sum(s.get("seconds", 0) for s in shots), 3),
+    }
+
+
+async def crawl(chapter_urls=None, index_url=None, book_dir=None, concurrency=4,
+                per_host_per_second=1.0, screenshots=screenshot_stage.SCREENSHOT_MODE,
+                incremental=False, backend="auto", screenshot_format=screenshot_stage.SCREENSHOT_FORMAT,
+                screenshot_quality=screenshot_stage.SCREENSHOT_QUALITY, max_tiles=screenshot_stage.MAX_TILES):
+    """
+    Scrape many chapters with at most one Chromium launch.
+
+    Pass ``chapter_urls`` or a book ``index_url`` (chapter links are
+    discovered from it). Requests are rate-limited per host and each chapter
+    is written to ``<book_dir>/<slug>_content.txt``. A ``manifest.json``
+    listing every chapter, in input order, is written once the text is in.
+
+    ``backend``:
+    - "http"/"auto": static pages are fetched over pooled HTTP and parsed
+      with lxml; only pages whose content is missing from the static HTML
+      (JS-built) or that need an inline screenshot go to the browser
+    - "browser": every page is rendered with Chromium (pooled tabs)
+
+    ``screenshots`` (True/False still accepted):
+    - "inline": capture while the chapter is rendered (text waits for it)
+    - "deferred": text is written first; screenshots run as a background
+      queue on the pooled browser and the manifest is rewritten when done
+    - "off" (default): no screenshots, so HTTP-extractable pages never
+      launch Chromium
+    Screenshots are viewport tiles (``<slug>_screenshot_<n>.<ext>``) in
+    ``screenshot_format`` (webp/jpeg/png) at ``screenshot_quality``; their
+    sizes and timings are recorded per chapter and summed in the manifest.
+
+    With ``incremental=True`` each chapter is first probed with a conditional
+    HTTP request; unchanged chapters skip rendering and screenshots and are
+    marked ``"changed": false`` in the manifest so downstream stages (spin,
+    score) can skip them too. A re-fetched chapter whose extracted text hash
+    is unchanged is also marked unchanged.
+    """
+    if not chapter_urls and not index_url:
+        raise ValueError("Pass chapter_urls or index_url")
+
+    mode = screenshot_stage.normalize_mode(screenshots)
+    shot_options = None if mode == "off" else {
+        "fmt": screenshot_format, "quality": screenshot_quality, "max_tiles": max_tiles,
+    }
+    book_dir = book_dir or os.path.join(output_dir, chapter_slug(index_url or chapter_urls[0]))
+    os.makedirs(book_dir, exist_ok=True)
+    limiter = HostRateLimiter(per_host_per_second)
+    state = IngestState() if incremental else None
+    browser = LazyBrowser(concurrency)
+    use_http = backend != "browser" and html_extract.available()
+    shot_tasks = []
+    started = time.perf_counter()
+
+    async def deferred_screenshot(chapter_url, entry, probe):
+        out_base = os.path.join(book_dir, entry["slug"])
+        entry["screenshot"] = await screenshot_stage.capture_url(
+            browser, limiter, chapter_url, out_base, **shot_options
+        )
+        if state is not None:
+            state.put(chapter_url, probe, entry)
+
+    try:
+        if index_url:
+            await limiter.wait(index_url)
+            links = None
+            if use_http:
+                response = await asyncio.to_thread(_http.get, index_url, timeout=30)
+                response.raise_for_status()
+                links = html_extract.extract_links(response.text, index_url)
+            if links is None:
+                page = await browser.acquire()
+                try:
+                    links = await discover_chapter_urls(page, index_url)
+                finally:
+                    browser.release(page)
+            index_path = urlparse(index_url).path.rstrip("/") + "/"
+            discovered = []
+            for link in links:
+                link = link.split("#")[0]
+                if urlparse(link).path.startswith(index_path) and link not in discovered:
+                    discovered.append(link)
+            chapter_urls = list(chapter_urls or []) + discovered
+            print(f"Discovered {len(discovered)} chapters from {index_url}")
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def worker(chapter_url):
+            async with semaphore:
+                try:
+                    probe = previous = None
+                    if state is not None:
+                        previous = state.get(chapter_url)
+                        await limiter.wait(chapter_url)
+                        probe = await asyncio.to_thread(probe_chapter, chapter_url, previous)
+                        old_entry = previous and previous.get("entry")
+                        if not probe["changed"] and old_entry and os.path.exists(old_entry.get("text_path", "")):
+                            print(f"⏭️ {chapter_url} unchanged, skipped")
+                            return {**old_entry, "status": "unchanged", "changed": False}
+
+                    entry = None
+                    if use_http and mode != "inline":
+                        t0 = time.perf_counter()
+                        html = probe.get("html") if probe else None
+                        if html is None:
+                            await limiter.wait(chapter_url)
+                        extracted = await asyncio.to_thread(fetch_chapter_http, chapter_url, html)
+                        if extracted:
+                            title, content = extracted
+                            entry = _write_chapter(book_dir, chapter_url, title, content, t0, "http")
+
+                    if entry is None:
+                        # The page is rendered anyway, so capture it now even in deferred mode
+                        page = await browser.acquire()
+                        try:
+                            await limiter.wait(chapter_url)
+                            entry = await _fetch_chapter(page, chapter_url, book_dir, shot_options)
+                        finally:
+                            browser.release(page)
+
+                    entry["changed"] = True
+                    if state is not None:
+                        entry["changed"] = not previous or previous.get("content_sha256") != entry["sha256"]
+                        state.put(chapter_url, probe, entry)
+                    if mode == "deferred" and "screenshot" not in entry:
+                        entry["screenshot"] = {"status": "pending"}
+                        shot_tasks.append(asyncio.create_task(deferred_screenshot(chapter_url, entry, probe)))
+                    print(f"✅ {chapter_url} → {entry['text_path']} ({entry['backend']})")
+                    return entry
+                except Exception as e:
+                    print(f"❌ {chapter_url}: {e}")
+                    return {"url": chapter_url, "slug": chapter_slug(chapter_url), "status": "error", "error": str(e)}
+
+        chapters = await asyncio.gather(*(worker(u) for u in chapter_urls))
+        text_seconds = round(time.perf_counter() - started, 3)
+
+        manifest = {
+            "index_url": index_url,
+            "incremental": incremental,
+            "backend": backend,
+            "changed": sum(1 for c in chapters if c.get("changed")),
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "text_seconds": text_seconds,
+            "chapters": chapters,
+        }
+
+        def finish():
+            manifest["browser_launches"] = browser.launches
+            manifest["screenshots"] = _screenshot_summary(chapters, mode, shot_options)
+            manifest["seconds"] = round(time.perf_counter() - started, 3)
+            return _write_manifest(book_dir, manifest)
+
+        manifest_path = finish()
+        print(f"Manifest saved at {manifest_path} (text ready in {text_seconds:.1f}s)")
+
+        if shot_tasks:
+            print(f"📸 Capturing {len(shot_tasks)} deferred screenshots...")
+            await asyncio.gather(*shot_tasks)
+            finish()
+            shots = manifest["screenshots"]
+            print(f"📸 {shots['captured']} screenshots, {shots['tiles']} tiles, "
+                  f"{shots['bytes'] / 1024:.0f} KB — manifest updated")
+    finally:
+        await browser.close()
+
+    return manifest
 
-        #Take screenshot(Full page)
-        screenshot_path=os.path.join(output_dir,"chapter1_screenshot.png") #path of ss
-        page.screenshot(path=screenshot_path, full_page=True)
-        print(f"Screenshot saved at {screenshot_path}")
 
-        # Extract text content
-        content = page.locator("#mw-content-text").inner_text()
+def scrape_default(chapter_url=None, out_dir=None, **crawl_options):
+    """
+    Crawl the single default chapter (how ``main.py`` runs this script).
 
-        #Save content to text file
-        text_path = os.path.join(output_dir,"chapter1_content.txt")
-        with open(text_path, "w",encoding="utf-8") as f:
-            f.write(content)
-        print(f"Chapter content saved at {text_path}")  
+    Uses ``crawl()`` like any other run, then copies the chapter text to
+    ``<out_dir>/chapter1_content.txt`` where the spin step expects it.
+    Returns the manifest.
+    """
+    chapter_url = chapter_url or url
+    out_dir = out_dir or output_dir
+    manifest = asyncio.run(crawl([chapter_url], book_dir=out_dir, **crawl_options))
+    entry = manifest["chapters"][0]
+    if entry.get("status") == "error":
+        raise RuntimeError(f"Scraping {chapter_url} failed: {entry['error']}")
+    text_path = os.path.join(out_dir, LEGACY_TEXT_NAME)
+    shutil.copyfile(entry["text_path"], text_path)
+    print(f"Chapter content saved at {text_path}")
+    return manifest
 
-        browser.close()  
 
 if __name__ == "__main__":
-    scrape_chapter()
-      
+    parser = argparse.ArgumentParser(description="Scrape chapter text (and screenshots) from Wikisource.")
+    parser.add_argument("urls", nargs="*", help="Chapter URLs to crawl")
+    parser.add_argument("--index", help="Book index URL; chapter links are discovered from it")
+    parser.add_argument("--out", help="Output directory for this book (default: scraper/output/<slug>)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pages fetched in parallel")
+    parser.add_argument("--rate", type=float, default=1.0, help="Max requests per second per host")
+    parser.add_argument("--screenshots", choices=["inline", "deferred", "off"],
+                        default=screenshot_stage.SCREENSHOT_MODE,
+                        help="inline: capture with the text; deferred: background queue after text; "
+                             "off (default): no screenshots")
+    parser.add_argument("--no-screenshots", action="store_true", help="Same as --screenshots off")
+    parser.add_argument("--screenshot-format", choices=["webp", "jpeg", "png"],
+                        default=screenshot_stage.SCREENSHOT_FORMAT)
+    parser.add_argument("--screenshot-quality", type=int, default=screenshot_stage.SCREENSHOT_QUALITY,
+                        help="WebP/JPEG quality (1-100)")
+    parser.add_argument("--max-tiles", type=int, default=screenshot_stage.MAX_TILES,
+                        help="Viewport tiles captured per chapter; longer pages are cut off with a warning (0 = no cap)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Skip chapters whose ETag/Last-Modified/content hash is unchanged")
+    parser.add_argument("--backend", choices=["auto", "http", "browser"], default="auto",
+                        help="auto/http: lxml over HTTP, browser only when needed; browser: always Chromium")
+    args = parser.parse_args()
 
+    options = dict(
+        concurrency=args.concurrency, per_host_per_second=args.rate,
+        screenshots="off" if args.no_screenshots else args.screenshots,
+        incremental=args.incremental, backend=args.backend,
+        screenshot_format=args.screenshot_format,
+        screenshot_quality=args.screenshot_quality, max_tiles=args.max_tiles,
+    )
+    if args.urls or args.index:
+        asyncio.run(crawl(args.urls, args.index, args.out, **options))
+    else:
+        scrape_default(out_dir=args.out, **options)
@@ -1,28 +1,32 @@
 # auth.py
-import os
-import streamlit as st
-from supabase import create_client, Client
+import time
 
-def _get_keys():
-    # Prefer Streamlit secrets → then env vars
-    url = st.secrets.get("SUPABASE_URL", os.getenv("SUPABASE_URL"))
-    key = st.secrets.get("SUPABASE_ANON_KEY", os.getenv("SUPABASE_ANON_KEY"))
-    if not url or not key:
-        raise RuntimeError(
-            "Supabase keys missing. Set SUPABASE_URL and SUPABASE_ANON_KEY "
-            "in .streamlit/secrets.toml or environment variables."
-        )
-    return url, key
+import streamlit as st
+from supabase import Client
+from supabase_client import get_client
 
-@st.cache_resource
 def get_supabase() -> Client:
-    url, key = _get_keys()
-    return create_client(url, key)
+    # Shared process-wide client (one connection pool), see supabase_client
+    return get_client("anon")
 
 def current_user():
     # Cached in session_state for UI speed
     return st.session_state.get("sb_user")
 
+def current_access_token():
+    # JWT of the signed-in user's session, refreshed shortly before it
+    # expires; queued writes are sent with it
+    session = st.session_state.get("sb_session")
+    if session is None:
+        return None
+    if (getattr(session, "expires_at", None) or 0) - time.time() < 60:
+        try:
+            session = get_supabase().auth.refresh_session(session.refresh_token).session
+        except Exception:
+            return None
+        st.session_state["sb_session"] = session
+    return getattr(session, "access_token", None)
+
 def login(email: str, password: str):
     sb = get_supabase()
     res = sb.auth.sign_in_with_password({"email": email, "password": password})
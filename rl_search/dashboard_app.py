@@ -1,29 +1,34 @@
 import streamlit as st
-import chromadb
-from chromadb.config import Settings
 from datetime import datetime
 import pandas as pd
 import os
-import matplotlib.pyplot as plt
 import subprocess
-import requests
 import sys
 from difflib import unified_diff
 
 # 🔑 Custom imports
-from smart_reward_function import compute_reward
+from smart_reward_function import REWARD_VERSION, compute_reward
+from incremental_scorer import IncrementalScorer
 from nlp_utils import correct_grammar_and_style, extract_keywords, check_plagiarism
 from auth import require_auth_ui, signout as sb_signout
-from database import save_document, log_reward
-from supabase_client import SupabaseClient
+from database import get_outbox, resume_sync, save_document, log_reward
 from feedback_engine import run_feedback_ui   # ✅ Uses your added UI
+from leaderboard_service import get_leaderboard_service
+from metrics_store import get_metrics_store
+from model_registry import load_timings
+from reward_registry import current_version
+from rl_search_algorithm import BackgroundRescorer
+from ollama_client import generate as ollama_generate, throttled
+from version_store import (
+    NEAR_DUPLICATE_THRESHOLD, allocate_version, collection_for, count_versions, duplicate_candidates,
+    forget_collection, get_best_index, get_client, get_collection, get_documents, get_version_counter,
+    list_versions, similar_versions, store_version,
+)
 
 # ---------------- App Config (place before any UI output) ----------------
 st.set_page_config(page_title="📊 Project Dashboard", layout="wide")
 
 # ---------------- Session / Clients ----------------
-if "supabase" not in st.session_state:
-    st.session_state.supabase = SupabaseClient()
 if "user" not in st.session_state:
     st.session_state["user"] = {"id": None, "email": None}
 
@@ -36,8 +41,6 @@ for k, v in {
 }.items():
     st.session_state.setdefault(k, v)
 
-supabase = st.session_state.supabase
-
 # ---------------- Authentication ----------------
 user = require_auth_ui()
 if user:
@@ -53,115 +56,228 @@ if st.sidebar.button("Sign out"):
 
 user_id = st.session_state["user"]["id"]
 
+# Heavy models load lazily on first use; show what has been loaded so far
+with st.sidebar.expander("⏱️ Model load timings"):
+    timings = load_timings()
+    if timings:
+        st.json(timings)
+    else:
+        st.caption("No models loaded yet.")
+
 # ---------------- Chroma setup ----------------
 # If you ever move this to another machine, just keep the same folder name.
-client = chromadb.PersistentClient(path=".chroma_store")
-collection_name = "chapter_versions"
-collection = client.get_or_create_collection(collection_name)
+# chapter_versions unless CHROMA_LAYOUT=tenant gives each user their own
+# collection; every read, write and version number below uses this one.
+client = get_client()
+collection = collection_for(user_id=user_id)
+collection_name = collection.name
+
+# Stored scores from older reward versions are re-scored in the background,
+# never inside a page render
+@st.cache_resource
+def get_background_rescorer(name):
+    return BackgroundRescorer(get_collection(name)).start()
+
+with st.sidebar.expander("🔁 Reward re-scoring"):
+    st.json(get_background_rescorer(collection_name).status())
+
+# Supabase writes are queued locally and synced in the background
+resume_sync()
+with st.sidebar.expander("☁️ Supabase sync"):
+    sync = get_outbox().status()
+    st.json(sync)
+    if sync["dead"] and st.button("🔁 Retry failed syncs"):
+        get_outbox().requeue_dead()
 
 # ---------------- Helpers ----------------
-def get_collection_stats():
+PAGE_SIZE = 20
+
+def get_version_count():
     try:
-        return collection.get(include=["documents", "metadatas"])
+        return count_versions(collection)
     except Exception:
-        return None
+        return 0
+
+# Pages and bodies are cached per collection and size (a new save invalidates
+# them); the short TTL covers in-place upserts that keep the size unchanged.
+# The cache is shared by every session, so the collection name is part of the key
+@st.cache_data(show_spinner=False, ttl=60)
+def get_version_page(name, page, page_size, total):
+    return list_versions(limit=page_size, offset=page * page_size, collection=get_collection(name))
+
+@st.cache_data(show_spinner=False, ttl=60)
+def get_version_texts(name, ids, total):
+    return get_documents(list(ids), collection=get_collection(name))
 
 def reset_collection():
     try:
+        # The cached re-scorer holds the old collection handle: stop it and let
+        # the next run build one on the new collection
+        get_background_rescorer(collection_name).stop()
+        get_background_rescorer.clear()
         client.delete_collection(collection_name)
+        forget_collection(collection_name)
+        get_version_counter().reset(collection_name)
+        get_best_index().forget(collection_name)
+        get_version_page.clear()
+        get_version_texts.clear()
         st.success(f"✅ Collection '{collection_name}' reset.")
     except Exception as e:
         st.error(f"❌ Error deleting collection: {e}")
 
+# The leaderboard service tails the metrics store and keeps the aggregates in
+# memory; frames are cached per data version, so a tab switch is a lookup
+@st.cache_resource
+def get_leaderboard():
+    return get_leaderboard_service()
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def get_leaderboard_frames(reward_version, data_version):
+    view = get_leaderboard().view(reward_version)
+    best = pd.DataFrame(view["leaderboard"])
+    progression = pd.DataFrame(view["progression"])
+    if not progression.empty:
+        progression = progression.set_index("id")[["score", "rolling_avg"]]
+    best_by_version = pd.DataFrame(view["best_by_version"])
+    if not best_by_version.empty:
+        best_by_version = best_by_version.set_index("version")
+    return view["rows"], best, progression, best_by_version
+
 def show_leaderboard():
-    log_file = "reward_progression_log.csv"
-    if os.path.exists(log_file):
-        df = pd.read_csv(log_file)
-
-        st.subheader("📊 Reward Progression Log")
-        st.dataframe(df)
-
-        if not df.empty and "Version" in df.columns and "Final Score" in df.columns:
-            plt.figure(figsize=(8, 4))
-            plt.plot(df["Version"], df["Final Score"], marker="o")
-            plt.title("Reward Progression Over Versions")
-            plt.xlabel("Version")
-            plt.ylabel("Final Score")
-            st.pyplot(plt)
-            plt.close()
-    else:
-        st.warning("⚠️ No reward_progression_log.csv found.")
+    service = get_leaderboard()
+    # Scores from different reward formulas are not comparable; rows
+    # written before versioning are listed as "unversioned"
+    include_all = st.checkbox("Include scores from other reward versions", value=False)
+    reward_version = None if include_all else current_version()
+
+    service.refresh()
+    rows, best, progression, best_by_version = get_leaderboard_frames(reward_version, service.data_version)
+    if not rows:
+        st.warning("⚠️ No reward metrics recorded yet.")
+        return
+
+    label = "all reward versions" if include_all else f"reward {reward_version}"
+    st.subheader(f"🏆 Best Score per Version ({label})")
+    st.caption(f"{rows} scored row(s)")
+    st.dataframe(best)
+
+    st.subheader("📈 Reward Progression")
+    st.line_chart(progression)
+    st.subheader("📊 Best Score by Version")
+    st.line_chart(best_by_version)
 
 def preload_sample_document():
     try:
-        collection.add(
-            documents=["This is a test document for debugging."],
-            metadatas=[{"version": "0", "date": "2025-07-02 16:00:00"}],
-            ids=["version_0"],
+        store_version(
+            "This is a test document for debugging.", 0, metadata={"date": "2025-07-02 16:00:00"},
+            collection=collection,
         )
         st.success("✅ Sample document added to collection.")
     except Exception as e:
         st.error(f"❌ Error adding sample document: {e}")
 
 def show_version_summary():
-    results = get_collection_stats()
-    if results and results.get("documents"):
-        st.subheader("📖 Version Summary")
-        for doc, meta in zip(results["documents"], results["metadatas"]):
-            st.markdown(
-                f"**Version {meta.get('version','?')} (Date: {meta.get('date','?')})**"
-            )
-            st.code(doc)
-    else:
+    total = get_version_count()
+    if not total:
         st.info("ℹ️ No documents found in collection.")
+        return
+
+    st.subheader("📖 Version Summary")
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = st.number_input(f"Page (1-{pages}, newest first)", 1, pages, 1) - 1
+    st.caption(f"{total} versions")
+
+    # Metadata only; bodies are fetched (in one call) for the rows whose
+    # "Show text" box is ticked
+    rows = get_version_page(collection_name, page, PAGE_SIZE, total)
+    wanted = tuple(row["id"] for row in rows if st.session_state.get(f"show_{row['id']}"))
+    texts = get_version_texts(collection_name, wanted, total) if wanted else {}
+    for row in rows:
+        st.markdown(f"**Version {row.get('version','?')} (Date: {row.get('date','?')})**")
+        if st.checkbox("Show text", key=f"show_{row['id']}"):
+            st.code(texts.get(row["id"], ""))
 
 def show_version_differences():
-    results = get_collection_stats()
-    if results and results.get("documents") and len(results["documents"]) >= 2:
-        st.subheader("🔍 Compare Document Versions")
-        version_options = [
-            f"Version {meta.get('version','?')}" for meta in results["metadatas"]
-        ]
-        idx1 = st.selectbox(
-            "Select first version:",
-            list(range(len(version_options))),
-            format_func=lambda i: version_options[i],
-        )
-        idx2 = st.selectbox(
-            "Select second version:",
-            list(range(len(version_options))),
-            format_func=lambda i: version_options[i],
-            index=1 if len(version_options) > 1 else 0,
-        )
-
-        doc1 = results["documents"][idx1]
-        doc2 = results["documents"][idx2]
-
-        diff = unified_diff(
-            doc1.splitlines(),
-            doc2.splitlines(),
-            lineterm="",
-            fromfile="Version A",
-            tofile="Version B",
-        )
-
-        st.write("### 🧾 Diff")
-        st.code("\n".join(diff))
-    else:
+    total = get_version_count()
+    if total < 2:
         st.warning("⚠️ Need at least two documents to compare.")
+        return
+
+    st.subheader("🔍 Compare Document Versions")
+    # Metadata for the picker; only the two selected bodies are loaded
+    rows = get_version_page(collection_name, 0, total, total)
+    version_options = [f"Version {row.get('version','?')}" for row in rows]
+    idx1 = st.selectbox(
+        "Select first version:",
+        list(range(len(version_options))),
+        format_func=lambda i: version_options[i],
+    )
+    idx2 = st.selectbox(
+        "Select second version:",
+        list(range(len(version_options))),
+        format_func=lambda i: version_options[i],
+        index=1 if len(version_options) > 1 else 0,
+    )
+
+    id1, id2 = rows[idx1]["id"], rows[idx2]["id"]
+    texts = get_version_texts(collection_name, tuple(sorted({id1, id2})), total)
+    doc1 = texts.get(id1, "")
+    doc2 = texts.get(id2, "")
+
+    diff = unified_diff(
+        doc1.splitlines(),
+        doc2.splitlines(),
+        lineterm="",
+        fromfile="Version A",
+        tofile="Version B",
+    )
+
+    st.write("### 🧾 Diff")
+    st.code("\n".join(diff))
+
+def show_similar_versions():
+    st.subheader("🧭 Similar Versions")
+    total = get_version_count()
+    if not total:
+        st.info("ℹ️ No documents found in collection.")
+        return
+
+    query = st.text_area(
+        "Find versions closest to this passage",
+        value=st.session_state.get("draft_text", ""),
+        height=150,
+    )
+    k = st.slider("Results", 1, 20, 5)
+    if query.strip():
+        # One ANN query against Chroma's index; bodies load only when ticked
+        rows = similar_versions(query, k=k, collection=collection)
+        if not rows:
+            st.warning("⚠️ Embedding model unavailable, cannot search.")
+        wanted = tuple(r["id"] for r in rows if st.session_state.get(f"similar_{r['id']}"))
+        texts = get_version_texts(collection_name, wanted, total) if wanted else {}
+        for row in rows:
+            flag = " · near-duplicate" if row["similarity"] >= NEAR_DUPLICATE_THRESHOLD else ""
+            st.markdown(
+                f"**Version {row.get('version','?')}** — similarity {row['similarity']:.3f}{flag} "
+                f"(Date: {row.get('date','?')})"
+            )
+            if st.checkbox("Show text", key=f"similar_{row['id']}"):
+                st.code(texts.get(row["id"], ""))
+
+    with st.expander("🔁 Near-duplicate candidates across the collection"):
+        threshold = st.slider("Cosine similarity threshold", 0.80, 1.00, NEAR_DUPLICATE_THRESHOLD, 0.01)
+        if st.button("Scan for near-duplicates"):
+            pairs = duplicate_candidates(threshold=threshold, collection=collection)
+            if pairs:
+                st.dataframe(pd.DataFrame(pairs, columns=["Version A", "Version B", "Similarity"]))
+            else:
+                st.success("✅ No near-duplicates above the threshold.")
 
-def rephrase_with_ollama(prompt_text, model_name="llama3"):
-    """Uses local Ollama (http://localhost:11434)."""
+def rephrase_with_ollama(prompt_text, model_name="llama3", on_token=None):
+    """Uses local Ollama (http://localhost:11434), streaming tokens to ``on_token``."""
     try:
-        url = "http://localhost:11434/api/generate"
-        payload = {
-            "model": model_name,
-            "prompt": f"Rephrase this text improving grammar, clarity, and readability:\n\n{prompt_text}\n\nRephrased:",
-            "stream": False,
-        }
-        response = requests.post(url, json=payload, timeout=120)
-        response.raise_for_status()
-        return response.json().get("response", "")
+        prompt = f"Rephrase this text improving grammar, clarity, and readability:\n\n{prompt_text}\n\nRephrased:"
+        return ollama_generate(prompt, model=model_name, on_token=on_token, timeout=120)
     except Exception as e:
         return f"⚠️ Ollama error: {e}"
 
@@ -178,18 +294,29 @@ def _coerce_int(x, default=0):
     except Exception:
         return default
 
-def safe_compute_reward(text: str, reference_text: str = None):
+@st.cache_resource
+def get_incremental_scorer():
+    # Shared across reruns so live re-scoring only touches changed paragraphs
+    return IncrementalScorer()
+
+def safe_compute_reward(text: str, reference_text: str = None, incremental: bool = False):
     """
     Adaptor layer that accepts whatever compute_reward returns:
     - dict with keys: score, similarity, readability, errors
     - tuple/list: (score, similarity, readability, errors)
+
+    With incremental=True the paragraph-level IncrementalScorer is used
+    (same metrics, but only edited paragraphs are re-checked).
     """
     if not text or not isinstance(text, str) or not text.strip():
         st.error("❌ Draft text is empty.")
         return None
 
     try:
-        res = compute_reward(text, reference_text)
+        if incremental:
+            res = get_incremental_scorer().score(text, reference_text)
+        else:
+            res = compute_reward(text, reference_text)
     except Exception as e:
         st.error(f"⚠️ compute_reward crashed: {e}")
         return None
@@ -326,27 +453,16 @@ def draft_editor():
         if st.button("☁️ Save as New Version"):
             draft = st.session_state["draft_text"].strip()
             if draft:
-                try:
-                    results = collection.get(include=["metadatas"])
-                    existing_versions = [
-                        int(m["version"]) for m in (results["metadatas"] or [])
-                    ] if results else []
-                    new_version_number = (
-                        max(existing_versions) + 1 if existing_versions else 1
-                    )
-                except Exception:
-                    new_version_number = 1
+                # Atomic per-chapter counter: O(1), no collisions between editors
+                new_version_number = allocate_version(collection_name, collection)
 
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
                 try:
-                    collection.add(
-                        documents=[draft],
-                        metadatas=[{"version": str(new_version_number), "date": timestamp}],
-                        ids=[f"version_{new_version_number}"],
-                    )
+                    store_version(draft, new_version_number, metadata={"date": timestamp},
+                                  collection=collection, user_id=user_id)
                     save_document(new_version_number, draft, timestamp)
-                    st.success(f"✅ Version {new_version_number} saved to Chroma & Supabase.")
+                    st.success(f"✅ Version {new_version_number} saved to Chroma; queued for Supabase.")
                 except Exception as e:
                     st.error(f"❌ Save failed: {e}")
             else:
@@ -378,7 +494,12 @@ def ai_rewrite_review():
 
         # Rephrase via Ollama ⇒ goes to preview box (no in-place overwrite)
         if st.button("🤖 Rephrase with Ollama"):
-            st.session_state["rephrased_text"] = rephrase_with_ollama(edited_text)
+            # Render the rephrasing progressively as tokens stream in
+            preview = st.empty()
+            st.session_state["rephrased_text"] = rephrase_with_ollama(
+                edited_text, on_token=throttled(lambda partial: preview.markdown(partial + " ▌"))
+            )
+            preview.empty()
 
         # Show rephrased output if available
         if st.session_state.get("rephrased_text", ""):
@@ -394,8 +515,8 @@ def ai_rewrite_review():
                 st.session_state["rephrased_text"] = ""
                 st.rerun()
 
-        # Evaluate current edited text
-        res = safe_compute_reward(edited_text)
+        # Evaluate current edited text (runs on every rerun → incremental)
+        res = safe_compute_reward(edited_text, incremental=True)
         if not res:
             return
         final_score, sim, read, errors = res
@@ -405,56 +526,35 @@ def ai_rewrite_review():
         )
 
         if st.button("✅ Approve & Save"):
-            try:
-                results = collection.get(include=["metadatas"])
-                existing_versions = [
-                    int(meta["version"]) for meta in results["metadatas"]
-                ] if results and results.get("metadatas") else []
-                new_version_number = (
-                    max(existing_versions) + 1 if existing_versions else 1
-                )
-            except Exception:
-                new_version_number = 1
+            new_version_number = allocate_version(collection_name, collection)
 
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
             try:
-                collection.add(
-                    documents=[edited_text],
-                    metadatas=[
-                        {"version": str(new_version_number), "date": timestamp}
-                    ],
-                    ids=[f"version_{new_version_number}"],
+                store_version(
+                    edited_text, new_version_number, metadata={"date": timestamp}, collection=collection,
+                    user_id=user_id, score=final_score, similarity=sim, readability=read,
+                    errors=errors, reward_version=REWARD_VERSION,
                 )
             except Exception as e:
                 st.error(f"❌ Could not add to Chroma: {e}")
 
-            # Log to Supabase & CSV
+            # Queue for Supabase (synced in the background); the row also goes to the metrics store below
             try:
                 save_document(new_version_number, edited_text, timestamp)
                 log_reward(new_version_number, final_score, sim, read, errors, timestamp)
-                st.info("☁️ Synced to Supabase.")
+                st.info("☁️ Queued for Supabase sync.")
             except Exception as ex:
-                st.warning(f"Could not sync to Supabase: {ex}")
+                st.warning(f"Could not queue Supabase sync: {ex}")
 
-            # Append to local CSV for leaderboard
+            # Append to the reward metrics store (leaderboard / progression charts)
             try:
-                row = {
-                    "Version": new_version_number,
-                    "Final Score": final_score,
-                    "Similarity": sim,
-                    "Readability": read,
-                    "Errors": errors,
-                    "Timestamp": timestamp,
-                }
-                if os.path.exists("reward_progression_log.csv"):
-                    df = pd.read_csv("reward_progression_log.csv")
-                    df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-                else:
-                    df = pd.DataFrame([row])
-                df.to_csv("reward_progression_log.csv", index=False)
+                get_metrics_store().append(
+                    new_version_number, final_score, sim, read, errors, REWARD_VERSION,
+                    user_id=user_id, source="dashboard", ts=timestamp,
+                )
             except Exception as e:
-                st.warning(f"Could not update local leaderboard CSV: {e}")
+                st.warning(f"Could not record reward metrics: {e}")
 
             st.success("✅ Approved and saved.")
             try:
@@ -489,6 +589,7 @@ option = st.sidebar.radio(
         "📊 Leaderboard Viewer",
         "📑 Version Summary",
         "🔍 Compare Versions",
+        "🧭 Similar Versions",
         "📄 AI Rewrite Review",
         "🧹 Chroma Maintenance",
         "📖 Run AI Rephrasing Loop",
@@ -505,12 +606,14 @@ elif option == "📑 Version Summary":
     show_version_summary()
 elif option == "🔍 Compare Versions":
     show_version_differences()
+elif option == "🧭 Similar Versions":
+    show_similar_versions()
 elif option == "📄 AI Rewrite Review":
     ai_rewrite_review()
 elif option == "🧹 Chroma Maintenance":
-    stats = get_collection_stats()
-    if stats and stats.get("documents"):
-        st.success(f"✅ Collection has {len(stats['documents'])} docs.")
+    total = get_version_count()
+    if total:
+        st.success(f"✅ Collection has {total} docs.")
         if st.button("⚠️ Reset Collection"):
             reset_collection()
     else:
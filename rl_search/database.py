@@ -1,58 +1,50 @@
 # database.py
 from typing import Optional, List, Dict, Any
-from datetime import datetime
-import streamlit as st
-from auth import get_supabase, current_user
+from auth import current_access_token, current_user
+from supabase_client import get_data_access
+from supabase_outbox import SupabaseOutbox
 
 # Tables expected in Supabase (Postgres):
 # documents(id uuid default gen_random_uuid() pk, user_id text, version int, date timestamptz, content text)
 # reward_logs(id uuid default gen_random_uuid() pk, user_id text, version int, score float, similarity float, readability float, errors int, timestamp timestamptz)
 
+# All access goes through the shared data-access layer in supabase_client:
+# writes are queued in a durable outbox (the UI never waits on Supabase),
+# reads are projected, keyset-paged and cached per user until they write.
+# Writes are queued under the user's id and synced with their access token
+# (held in memory only), so they are sent as that user even after they sign
+# out or someone else signs in.
+def get_outbox() -> SupabaseOutbox:
+    return get_data_access().outbox
+
+def resume_sync():
+    # Hand the signed-in user's fresh token to the outbox: rows held back for
+    # re-auth (expired token, restart) are sent again
+    user = current_user()
+    if user:
+        get_outbox().set_token(user.id, current_access_token())
+
 def save_document(version: int, content: str, date_str: Optional[str] = None):
     user = current_user()
     if not user:
         raise RuntimeError("Not authenticated")
-
-    sb = get_supabase()
-    timestamp = date_str or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    data = {
-        "user_id": user.id,
-        "version": int(version),
-        "date": timestamp,
-        "content": content,
-    }
-    return sb.table("documents").insert(data).execute()
+    return get_data_access().save_document(user.id, version, content, date_str, current_access_token())
 
 def log_reward(version: int, score: float, similarity: float, readability: float, errors: int, ts: Optional[str] = None):
     user = current_user()
     if not user:
         raise RuntimeError("Not authenticated")
+    return get_data_access().save_reward(user.id, version, score, similarity, readability, errors, ts,
+                                         current_access_token())
 
-    sb = get_supabase()
-    timestamp = ts or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    data = {
-        "user_id": user.id,
-        "version": int(version),
-        "score": float(score),
-        "similarity": float(similarity),
-        "readability": float(readability),
-        "errors": int(errors),
-        "timestamp": timestamp,
-    }
-    return sb.table("reward_logs").insert(data).execute()
-
-def get_documents_for_user() -> List[Dict[str, Any]]:
+def get_documents_for_user(include_content: bool = False) -> List[Dict[str, Any]]:
     user = current_user()
     if not user:
         raise RuntimeError("Not authenticated")
-    sb = get_supabase()
-    res = sb.table("documents").select("*").eq("user_id", user.id).order("version").execute()
-    return res.data or []
+    return get_data_access().get_documents(user.id, include_content)
 
 def get_rewards_for_user() -> List[Dict[str, Any]]:
     user = current_user()
     if not user:
         raise RuntimeError("Not authenticated")
-    sb = get_supabase()
-    res = sb.table("reward_logs").select("*").eq("user_id", user.id).order("version").execute()
-    return res.data or []
+    return get_data_access().get_rewards(user.id)
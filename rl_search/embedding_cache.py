@@ -0,0 +1,247 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+# ------------------------------
+# Defaults (override with env vars)
+# ------------------------------
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+MAX_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "2048"))
+MAX_DISK_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+MMAP_BYTES = 256 * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for both the cache key and the embedding input."""
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def cos_sim(query, matrix):
+    """Cosine similarity of one vector against each row of ``matrix`` (1-D array)."""
+    query = np.asarray(query, dtype=np.float32).reshape(-1)
+    matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, query.shape[0])
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    return (matrix @ query) / np.maximum(norms, 1e-12)
+
+
+def split_for_embedding(text, max_words=128):
+    """
+    Paragraphs, further cut into runs of at most ``max_words`` words, so no
+    chunk runs past MiniLM's 256-token window (longer input is silently
+    truncated, hiding everything after it).
+    """
+    chunks = []
+    for paragraph in (text or "").split("\n\n"):
+        words = paragraph.split()
+        for start in range(0, len(words), max_words):
+            chunks.append(" ".join(words[start:start + max_words]))
+    return chunks or [normalize_text(text)]
+
+
+def aligned_similarity(chunks_a, chunks_b):
+    """
+    Mean cosine similarity of position-aligned chunk embeddings (rows of
+    ``chunks_a`` / ``chunks_b``); a chunk with no counterpart counts as 0,
+    so a changed or extra tail lowers the score.
+    """
+    a = np.asarray(chunks_a, dtype=np.float32)
+    b = np.asarray(chunks_b, dtype=np.float32)
+    n = min(len(a), len(b))
+    if not n:
+        return 0.0
+    a, b = a[:n], b[:n]
+    sims = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+    return float(sims.sum() / max(len(chunks_a), len(chunks_b)))
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model name, SHA-256 of text).
+
+    Two tiers:
+    - in-memory LRU (per process)
+    - on-disk SQLite blobs, read through SQLite's mmap, shared across
+      processes/restarts and trimmed oldest-first once it grows past
+      ``max_disk_bytes``
+    """
+
+    def __init__(self, path=CACHE_PATH, max_memory_items=MAX_MEMORY_ITEMS, max_disk_bytes=MAX_DISK_BYTES):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            nbytes INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (model, hash)
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+    # ---------------- memory tier ----------------
+    def _memory_get(self, key):
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+        return vector
+
+    def _memory_put(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    # ---------------- disk tier ----------------
+    def _disk_get_many(self, model_name, hashes):
+        found = {}
+        hashes = list(hashes)
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                [model_name, *chunk],
+            ).fetchall()
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32)
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE model = ? AND hash = ?",
+                [(now, model_name, h) for h in found],
+            )
+            self._conn.commit()
+        return found
+
+    def _disk_put_many(self, model_name, items):
+        now = time.time()
+        rows = []
+        for h, vector in items:
+            blob = np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+            rows.append((model_name, h, int(vector.shape[-1]), blob, len(blob), now))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, hash, dim, vector, nbytes, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._conn.commit()
+        self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        excess = total - self.max_disk_bytes
+        victims = []
+        freed = 0
+        for model_name, h, nbytes in self._conn.execute(
+            "SELECT model, hash, nbytes FROM embeddings ORDER BY last_access ASC"
+        ):
+            victims.append((model_name, h))
+            freed += nbytes
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND hash = ?", victims)
+        self._conn.commit()
+
+    # ---------------- public API ----------------
+    def encode(self, model, model_name, texts):
+        """
+        Return a float32 matrix (len(texts), dim) of embeddings for ``texts``.
+
+        Cached vectors are served from memory, then disk; only the remaining
+        misses are sent to ``model.encode`` in one batch. ``model`` may also be
+        a zero-arg loader (e.g. model_registry.get_embedding_model), which is
+        only called when there is at least one miss.
+        """
+        texts = [normalize_text(t) for t in texts]
+        hashes = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in texts]
+        vectors = {}
+
+        with self._lock:
+            for h in hashes:
+                vector = self._memory_get((model_name, h))
+                if vector is not None:
+                    vectors[h] = vector
+
+            pending = [h for h in dict.fromkeys(hashes) if h not in vectors]
+            if pending:
+                for h, vector in self._disk_get_many(model_name, pending).items():
+                    vectors[h] = vector
+                    self._memory_put((model_name, h), vector)
+
+            to_encode = OrderedDict()
+            for t, h in zip(texts, hashes):
+                if h not in vectors:
+                    to_encode.setdefault(h, t)
+            self.hits += len(hashes) - len(to_encode)
+            self.misses += len(to_encode)
+
+        if to_encode:
+            if not hasattr(model, "encode"):
+                model = model()
+            encoded = model.encode(list(to_encode.values()), convert_to_numpy=True, batch_size=32)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            with self._lock:
+                for h, vector in zip(to_encode.keys(), encoded):
+                    vectors[h] = vector
+                    self._memory_put((model_name, h), vector)
+                self._disk_put_many(model_name, zip(to_encode.keys(), encoded))
+
+        return np.stack([vectors[h] for h in hashes])
+
+    def stats(self):
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_items": row[0],
+                "disk_bytes": row[1],
+            }
+
+
+# ------------------------------
+# Shared process-wide cache
+# ------------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def encode_cached(model, model_name, texts):
+    """Embed ``texts`` (list[str]) through the shared cache."""
+    return get_cache().encode(model, model_name, texts)
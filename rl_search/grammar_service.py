@@ -0,0 +1,213 @@
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ------------------------------
+# Config
+# ------------------------------
+GRAMMAR_LANGUAGE = "en-US"
+# Chunk servers; one more JVM runs the text-level rules, so a pool starts
+# POOL_SIZE + 1 LanguageTool servers in total
+POOL_SIZE = int(os.getenv("GRAMMAR_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+CHUNK_CHARS = int(os.getenv("GRAMMAR_CHUNK_CHARS", "2000"))
+
+# LanguageTool rules that look beyond one sentence or paragraph (quotes
+# opened in one paragraph and closed in another, "color" vs "colour"
+# consistency, repeated sentence openings, ...): the English TextLevelRule
+# subclasses. Chunks are checked with these disabled; one extra full-text
+# pass runs only these rules, so the merged result matches a single
+# whole-text check (tests/test_grammar_service.py verifies the count).
+# Extra ids can be added with GRAMMAR_TEXT_LEVEL_RULES=ID1,ID2.
+TEXT_LEVEL_RULE_IDS = {
+    "EN_UNPAIRED_BRACKETS",
+    "EN_UNPAIRED_QUOTES",
+    "EN_WORD_COHERENCY",
+    "EN_WORD_COHERENCY_RELAXED",
+    "EN_CONSISTENT_APOS",
+    "ENGLISH_WORD_REPEAT_BEGINNING_RULE",
+    "PARAGRAPH_REPEAT_BEGINNING_RULE",
+    "STYLE_REPEATED_WORD_RULE_EN",
+    "STYLE_TOO_OFTEN_USED_VERB_EN",
+    "STYLE_TOO_OFTEN_USED_NOUN_EN",
+    "STYLE_TOO_OFTEN_USED_ADJ_EN",
+    "UPPERCASE_SENTENCE_START",
+    "SENTENCE_WHITESPACE",
+    "PUNCTUATION_PARAGRAPH_END",
+    "PUNCTUATION_PARAGRAPH_END2",
+    "TOO_LONG_PARAGRAPH",
+    "EMPTY_LINE",
+    "READABILITY_RULE_SIMPLE",
+    "READABILITY_RULE_DIFFICULT",
+} | {r.strip() for r in os.getenv("GRAMMAR_TEXT_LEVEL_RULES", "").split(",") if r.strip()}
+
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+# Sentence end followed by whitespace and an upper-case start; the look-behind
+# skips common abbreviations so "Mr. Smith" is not split.
+_SENTENCE_BREAK = re.compile(
+    r"(?<=[.!?])(?<!\bMr\.)(?<!\bMrs\.)(?<!\bMs\.)(?<!\bDr\.)(?<!\bSt\.)(?<!\bvs\.)"
+    r"[\"'”’)\]]*\s+(?=[\"'“‘(\[]?[A-Z])"
+)
+
+
+def split_paragraphs(text: str):
+    """
+    Split ``text`` into (start, end) paragraph spans covering the whole text.
+
+    Each paragraph keeps its trailing blank-line separator, so the spans are
+    contiguous and ``"".join(text[s:e] for s, e in spans) == text``.
+    """
+    spans = []
+    start = 0
+    for m in _PARAGRAPH_BREAK.finditer(text):
+        spans.append((start, m.end()))
+        start = m.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+
+def split_into_chunks(text: str, chunk_chars: int = CHUNK_CHARS):
+    """
+    Split ``text`` into (start_offset, chunk) pairs with ``text[start:start+len(chunk)] == chunk``.
+
+    Paragraphs (blank-line separated) are packed together up to ``chunk_chars``;
+    a single paragraph longer than that is split on sentence boundaries.
+    Separators stay attached to the preceding chunk so offsets map 1:1.
+    """
+    # 1) Paragraph spans, separator kept with the paragraph before it
+    spans = split_paragraphs(text)
+
+    # 2) Break oversized paragraphs on sentence boundaries
+    pieces = []
+    for p_start, p_end in spans:
+        if p_end - p_start <= chunk_chars:
+            pieces.append((p_start, p_end))
+            continue
+        s_start = p_start
+        for m in _SENTENCE_BREAK.finditer(text, p_start, p_end):
+            if m.end() - s_start >= chunk_chars // 2:
+                pieces.append((s_start, m.end()))
+                s_start = m.end()
+        pieces.append((s_start, p_end))
+
+    # 3) Pack small pieces into chunks of up to chunk_chars
+    chunks = []
+    c_start = c_end = None
+    for p_start, p_end in pieces:
+        if c_start is None:
+            c_start, c_end = p_start, p_end
+        elif p_end - c_start <= chunk_chars:
+            c_end = p_end
+        else:
+            chunks.append((c_start, text[c_start:c_end]))
+            c_start, c_end = p_start, p_end
+    if c_start is not None:
+        chunks.append((c_start, text[c_start:c_end]))
+    return chunks
+
+
+def _default_tool_factory(language, disabled_rules=None, enabled_rules_only=None):
+    import language_tool_python
+    tool = language_tool_python.LanguageTool(language)
+    if disabled_rules:
+        tool.disabled_rules.update(disabled_rules)
+    if enabled_rules_only:
+        tool.enabled_rules.update(enabled_rules_only)
+        tool.enabled_rules_only = True
+    return tool
+
+
+class GrammarService:
+    """
+    Pool of warm local LanguageTool servers that checks long texts in parallel.
+
+    ``check(text)`` returns LanguageTool matches whose ``offset`` refers to the
+    original ``text``, so ``language_tool_python.utils.correct(text, matches)``
+    works unchanged and ``len(matches)`` equals a single whole-text check.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, language=GRAMMAR_LANGUAGE,
+                 chunk_chars=CHUNK_CHARS, tool_factory=_default_tool_factory):
+        self.pool_size = max(1, int(pool_size))
+        self.chunk_chars = chunk_chars
+        self._tools = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size + 1, thread_name_prefix="grammar")
+
+        # Start every server in parallel so the pool is warm before first use
+        starting = [
+            self._executor.submit(tool_factory, language, disabled_rules=TEXT_LEVEL_RULE_IDS)
+            for _ in range(self.pool_size)
+        ]
+        text_level = self._executor.submit(tool_factory, language, enabled_rules_only=TEXT_LEVEL_RULE_IDS)
+        self._all_tools = [f.result() for f in starting]
+        for tool in self._all_tools:
+            self._tools.put(tool)
+        self._text_level_tool = text_level.result()
+        self._text_level_lock = threading.Lock()
+
+    # ---------------- workers ----------------
+    def _check_chunk(self, start, chunk):
+        tool = self._tools.get()
+        try:
+            matches = tool.check(chunk)
+        finally:
+            self._tools.put(tool)
+        for match in matches:
+            match.offset += start
+        return matches
+
+    def check_text_level(self, text):
+        """Run only the cross-paragraph rules over the whole text."""
+        with self._text_level_lock:
+            return self._text_level_tool.check(text)
+
+    # ---------------- public API ----------------
+    def check(self, text):
+        if not text or not text.strip():
+            return []
+
+        text_level = self._executor.submit(self.check_text_level, text)
+        chunk_futures = [
+            self._executor.submit(self._check_chunk, start, chunk)
+            for start, chunk in split_into_chunks(text, self.chunk_chars)
+        ]
+
+        matches = []
+        for future in chunk_futures:
+            matches.extend(future.result())
+        matches.extend(text_level.result())
+        matches.sort(key=lambda m: (m.offset, m.errorLength))
+        return matches
+
+    def check_paragraphs(self, paragraphs):
+        """
+        Check each paragraph on its own (paragraph-local rules only), in parallel.
+
+        Long paragraphs are split on sentence boundaries exactly as in
+        ``check``. Returns one match list per paragraph with offsets
+        relative to that paragraph. Combine with ``check_text_level`` on the
+        full text to get the same matches as ``check``.
+        """
+        futures = [
+            [self._executor.submit(self._check_chunk, start, chunk)
+             for start, chunk in split_into_chunks(p, self.chunk_chars)]
+            for p in paragraphs
+        ]
+        return [[m for f in chunk_futures for m in f.result()] for chunk_futures in futures]
+
+    def count_errors(self, text) -> int:
+        return len(self.check(text))
+
+    def correct(self, text) -> str:
+        from language_tool_python.utils import correct
+        return correct(text, self.check(text))
+
+    def close(self):
+        for tool in [*self._all_tools, self._text_level_tool]:
+            try:
+                tool.close()
+            except Exception:
+                pass
+        self._executor.shutdown(wait=False)
@@ -1,14 +1,20 @@
 import streamlit as st
-import chromadb
-from chromadb.config import Settings
 from datetime import datetime
 import os
 import matplotlib.pyplot as plt
-from smart_reward_function import compute_reward
+from incremental_scorer import IncrementalScorer
+from metrics_store import get_metrics_store
+from smart_reward_function import metrics_fields
+from version_store import allocate_version, get_collection, store_version
 
 # Initialize ChromaDB client
-client = chromadb.PersistentClient(path=".chroma_store")
-collection = client.get_or_create_collection("chapter_versions")
+collection = get_collection()
+
+# Paragraph-level scorer shared across reruns: each keystroke only
+# re-scores the paragraphs that actually changed
+@st.cache_resource
+def get_scorer():
+    return IncrementalScorer()
 
 # Load candidate text file (from rephrasing loop)
 candidate_file = "latest_candidate.txt"
@@ -34,7 +40,10 @@ if os.path.exists(candidate_file):
     st.session_state.edited_text = edited_text  # update session state
 
     # Compute live reward metrics
-    final_score, sim, read, errors = compute_reward(edited_text)
+    metrics = get_scorer().score(edited_text)
+    final_score, sim, read, errors = (
+        metrics["score"], metrics["similarity"], metrics["readability"], metrics["errors"]
+    )
 
     st.subheader("📊 Live Metrics")
     st.write(f"**Similarity Score:** {sim:.2f}")
@@ -47,22 +56,17 @@ if os.path.exists(candidate_file):
 
     with col1:
         if st.button("✅ Approve and Save to Chroma"):
-            results = collection.get(include=["metadatas"])
-            existing_versions = [int(meta['version']) for meta in results['metadatas']] if results['metadatas'] else [0]
-            new_version_number = max(existing_versions) + 1
+            new_version_number = allocate_version(collection=collection)
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            # Add approved text to ChromaDB
-            collection.add(
-                documents=[edited_text],
-                metadatas=[{"version": str(new_version_number), "date": timestamp}],
-                ids=[f"version_{new_version_number}"]
-            )
+            # Add approved text to ChromaDB (idempotent upsert)
+            store_version(edited_text, new_version_number, metadata={"date": timestamp}, collection=collection,
+                          **metrics_fields(metrics))
 
-            # Log to CSV
-            log_entry = f"{timestamp},{new_version_number},{final_score:.2f},{sim:.2f},{read:.2f},{errors}\n"
-            with open("reward_progression_log.csv", "a") as log_file:
-                log_file.write(log_entry)
+            # Append to the reward metrics store (leaderboard / progression charts)
+            get_metrics_store().append(
+                new_version_number, source="human_loop_editor", ts=timestamp, **metrics_fields(metrics)
+            )
 
             st.success("✅ Approved and saved successfully!")
 
@@ -0,0 +1,247 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import textstat
+from embedding_cache import cos_sim, encode_cached
+from grammar_service import split_paragraphs
+from model_registry import EMBEDDING_MODEL_NAME, get_embedding_model, get_grammar_service
+from smart_reward_function import combine_metrics
+
+# ------------------------------
+# Flesch reading ease constants (textstat, en)
+# ------------------------------
+FRE_BASE = 206.835
+FRE_SENTENCE_LENGTH = 1.015
+FRE_SYLL_PER_WORD = 84.6
+
+# A full text-level grammar pass runs once typing pauses for this long
+TEXT_LEVEL_DEBOUNCE_SECONDS = float(os.getenv("TEXT_LEVEL_DEBOUNCE_SECONDS", "1.5"))
+
+
+def _legacy_round(number, points):
+    # Same rounding textstat applies to its intermediate averages
+    p = 10 ** points
+    return float(math.floor((number * p) + math.copysign(0.5, number))) / p
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IncrementalScorer:
+    """
+    Re-scores a document by recomputing only the paragraphs that changed.
+
+    Per paragraph (keyed by content hash) it caches the paragraph-local
+    grammar matches and the syllable count, the two expensive parts of the
+    reward. Document-level metrics are then recombined:
+
+    - errors      = sum of paragraph matches + cross-paragraph (text-level) rules
+    - readability = Flesch reading ease from summed syllables plus the cheap
+                    word/sentence counts of the full text
+    - similarity  = cached embedding of the full text (the model truncates
+                    long inputs, so a miss costs one bounded forward pass)
+
+    Text-level rules are re-run only over the changed paragraphs and their
+    neighbours, reusing the matches of the most similar recent document
+    elsewhere; once edits pause for ``debounce_seconds`` a full pass runs
+    in the background and makes the cached count exact again. The lock only
+    guards the caches, so sessions sharing one scorer do not wait on each
+    other's grammar checks.
+
+    Results match ``smart_reward_function.compute_reward`` for the same text
+    (for text-level rules: once the debounced full pass has run).
+    """
+
+    def __init__(self, max_paragraphs=4096, max_documents=32,
+                 debounce_seconds=TEXT_LEVEL_DEBOUNCE_SECONDS, grammar_factory=get_grammar_service):
+        self.max_paragraphs = max_paragraphs
+        self.max_documents = max_documents
+        self.debounce_seconds = debounce_seconds
+        self.grammar_factory = grammar_factory
+        self._paragraphs = OrderedDict()   # hash -> {"syllables": int, "errors": int | None}
+        self._documents = OrderedDict()    # full-text hash -> text-level matches + paragraph layout
+        self._lock = threading.Lock()
+        self._timer = None
+        self.last_stats = {}
+
+    # ---------------- caches ----------------
+    def _remember(self, cache, key, value, limit):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+    # ---------------- components ----------------
+    def _readability(self, text, paragraph_entries):
+        try:
+            words = textstat.lexicon_count(text)
+            syllables = sum(entry["syllables"] for entry in paragraph_entries)
+            sentence_length = _legacy_round(words / textstat.sentence_count(text), 1)
+            syllables_per_word = _legacy_round(syllables / words, 1) if words else 0.0
+            return _legacy_round(
+                FRE_BASE - FRE_SENTENCE_LENGTH * sentence_length - FRE_SYLL_PER_WORD * syllables_per_word,
+                2,
+            )
+        except Exception as e:
+            print(f"Readability computation error: {e}")
+            return 0.0
+
+    def _closest_document(self, hashes):
+        """Recent document sharing the longest unchanged prefix + suffix of paragraphs."""
+        best, best_key = None, (0, False)
+        for doc in self._documents.values():
+            old = doc["hashes"]
+            prefix = 0
+            while prefix < min(len(old), len(hashes)) and old[prefix] == hashes[prefix]:
+                prefix += 1
+            suffix = 0
+            while (suffix < min(len(old), len(hashes)) - prefix
+                   and old[-1 - suffix] == hashes[-1 - suffix]):
+                suffix += 1
+            key = (prefix + suffix, doc["exact"])
+            if key > best_key:
+                best, best_key = (doc, prefix, suffix), key
+        return best
+
+    def _text_level(self, grammar, text, spans, hashes):
+        """Text-level matches as [(offset, length)] and how they were obtained."""
+        text_hash = _hash(text)
+        with self._lock:
+            doc = self._documents.get(text_hash)
+            if doc is not None:
+                self._documents.move_to_end(text_hash)
+                return doc["matches"], "cached"
+            base = self._closest_document(hashes)
+
+        if base is None:
+            matches = [(m.offset, m.errorLength) for m in grammar.check_text_level(text)]
+            mode = "full"
+        else:
+            # Re-check the changed paragraphs plus one neighbour on each side
+            doc, prefix, suffix = base
+            lo = max(0, prefix - 1)
+            new_hi = min(len(spans), len(spans) - suffix + 1)
+            old_hi = min(len(doc["spans"]), len(doc["spans"]) - suffix + 1)
+            start = spans[lo][0] if lo < len(spans) else len(text)
+            new_end = spans[new_hi - 1][1] if new_hi > lo else start
+            old_end = doc["spans"][old_hi - 1][1] if old_hi > lo else start
+            window = text[start:new_end]
+            fresh = grammar.check_text_level(window) if window.strip() else []
+            matches = (
+                [m for m in doc["matches"] if m[0] < start]
+                + [(m.offset + start, m.errorLength) for m in fresh]
+                + [(o + new_end - old_end, n) for o, n in doc["matches"] if o >= old_end]
+            )
+            mode = "window"
+
+        with self._lock:
+            self._remember(self._documents, text_hash, {
+                "hashes": hashes, "spans": spans, "matches": matches, "exact": mode == "full",
+            }, self.max_documents)
+        if mode == "window":
+            self._schedule_full_pass(grammar, text, text_hash)
+        return matches, mode
+
+    def _schedule_full_pass(self, grammar, text, text_hash):
+        # Debounced: each edit restarts the timer, so only the latest text is checked
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce_seconds, self._full_pass, (grammar, text, text_hash))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _full_pass(self, grammar, text, text_hash):
+        try:
+            matches = [(m.offset, m.errorLength) for m in grammar.check_text_level(text)]
+        except Exception as e:
+            print(f"LanguageTool error: {e}")
+            return
+        with self._lock:
+            doc = self._documents.get(text_hash)
+            if doc is not None:
+                doc["matches"], doc["exact"] = matches, True
+
+    def _grammar(self, text, spans, hashes, entries, pending):
+        try:
+            grammar = self.grammar_factory()
+        except Exception as e:
+            print(f"LanguageTool error: {e}")
+            return 0, None
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            text_level = executor.submit(self._text_level, grammar, text, spans, hashes)
+
+            # Changed paragraphs (and any left unchecked by an earlier failure)
+            counts = {}
+            if pending:
+                results = grammar.check_paragraphs(list(pending.values()))
+                counts = {h: len(matches) for h, matches in zip(pending, results)}
+                with self._lock:
+                    for h, count in counts.items():
+                        if h in self._paragraphs:
+                            self._paragraphs[h]["errors"] = count
+
+            text_level_matches, mode = text_level.result()
+
+        paragraph_errors = sum(counts[h] if h in counts else entries[h]["errors"] for h in hashes)
+        return paragraph_errors + len(text_level_matches), mode
+
+    def _similarity(self, text, reference_text):
+        if not reference_text:
+            return 0.0
+        try:
+            embeddings = encode_cached(get_embedding_model, EMBEDDING_MODEL_NAME, [reference_text, text])
+            return float(cos_sim(embeddings[0], embeddings[1:])[0] or 0.0)
+        except Exception as e:
+            print(f"Embedding similarity error: {e}")
+            return 0.0
+
+    # ---------------- public API ----------------
+    def score(self, text, reference_text=None):
+        """Same dict schema as compute_reward: {score, similarity, readability, errors}."""
+        start = time.perf_counter()
+        spans = split_paragraphs(text)
+        paragraphs = [text[s:e] for s, e in spans]
+        hashes = [_hash(p) for p in paragraphs]
+
+        # Cache lookups only under the lock; new paragraphs are measured outside it
+        with self._lock:
+            entries = {}
+            for h in hashes:
+                if h in self._paragraphs:
+                    self._paragraphs.move_to_end(h)
+                    entries[h] = dict(self._paragraphs[h])
+        changed = {h: p for p, h in zip(paragraphs, hashes) if h not in entries}
+        for h, paragraph in changed.items():
+            entries[h] = {"syllables": textstat.syllable_count(paragraph), "errors": None}
+        with self._lock:
+            for h in changed:
+                self._paragraphs.setdefault(h, entries[h])
+            # Trim only after this document's entries have been read
+            while len(self._paragraphs) > max(self.max_paragraphs, len(hashes)):
+                self._paragraphs.popitem(last=False)
+
+        readability_score = self._readability(text, [entries[h] for h in hashes])
+        pending = {h: p for p, h in zip(paragraphs, hashes) if entries[h]["errors"] is None}
+        try:
+            grammar_errors, text_level_mode = self._grammar(text, spans, hashes, entries, pending)
+        except Exception as e:
+            print(f"LanguageTool error: {e}")
+            grammar_errors, text_level_mode = 0, None
+
+        similarity_score = self._similarity(text, reference_text)
+
+        self.last_stats = {
+            "paragraphs": len(paragraphs),
+            "rescored": len(changed),
+            "text_level": text_level_mode,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+        return combine_metrics(similarity_score, readability_score, grammar_errors)
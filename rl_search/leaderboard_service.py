@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from collections import deque
+
+from metrics_store import COLUMNS, get_metrics_store
+
+# ------------------------------
+# Defaults (override with env vars)
+# ------------------------------
+ROLLING_WINDOW = int(os.getenv("LEADERBOARD_ROLLING_WINDOW", "10"))
+MAX_POINTS = int(os.getenv("LEADERBOARD_MAX_POINTS", "2000"))
+REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "2.0"))
+TAIL_PAGE = 50000
+
+ALL = "*"                   # series over every reward version
+UNVERSIONED = "unversioned"  # rows written before reward versioning
+BEST_FIELDS = ("version", "score", "similarity", "readability", "errors", "reward_version", "ts", "id")
+
+
+class _Series:
+    """Best row per version plus the latest progression points with a rolling average."""
+
+    def __init__(self, window, max_points):
+        self.best = {}
+        self.rows = 0
+        self._window = deque(maxlen=window)
+        self.points = deque(maxlen=max_points)
+
+    def offer_best(self, row):
+        current = self.best.get(row["version"])
+        if current is None or row["score"] > current["score"]:
+            best = {field: row.get(field) for field in BEST_FIELDS}
+            best["reward_version"] = best["reward_version"] or UNVERSIONED
+            self.best[row["version"]] = best
+
+    def add_point(self, row):
+        self._window.append(row["score"])
+        self.points.append({
+            "id": row["id"],
+            "version": row["version"],
+            "score": row["score"],
+            "rolling_avg": sum(self._window) / len(self._window),
+        })
+
+    def add(self, row):
+        self.offer_best(row)
+        self.add_point(row)
+        self.rows += 1
+
+
+class LeaderboardService:
+    """
+    In-memory leaderboard over the metrics store, kept current by tailing.
+
+    The first load seeds the aggregates with one GROUP BY plus the last
+    ``max_points`` rows per reward version; after that ``refresh()`` only
+    reads rows with ``id`` above the last one seen (at most every
+    ``refresh_seconds``). Every batch of new rows bumps ``data_version``;
+    ``view()`` results are cached per (reward version, data version), so
+    rendering the leaderboard is a dictionary lookup until new rows arrive.
+    """
+
+    def __init__(self, store=None, window=ROLLING_WINDOW, max_points=MAX_POINTS,
+                 refresh_seconds=REFRESH_SECONDS):
+        self.store = store or get_metrics_store()
+        self.window = window
+        self.max_points = max_points
+        self.refresh_seconds = refresh_seconds
+        self.last_id = 0
+        self.data_version = 0
+        self._series = {}
+        self._views = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._seed()
+
+    def _get_series(self, key):
+        if key not in self._series:
+            self._series[key] = _Series(self.window, self.max_points)
+        return self._series[key]
+
+    @staticmethod
+    def _key(row):
+        return row.get("reward_version") or UNVERSIONED
+
+    def _seed(self):
+        store = self.store
+        last_id = store.query("SELECT COALESCE(MAX(id), 0) AS id FROM reward_metrics")[0]["id"]
+        if not last_id:
+            return
+
+        # Whole best row per (reward version, version), joined back by id
+        best = store.query(
+            "WITH best AS ("
+            "  SELECT COALESCE(reward_version, ?) AS reward_version, version, "
+            "  arg_max(id, score) AS id, COUNT(*) AS runs "
+            "  FROM reward_metrics WHERE id <= ? AND score IS NOT NULL GROUP BY 1, version"
+            ") SELECT b.reward_version, r.version, r.score, r.id, r.similarity, r.readability, r.errors, "
+            "r.ts, b.runs FROM best b JOIN reward_metrics r ON r.id = b.id",
+            (UNVERSIONED, last_id),
+        )
+        for row in best:
+            runs = row.pop("runs")
+            self._get_series(row["reward_version"]).offer_best(row)
+            self._get_series(row["reward_version"]).rows += runs
+            self._get_series(ALL).offer_best(row)
+            self._get_series(ALL).rows += runs
+
+        # Only the tail of each progression is kept, so only the tail is read
+        keep = self.max_points + self.window
+        columns = ", ".join(f"r.{c}" for c in COLUMNS)
+        recent = store.query(
+            f"SELECT id, {columns} FROM ("
+            f"  SELECT r.id, {columns}, ROW_NUMBER() OVER (PARTITION BY r.reward_version ORDER BY r.id DESC) AS n "
+            "  FROM reward_metrics r WHERE r.id <= ? AND r.score IS NOT NULL"
+            ") r WHERE n <= ? ORDER BY id",
+            (last_id, keep),
+        )
+        for row in recent:
+            self._get_series(self._key(row)).add_point(row)
+        for row in recent[-keep:]:
+            self._get_series(ALL).add_point(row)
+
+        self.last_id = last_id
+        self.data_version += 1
+
+    def refresh(self, force=False):
+        """Fold in rows appended since the last call; returns how many were new."""
+        with self._lock:
+            if not force and time.monotonic() - self._checked_at < self.refresh_seconds:
+                return 0
+            self._checked_at = time.monotonic()
+            new = 0
+            while True:
+                rows = self.store.progression(after_id=self.last_id, limit=TAIL_PAGE)
+                for row in rows:
+                    if row["score"] is not None:
+                        self._get_series(self._key(row)).add(row)
+                        self._get_series(ALL).add(row)
+                    self.last_id = row["id"]
+                new += len(rows)
+                if len(rows) < TAIL_PAGE:
+                    break
+            if new:
+                self.data_version += 1
+                self._views.clear()
+            return new
+
+    def view(self, reward_version=None, limit=50):
+        """
+        Leaderboard and chart data for one reward version (None: all of
+        them): the best rows, best score per version and the latest
+        progression points with their rolling average.
+        """
+        self.refresh()
+        key = reward_version or ALL
+        with self._lock:
+            cached = self._views.get((key, limit))
+            if cached and cached["data_version"] == self.data_version:
+                return cached
+            series = self._series.get(key) or _Series(self.window, self.max_points)
+            view = {
+                "data_version": self.data_version,
+                "rows": series.rows,
+                "leaderboard": sorted(series.best.values(), key=lambda r: r["score"], reverse=True)[:limit],
+                "best_by_version": sorted(
+                    ({"version": v, "score": r["score"]} for v, r in series.best.items()),
+                    key=lambda r: r["version"],
+                ),
+                "progression": list(series.points),
+            }
+            self._views[(key, limit)] = view
+            return view
+
+    def reward_versions(self):
+        with self._lock:
+            return sorted(k for k in self._series if k != ALL)
+
+
+# ------------------------------
+# Shared instance
+# ------------------------------
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_leaderboard_service():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = LeaderboardService()
+        return _service
@@ -1,52 +1,62 @@
-import csv 
-import chromadb
-from sentence_transformers import SentenceTransformer, util
-import textstat
-import language_tool_python
-import numpy as np
 from tabulate import tabulate
 import matplotlib.pyplot as plt
+from reward_registry import current_version, score_texts
+from rl_search_algorithm import BackgroundRescorer, is_stale
+from version_store import find_versions, get_collection
 
 # Initialize ChromaDB Persistent Client
-client = chromadb.PersistentClient(path=".chroma_store")
-collection = client.get_or_create_collection("chapter_versions")
+collection = get_collection()
 
-# Load model and grammar tool
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-tool = language_tool_python.LanguageTool('en-US')
+# Scores use the current reward version, like the stored scores in the table.
+# The original leaderboard formula (0.4 / 0.5 / -0.1 against a fixed
+# reference) stays registered as "leaderboard-v0" for older rows.
+def compute_rewards(texts, reward_version=None):
+    return [
+        (m["score"], m["similarity"], m["readability"], m["errors"])
+        for m in score_texts(texts, reward_version or current_version())
+    ]
 
-# Reference text for comparison
-reference_text = "This is the original reference content of the chapter."
+def compute_reward(text, reward_version=None):
+    return compute_rewards([text], reward_version)[0]
 
-# Reward function (same as before)
-def compute_reward(text):
-    embedding1 = model.encode(reference_text, convert_to_tensor=True)
-    embedding2 = model.encode(text, convert_to_tensor=True)
-    similarity_score = util.cos_sim(embedding1, embedding2).item()
-    readability_score = textstat.flesch_reading_ease(text)
-    grammar_errors = len(tool.check(text))
+_rescorer = None
 
-    final_score = (similarity_score * 0.4) + (readability_score * 0.5) - (grammar_errors * 0.1)
-    return final_score, similarity_score, readability_score, grammar_errors
+def get_rescorer():
+    """Shared background re-scorer for this collection (started on first use)."""
+    global _rescorer
+    if _rescorer is None:
+        _rescorer = BackgroundRescorer(collection)
+    return _rescorer.start()
 
 # Function to display leaderboard table
-def show_leaderboard():
-    results = collection.get(include=["documents", "metadatas"])
-    if not results["documents"]:
+def show_leaderboard(rescore_stale=True):
+    # Metrics are stored with each version. Versions scored by another
+    # reward version are listed with their old score, marked "(stale)";
+    # with rescore_stale=True they are queued for the background re-scorer
+    # instead of being re-scored before the table is printed
+    rows = find_versions(collection=collection)
+    if not rows:
         print("⚠️ No versions found.")
         return
 
-    leaderboard = []
-
-    for doc, meta in zip(results["documents"], results["metadatas"]):
-        final_score, sim, read, errors = compute_reward(doc)
-        leaderboard.append([meta["version"], meta["date"], f"{final_score:.2f}", f"{sim:.2f}", f"{read:.2f}", errors])
+    leaderboard = [
+        [r.get("version"), r.get("date"), f"{r['score']:.2f}", f"{r.get('similarity', 0.0):.2f}",
+         f"{r.get('readability', 0.0):.2f}", r.get("errors"),
+         r.get("reward_version", "-") + (" (stale)" if is_stale(r) else "")]
+        for r in rows if "score" in r
+    ]
 
     # Sort leaderboard by final score (descending)
     leaderboard.sort(key=lambda x: float(x[2]), reverse=True)
 
-    print("\n🏆 📊 Leaderboard of Versions\n")
-    print(tabulate(leaderboard, headers=["Version", "Date", "Score", "Similarity", "Readability", "Errors"], tablefmt="pretty"))
+    print(f"\n🏆 📊 Leaderboard of Versions (reward {current_version()})\n")
+    print(tabulate(leaderboard, headers=["Version", "Date", "Score", "Similarity", "Readability", "Errors", "Reward"], tablefmt="pretty"))
+
+    stale = sum(1 for r in rows if is_stale(r))
+    if stale and rescore_stale:
+        get_rescorer()
+        print(f"🔁 {stale} stale score(s) queued for background re-scoring "
+              "(or run: python rl_search/rl_search_algorithm.py --rescore-all)")
 
 # Example toggle inside show_leaderboard()
 use_supabase = st.toggle("Use Supabase logs (instead of CSV)", value=False)
@@ -70,36 +80,24 @@ if use_supabase:
 # (then your existing CSV logic runs)
 
 
-# Function to plot reward progression from log
-import csv
-import matplotlib.pyplot as plt
+# Function to plot reward progression from the metrics store
+from metrics_store import get_metrics_store
 
 def plot_progression_chart():
-    try:
-        with open("reward_progression_log.csv", "r") as csvfile:
-            reader = csv.DictReader(csvfile)
-            versions = []
-            scores = []
-
-            for row in reader:
-                versions.append(row['version'])
-                scores.append(float(row['score']))
-
-        if not versions:
-            print("⚠️ No data to plot.")
-            return
-
-        plt.figure(figsize=(10, 5))
-        plt.plot(versions, scores, marker='o', color='teal')
-        plt.title("Reward Score Progression Over Iterations")
-        plt.xlabel("Version")
-        plt.ylabel("Reward Score")
-        plt.grid(True)
-        plt.tight_layout()
-        plt.show()
-
-    except FileNotFoundError:
-        print("⚠️ reward_progression_log.csv not found.")
+    # Best score per version, aggregated in DuckDB
+    rows = sorted(get_metrics_store().leaderboard(limit=None), key=lambda r: r["version"])
+    if not rows:
+        print("⚠️ No data to plot.")
+        return
+
+    plt.figure(figsize=(10, 5))
+    plt.plot([r["version"] for r in rows], [r["score"] for r in rows], marker='o', color='teal')
+    plt.title("Reward Score Progression Over Iterations")
+    plt.xlabel("Version")
+    plt.ylabel("Reward Score")
+    plt.grid(True)
+    plt.tight_layout()
+    plt.show()
 
 
 if __name__ == "__main__":
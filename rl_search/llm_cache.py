@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# ------------------------------
+# Defaults (override with env vars)
+# ------------------------------
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite3"))
+TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+# "on"     → serve cached responses, generate + store misses
+# "off"    → always generate, never read or write the cache
+# "replay" → serve cached responses only; a miss raises LLMCacheMiss
+MODE = os.getenv("LLM_CACHE_MODE", "on")
+
+
+class LLMCacheMiss(KeyError):
+    """Raised in replay mode when a prompt has no cached response."""
+
+
+def cache_key(model, template, text, options=None):
+    """Key = (model, prompt template, SHA-256 of the input text, generation options)."""
+    material = json.dumps(
+        {
+            "model": model,
+            "template": template,
+            "text_sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "options": options or {},
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Persistent prompt → response cache with TTL and entry-count eviction."""
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_responses (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_last_access ON llm_responses(last_access)")
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response, model=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond ``max_entries``."""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_responses WHERE key IN "
+                    "(SELECT key FROM llm_responses ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+
+# ------------------------------
+# Shared process-wide cache
+# ------------------------------
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache()
+        return _cache
+
+
+def cached_generate(model, template, text, generate_fn, options=None, mode=None):
+    """
+    Return ``(response, from_cache)`` for ``template.format(text=text)``.
+
+    ``generate_fn(prompt)`` is only called on a miss (and never in replay
+    mode). Empty/None responses are not stored.
+    """
+    mode = mode or MODE
+    prompt = template.format(text=text)
+    if mode == "off":
+        return generate_fn(prompt), False
+
+    cache = get_llm_cache()
+    key = cache_key(model, template, text, options)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
+    if mode == "replay":
+        raise LLMCacheMiss(f"No cached response for model={model!r} (replay mode)")
+
+    response = generate_fn(prompt)
+    if response:
+        cache.put(key, response, model=model)
+    return response, False
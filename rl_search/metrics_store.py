@@ -0,0 +1,327 @@
+import argparse
+import atexit
+import csv
+import os
+import re
+import threading
+import time
+
+import duckdb
+
+# ------------------------------
+# Defaults (override with env vars)
+# ------------------------------
+METRICS_PATH = os.getenv("METRICS_DB_PATH", os.path.join(".cache", "metrics.duckdb"))
+LEGACY_CSVS = ("reward_progression_log.csv", os.path.join("rl_search", "reward_progression_log.csv"))
+LEGACY_LOG = "reward_progression.log"
+LOCK_RETRIES = 50
+# How long the connection stays open after the last call: bursts (one
+# dashboard rerun) share it, and other processes get the file lock in
+# between. 0 closes after every call; "inf" keeps it for the whole process.
+KEEP_OPEN_SECONDS = float(os.getenv("METRICS_DB_KEEP_OPEN_SECONDS", "2.0"))
+
+COLUMNS = ("book_id", "chapter_id", "user_id", "version", "score", "similarity", "readability",
+           "errors", "reward_version", "source", "ts")
+
+# Header spellings used by the writers that produced the legacy CSVs
+_ALIASES = {
+    "version": ("Version", "version"),
+    "score": ("Final Score", "Score", "score"),
+    "similarity": ("Similarity", "similarity"),
+    "readability": ("Readability", "readability"),
+    "errors": ("Errors", "Grammar Errors", "errors"),
+    "ts": ("Timestamp", "timestamp"),
+    "reward_version": ("Reward Version", "reward_version"),
+}
+_LOG_LINE = re.compile(r"^(?P<ts>[^|]+)\|\s*Version (?P<version>\d+)\s*\|\s*Score:\s*(?P<score>[-\d.]+)")
+
+
+class MetricsStore:
+    """
+    Append-only reward history (one row per scored/approved version) in DuckDB.
+
+    Each append is a single-row INSERT (O(1), no read-modify-write of the
+    history). Rows carry book_id/chapter_id as partition keys: queries
+    filter on them, ``compact()`` clusters the table by them so DuckDB's
+    zone maps skip other chapters, and ``export_parquet()`` writes a
+    hive-partitioned (book_id=/chapter_id=) copy for offline analysis.
+
+    DuckDB allows one writer process per file. Each process keeps one
+    connection while it is busy and closes it ``keep_open_seconds`` after
+    the last call; opening is retried while another process holds the lock,
+    so the dashboard, the editor UI and the rephrasing loop can all write.
+    """
+
+    def __init__(self, path=METRICS_PATH, import_legacy_files=True, keep_open_seconds=KEEP_OPEN_SECONDS):
+        self.path = path
+        self.keep_open_seconds = keep_open_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+        self._idle_timer = None
+        self._generation = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        created = self._run(self._create_schema)
+        if created and import_legacy_files:
+            imported = self.import_legacy()
+            if imported:
+                print(f"📥 Imported {imported} legacy reward row(s) into {path}")
+
+    def _connect(self):
+        for attempt in range(LOCK_RETRIES):
+            try:
+                return duckdb.connect(self.path)
+            except duckdb.IOException:
+                if attempt == LOCK_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+
+    def _run(self, fn):
+        """Run ``fn(conn)`` on the process's connection, opening it (and waiting out other processes' locks) if needed."""
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            try:
+                return fn(self._conn)
+            except duckdb.Error:
+                self._close()   # don't reuse a connection left mid-transaction
+                raise
+            finally:
+                self._schedule_close()
+
+    def _schedule_close(self):
+        self._generation += 1
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+        if self.keep_open_seconds <= 0:
+            self._close()
+        elif self.keep_open_seconds != float("inf"):
+            generation = self._generation
+            self._idle_timer = threading.Timer(self.keep_open_seconds, self._close_if_idle, (generation,))
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _close_if_idle(self, generation):
+        with self._lock:
+            if generation == self._generation:
+                self._close()
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def close(self):
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+            self._close()
+
+    @staticmethod
+    def _create_schema(conn):
+        exists = conn.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'reward_metrics'"
+        ).fetchone()[0]
+        if exists:
+            return False
+        conn.execute("CREATE SEQUENCE IF NOT EXISTS reward_metrics_id")
+        conn.execute("""
+        CREATE TABLE reward_metrics (
+            id BIGINT DEFAULT nextval('reward_metrics_id'),
+            book_id VARCHAR,
+            chapter_id VARCHAR,
+            user_id VARCHAR,
+            version INTEGER,
+            score DOUBLE,
+            similarity DOUBLE,
+            readability DOUBLE,
+            errors INTEGER,
+            reward_version VARCHAR,
+            source VARCHAR,
+            ts TIMESTAMP
+        )
+        """)
+        return True
+
+    # ------------------------------
+    # Writes
+    # ------------------------------
+    def append(self, version, score, similarity=None, readability=None, errors=None, reward_version=None,
+               book_id=None, chapter_id=None, user_id=None, source=None, ts=None):
+        """Append one row; returns its id (ids only ever increase)."""
+        row = self._row(locals())
+        # fetchall(): a partly-fetched RETURNING result is rolled back on close
+        return self._run(lambda conn: conn.execute(
+            f"INSERT INTO reward_metrics ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(COLUMNS))}) RETURNING id",
+            row,
+        ).fetchall()[0][0])
+
+    def append_many(self, rows):
+        """Append dicts with any of COLUMNS in one transaction; returns the count."""
+        values = [self._row(r) for r in rows]
+        if not values:
+            return 0
+
+        def insert(conn):
+            conn.execute("BEGIN TRANSACTION")
+            conn.executemany(
+                f"INSERT INTO reward_metrics ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                values,
+            )
+            conn.execute("COMMIT")
+            return len(values)
+
+        return self._run(insert)
+
+    @staticmethod
+    def _row(fields):
+        ts = fields.get("ts") or time.strftime("%Y-%m-%d %H:%M:%S")
+        return [
+            fields.get("book_id"), fields.get("chapter_id"), fields.get("user_id"),
+            None if fields.get("version") is None else int(fields["version"]),
+            None if fields.get("score") is None else float(fields["score"]),
+            None if fields.get("similarity") is None else float(fields["similarity"]),
+            None if fields.get("readability") is None else float(fields["readability"]),
+            None if fields.get("errors") is None else int(float(fields["errors"])),
+            fields.get("reward_version"), fields.get("source"), ts,
+        ]
+
+    # ------------------------------
+    # Queries
+    # ------------------------------
+    @staticmethod
+    def _where(book_id=None, chapter_id=None, reward_version=None, after_id=None):
+        clauses, params = [], []
+        for column, value in (("book_id", book_id), ("chapter_id", chapter_id), ("reward_version", reward_version)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, sql, params=()):
+        """Run a read query; rows come back as dicts."""
+        def fetch(conn):
+            cur = conn.execute(sql, list(params))
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, row)) for row in cur.fetchall()]
+
+        return self._run(fetch)
+
+    def count(self, book_id=None, chapter_id=None, reward_version=None):
+        where, params = self._where(book_id, chapter_id, reward_version)
+        return self.query(f"SELECT COUNT(*) AS n FROM reward_metrics{where}", params)[0]["n"]
+
+    def leaderboard(self, book_id=None, chapter_id=None, reward_version=None, limit=50):
+        """Best row per version (highest score), best first; ``limit=None`` returns every version."""
+        where, params = self._where(book_id, chapter_id, reward_version)
+        # Pick the whole best row by id, so NULL fields cannot mix values from different rows
+        return self.query(
+            "WITH best AS ("
+            "  SELECT version, arg_max(id, score) AS id, MAX(ts) AS last_scored, COUNT(*) AS runs "
+            f"  FROM reward_metrics{where}{' AND' if where else ' WHERE'} score IS NOT NULL GROUP BY version"
+            ") SELECT r.version, r.score, r.similarity, r.readability, r.errors, r.reward_version, "
+            "b.last_scored, b.runs FROM best b JOIN reward_metrics r ON r.id = b.id ORDER BY r.score DESC"
+            + (" LIMIT ?" if limit is not None else ""),
+            params + ([limit] if limit is not None else []),
+        )
+
+    def recent(self, book_id=None, chapter_id=None, reward_version=None, limit=200):
+        """The latest ``limit`` rows, newest first."""
+        where, params = self._where(book_id, chapter_id, reward_version)
+        return self.query(
+            f"SELECT id, {', '.join(COLUMNS)} FROM reward_metrics{where} ORDER BY id DESC LIMIT ?",
+            params + [limit],
+        )
+
+    def progression(self, book_id=None, chapter_id=None, reward_version=None, after_id=None, limit=None):
+        """Rows in append order (optionally only those after ``after_id``)."""
+        where, params = self._where(book_id, chapter_id, reward_version, after_id)
+        sql = f"SELECT id, {', '.join(COLUMNS)} FROM reward_metrics{where} ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self.query(sql, params)
+
+    # ------------------------------
+    # Maintenance
+    # ------------------------------
+    def compact(self):
+        """Cluster rows by (book_id, chapter_id) so per-chapter scans skip other chapters."""
+        def rewrite(conn):
+            conn.execute("BEGIN TRANSACTION")
+            conn.execute("CREATE TEMP TABLE clustered AS SELECT * FROM reward_metrics ORDER BY book_id, chapter_id, id")
+            conn.execute("DELETE FROM reward_metrics")
+            conn.execute("INSERT INTO reward_metrics SELECT * FROM clustered")
+            conn.execute("COMMIT")
+            conn.execute("CHECKPOINT")
+
+        self._run(rewrite)
+
+    def export_parquet(self, directory):
+        """Write a hive-partitioned Parquet copy (``book_id=…/chapter_id=…/``)."""
+        path = directory.replace("'", "''")
+        self._run(lambda conn: conn.execute(
+            f"COPY (SELECT * FROM reward_metrics) TO '{path}' "
+            "(FORMAT PARQUET, PARTITION_BY (book_id, chapter_id), OVERWRITE_OR_IGNORE 1)"
+        ))
+
+    def import_legacy(self, csv_paths=LEGACY_CSVS, log_path=LEGACY_LOG):
+        """Load the old CSV logs (mixed headers) and the free-text progression log."""
+        rows = []
+        for path in csv_paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, newline="", encoding="utf-8") as f:
+                for record in csv.DictReader(f):
+                    row = {"source": os.path.basename(path)}
+                    for field, names in _ALIASES.items():
+                        row[field] = next((record[n] for n in names if record.get(n) not in (None, "")), None)
+                    if row["version"] is not None and row["score"] is not None:
+                        rows.append(row)
+        if log_path and os.path.exists(log_path):
+            with open(log_path, encoding="utf-8") as f:
+                for line in f:
+                    match = _LOG_LINE.match(line)
+                    if match:
+                        rows.append({**match.groupdict(), "ts": match["ts"].strip(), "source": log_path})
+        return self.append_many(rows)
+
+
+# ------------------------------
+# Shared instance
+# ------------------------------
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_metrics_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetricsStore()
+            atexit.register(_store.close)
+        return _store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reward metrics store maintenance.")
+    parser.add_argument("--import-legacy", action="store_true", help="Load the old CSV/log files again")
+    parser.add_argument("--compact", action="store_true", help="Cluster rows by book/chapter")
+    parser.add_argument("--export-parquet", metavar="DIR", help="Write a partitioned Parquet copy")
+    args = parser.parse_args()
+
+    store = MetricsStore(import_legacy_files=False) if args.import_legacy else get_metrics_store()
+    if args.import_legacy:
+        print(f"📥 Imported {store.import_legacy()} row(s)")
+    if args.compact:
+        store.compact()
+        print("✅ Compacted")
+    if args.export_parquet:
+        store.export_parquet(args.export_parquet)
+        print(f"✅ Exported to {args.export_parquet}")
+    print(f"📊 {store.count()} row(s) in {store.path}")
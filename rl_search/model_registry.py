@@ -0,0 +1,77 @@
+import threading
+import time
+
+# ------------------------------
+# Shared heavy resources (loaded lazily, once per process)
+# ------------------------------
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_CACHE_FOLDER = ".cache"   # works on local + Streamlit Cloud
+GRAMMAR_LANGUAGE = "en-US"
+
+_instances = {}
+_errors = {}
+_timings = {}
+_lock = threading.Lock()
+
+
+def _get_or_load(name, factory):
+    """
+    Return the shared instance for ``name``, building it with ``factory`` on
+    first use. A failed load is remembered so callers fail fast instead of
+    retrying an expensive start-up (e.g. a missing JVM) on every call.
+    """
+    if name in _instances:
+        return _instances[name]
+
+    with _lock:
+        if name in _instances:
+            return _instances[name]
+        if name in _errors:
+            raise RuntimeError(f"{name} unavailable: {_errors[name]}")
+
+        start = time.perf_counter()
+        try:
+            instance = factory()
+        except Exception as e:
+            _errors[name] = e
+            _timings[name] = time.perf_counter() - start
+            raise RuntimeError(f"{name} unavailable: {e}") from e
+
+        _timings[name] = time.perf_counter() - start
+        _instances[name] = instance
+        return instance
+
+
+def _load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, cache_folder=MODEL_CACHE_FOLDER)
+
+
+def get_embedding_model():
+    """Shared SentenceTransformer (all-MiniLM-L6-v2)."""
+    return _get_or_load("embedding_model", _load_embedding_model)
+
+
+def _load_grammar_service():
+    from grammar_service import GrammarService
+    return GrammarService(language=GRAMMAR_LANGUAGE)
+
+
+def get_grammar_service():
+    """
+    Shared GrammarService: a warm pool of LanguageTool servers that checks
+    long texts in parallel chunks. Raises RuntimeError if unavailable.
+    """
+    return _get_or_load("grammar_service", _load_grammar_service)
+
+
+def load_timings() -> dict:
+    """Load time per resource so far, e.g. {"embedding_model": {"seconds": 2.31, "status": "loaded"}}."""
+    with _lock:
+        return {
+            name: {
+                "seconds": round(seconds, 3),
+                "status": "error" if name in _errors else "loaded",
+            }
+            for name, seconds in _timings.items()
+        }
@@ -1,18 +1,10 @@
 import re
 from sklearn.feature_extraction.text import CountVectorizer
-from sentence_transformers import SentenceTransformer, util
+from embedding_cache import cos_sim, encode_cached
+from model_registry import EMBEDDING_MODEL_NAME, get_embedding_model, get_grammar_service
 
-# 🔹 Lazy import of language_tool_python (avoids Java crash at startup)
-try:
-    import language_tool_python
-    tool = language_tool_python.LanguageTool('en-US')
-    corrections = tool.check("This are wrong sentence.")
-except Exception as e:
-    print(f"[Warning] Grammar tool unavailable: {e}")
-    tool = None
-
-# 🔹 Embedding Model for plagiarism
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# 🔹 LanguageTool + embedding model are loaded lazily by the shared registry
+#    (no JVM start or warm-up check at import time)
 
 
 # ----------------- Grammar + Style -----------------
@@ -21,11 +13,14 @@ def correct_grammar_and_style(text: str) -> str:
     if not text.strip():
         return "⚠️ No text provided."
 
-    if tool is None:
+    try:
+        grammar = get_grammar_service()
+    except Exception as e:
+        print(f"[Warning] Grammar tool unavailable: {e}")
         return "⚠️ Grammar tool unavailable (Java not installed)."
 
-    matches = tool.check(text)
-    corrected_text = language_tool_python.utils.correct(text, matches)
+    # Chunks are checked in parallel; match offsets are remapped to ``text``
+    corrected_text = grammar.correct(text)
     return corrected_text
 
 
@@ -60,13 +55,13 @@ def check_plagiarism(text: str, references: list = None) -> dict:
             "AI is transforming the world with NLP and machine learning."
         ]
 
-    embedding = model.encode(text, convert_to_tensor=True)
-    similarities = []
-
-    for ref in references:
-        ref_emb = model.encode(ref, convert_to_tensor=True)
-        sim_score = util.cos_sim(embedding, ref_emb).item()
-        similarities.append({"reference": ref, "similarity": sim_score})
+    # Text + every reference in one cached batch (references are usually unchanged)
+    embeddings = encode_cached(get_embedding_model, EMBEDDING_MODEL_NAME, [text, *references])
+    scores = cos_sim(embeddings[0], embeddings[1:]).tolist()
+    similarities = [
+        {"reference": ref, "similarity": sim_score}
+        for ref, sim_score in zip(references, scores)
+    ]
 
     max_match = max(similarities, key=lambda x: x["similarity"])
 
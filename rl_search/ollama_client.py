@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import requests
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+
+# requests.Session is not thread-safe, and beam mode streams from pool
+# threads: each thread gets its own pooled session
+_local = threading.local()
+
+
+def _get_session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+class GenerationRejected(Exception):
+    """Raised when a streaming generation is cancelled by an early check."""
+
+
+# ------------------------------
+# Streaming
+# ------------------------------
+def stream_generate(prompt, model="llama3", url=OLLAMA_URL, timeout=120, options=None):
+    """
+    Yield response tokens from Ollama's NDJSON stream as they arrive.
+
+    Closing the generator (or breaking out of the loop) closes the HTTP
+    response, which makes Ollama stop generating.
+    """
+    payload = {"model": model, "prompt": prompt, "stream": True}
+    if options:
+        payload["options"] = options
+
+    with _get_session().post(url, json=payload, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            token = chunk.get("response", "")
+            if token:
+                yield token
+            if chunk.get("done"):
+                break
+
+
+# ------------------------------
+# Early rejection checks (cheap, run while tokens stream in)
+# ------------------------------
+def early_rejection_reason(generated, source_text, max_length_ratio=2.5, min_chars=200,
+                           ngram=4, window_words=80, max_repeats=6):
+    """Return a reason string if ``generated`` already looks hopeless, else None."""
+    if len(generated) < min_chars:
+        return None
+
+    if source_text and len(generated) > max_length_ratio * len(source_text) + min_chars:
+        return f"length ratio {len(generated) / max(len(source_text), 1):.1f}x exceeds {max_length_ratio}x"
+
+    words = generated.split()[-window_words:]
+    if len(words) >= ngram * max_repeats:
+        grams = Counter(tuple(words[i:i + ngram]) for i in range(len(words) - ngram + 1))
+        gram, count = grams.most_common(1)[0]
+        if count >= max_repeats:
+            return f"runaway repetition of '{' '.join(gram)}' ({count}x)"
+    return None
+
+
+def generate(prompt, model="llama3", url=OLLAMA_URL, source_text=None, on_token=None,
+             timeout=120, options=None, check_every=16):
+    """
+    Stream a completion and return the full text.
+
+    - ``on_token(text_so_far)`` is called as tokens arrive (progressive UI).
+    - If ``source_text`` is given, length-ratio and repetition checks run
+      every ``check_every`` tokens; a hopeless generation is cancelled and
+      GenerationRejected is raised.
+    """
+    parts = []
+    stream = stream_generate(prompt, model=model, url=url, timeout=timeout, options=options)
+    try:
+        for i, token in enumerate(stream, 1):
+            parts.append(token)
+            if on_token is not None:
+                on_token("".join(parts))
+            if source_text is not None and i % check_every == 0:
+                reason = early_rejection_reason("".join(parts), source_text)
+                if reason:
+                    raise GenerationRejected(reason)
+    finally:
+        stream.close()   # cancels the request server-side if we stopped early
+
+    text = "".join(parts).strip()
+    if source_text is not None:
+        reason = early_rejection_reason(text, source_text)
+        if reason:
+            raise GenerationRejected(reason)
+    return text
+
+
+def throttled(callback, interval=0.1):
+    """Wrap an on_token callback so it fires at most every ``interval`` seconds."""
+    last = [0.0]
+
+    def wrapper(text_so_far):
+        now = time.monotonic()
+        if now - last[0] >= interval:
+            last[0] = now
+            callback(text_so_far)
+
+    return wrapper
@@ -1,24 +1,46 @@
-import requests
-import json
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import chromadb
-from chromadb.config import Settings
-from smart_reward_function import compute_reward
-
-client = chromadb.PersistentClient(path=".chroma_store")
-collection = client.get_or_create_collection("chapter_versions")
-
-def rephrase_with_ollama(prompt_text, model_name="llama3"):
-    url = "http://localhost:11434/api/generate"
-    payload = {
-        "model": model_name,
-        "prompt": f"Rephrase the following text to improve grammar, readability and keep meaning intact:\n\n{prompt_text}\n\nRephrased Version:",
-        "stream": False
-    }
-    response = requests.post(url, json=payload)
-    response.raise_for_status()
-    result = response.json()
-    return result.get("response", "").strip()   # ✅ safer
+from smart_reward_function import compute_reward, compute_rewards, metrics_fields
+from ollama_client import GenerationRejected, generate
+from llm_cache import cached_generate
+from embedding_cache import aligned_similarity, split_for_embedding
+from metrics_store import get_metrics_store
+from version_store import (
+    NEAR_DUPLICATE_THRESHOLD, allocate_version, embed_query, get_collection, similar_versions_many, store_version,
+)
+
+collection = get_collection()
+
+# Near-duplicate skipping is opt-in: meaning-preserving rewrites are often this
+# similar too, and skipping them unscored can hide real improvements
+DEDUP_THRESHOLD = float(os.getenv("REPHRASE_DEDUP_THRESHOLD", "0"))   # 0 = off
+
+PROMPT_TEMPLATE = "Rephrase the following text to improve grammar, readability and keep meaning intact:\n\n{text}\n\nRephrased Version:"
+
+def rephrase_with_ollama(prompt_text, model_name="llama3", sample=0):
+    """
+    Stream a rephrasing from Ollama. Runaway or overlong generations are
+    cancelled mid-stream and return None instead of being scored.
+
+    Responses are cached per (model, template, text, sample), so re-running
+    the loop on an unchanged chapter replays earlier generations; ``sample``
+    keeps repeated rewrites of the same text distinct.
+    """
+    try:
+        response, _ = cached_generate(
+            model_name,
+            PROMPT_TEMPLATE,
+            prompt_text,
+            lambda prompt: generate(prompt, model=model_name, source_text=prompt_text, timeout=None),
+            options={"sample": sample},
+        )
+        return response
+    except GenerationRejected as e:
+        print(f"Generation cancelled early: {e}")
+        return None
 
 def safe_float(value, fallback=0.0):
     try:
@@ -27,36 +49,111 @@ def safe_float(value, fallback=0.0):
         print(f"Warning: Could not convert '{value}' to float. Using {fallback}.")
         return fallback
 
-def iterative_rephrasing_and_logging(iterations=5):
-    # Debug check
-    print("DEBUG compute_reward output:", compute_reward("test text"))
-
-    results = collection.get(include=["documents", "metadatas"])
+def load_seed_version():
+    """Return (text, version_number) of the version to start rephrasing from."""
+    results = collection.get(limit=1, include=["documents", "metadatas"])
 
     if not results["documents"]:
         print("No versions found. Seeding initial version...")
         initial_text = """This is the initial draft text. Replace it with your actual text."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        collection.add(
-            documents=[initial_text],
-            metadatas=[{"version": "0", "date": timestamp}],
-            ids=["version_0"]
-        )
+        store_version(initial_text, 0, metadata={"date": timestamp}, collection=collection)
 
-        results = collection.get(include=["documents", "metadatas"])
+        results = collection.get(limit=1, include=["documents", "metadatas"])
 
     # Now safe to proceed
     current_best = results['documents'][0]
     current_meta = results['metadatas'][0]
 
-    # compute_reward returns dict
-    best_metrics = compute_reward(current_best)
-    best_score = safe_float(best_metrics.get("score", 0.0))
-
     # Default version handling
-    current_version_number = int(current_meta.get("version", 0))
+    return current_best, int(current_meta.get("version", 0))
+
+def save_accepted_version(text, version_number, metrics):
+    """Store an accepted rewrite with its reward metrics (feeds the best-version index)."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # compute_reward scores without a reference, so nothing is embedded while scoring. The
+    # embedding is encoded here unless the near-duplicate filter already cached it.
+    store_version(text, version_number, metadata={"date": timestamp}, collection=collection,
+                  **metrics_fields(metrics))
+    get_metrics_store().append(version_number, source="rephrasing_loop", ts=timestamp, **metrics_fields(metrics))
+
+class NearDuplicateFilter:
+    """
+    Drops candidates that are near-identical to a text already evaluated in
+    this run or to a stored version, so they are never scored.
+
+    Texts are compared chunk by chunk (paragraphs of at most 128 words,
+    position-aligned, mean cosine >= ``threshold``), so two versions that
+    only differ past the embedding model's 256-token window are not
+    mistaken for duplicates. Stored versions are found with one ANN query
+    per batch on whole-text embeddings and then checked the same way.
+    ``threshold <= 0`` (the default) turns the filter off.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, check_store=True, embed=embed_query):
+        self.threshold = threshold
+        self.check_store = check_store
+        self.embed = embed
+        self.skipped = 0
+        self._seen = []   # chunk embeddings per kept text
+
+    def _chunk_embeddings(self, texts):
+        """Per text, its chunk embeddings (one batched encode), or None without a model."""
+        chunks = [split_for_embedding(t) for t in texts]
+        vectors = self.embed([c for text_chunks in chunks for c in text_chunks])
+        if vectors is None:
+            return None
+        out, start = [], 0
+        for text_chunks in chunks:
+            out.append(vectors[start:start + len(text_chunks)])
+            start += len(text_chunks)
+        return out
 
+    def _near_stored(self, texts, chunked):
+        """Per text, whether a stored version is a near-duplicate."""
+        try:
+            embeddings = self.embed(texts)
+            hits = similar_versions_many(embeddings, k=3, collection=collection, include_documents=True) \
+                if embeddings is not None else []
+        except Exception as e:
+            print(f"Near-duplicate lookup failed: {e}")
+            hits = []
+        if len(hits) != len(texts):
+            return [False] * len(texts)
+        candidates = [[r for r in rows if r["similarity"] >= self.threshold] for rows in hits]
+        stored_texts = list(dict.fromkeys(r["text"] for rows in candidates for r in rows))
+        stored_chunks = dict(zip(stored_texts, self._chunk_embeddings(stored_texts) or [])) if stored_texts else {}
+        return [
+            any(r["text"] in stored_chunks and aligned_similarity(chunks, stored_chunks[r["text"]]) >= self.threshold
+                for r in rows)
+            for chunks, rows in zip(chunked, candidates)
+        ]
+
+    def filter(self, texts):
+        if self.threshold <= 0 or not texts:
+            return list(texts)
+        chunked = self._chunk_embeddings(texts)
+        if chunked is None:
+            return list(texts)
+        near_stored = self._near_stored(texts, chunked) if self.check_store else [False] * len(texts)
+
+        kept = []
+        for text, chunks, stored in zip(texts, chunked, near_stored):
+            near_seen = any(aligned_similarity(chunks, seen) >= self.threshold for seen in self._seen)
+            if near_seen or stored:
+                self.skipped += 1
+                continue
+            kept.append(text)
+            self._seen.append(chunks)   # also catches duplicates within one batch
+        return kept
+
+def iterative_rephrasing_and_logging(iterations=5, dedup_threshold=DEDUP_THRESHOLD):
+    current_best, _ = load_seed_version()
+    dedup = NearDuplicateFilter(dedup_threshold)
+    dedup.filter([current_best])
+
+    # compute_reward returns dict
     best_metrics = compute_reward(current_best)
     best_score = safe_float(best_metrics.get("score", 0.0))
 
@@ -64,7 +161,13 @@ def iterative_rephrasing_and_logging(iterations=5):
         print(f"\n Iteration {i+1}")
 
         # Rephrase via Ollama
-        new_version = rephrase_with_ollama(current_best)
+        new_version = rephrase_with_ollama(current_best, sample=i)
+        if not new_version:
+            print("New version discarded. Generation rejected.")
+            continue
+        if not dedup.filter([new_version]):
+            print("New version skipped. Near-duplicate of one already evaluated.")
+            continue
 
         # Compute new reward
         result = compute_reward(new_version)
@@ -85,23 +188,122 @@ def iterative_rephrasing_and_logging(iterations=5):
             print("New version accepted.")
             current_best = new_version
             best_score = new_score
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            new_version_number = current_version_number + 1
-            current_version_number = new_version_number   # ✅ update tracker
+            new_version_number = allocate_version(collection=collection)   # never collides with editors
 
-            collection.add(
-                documents=[new_version],
-                metadatas=[{"version": str(new_version_number), "date": timestamp}],
-                ids=[f"version_{new_version_number}"]
-            )
-
-            with open("reward_progression.log", "a") as log_file:
-                log_file.write(f"{timestamp} | Version {new_version_number} | Score: {new_score:.2f}\n")
+            save_accepted_version(new_version, new_version_number, result)
 
         else:
             print("New version discarded. No improvement.")
 
     print("\n Iterative rephrasing complete.")
 
+# ------------------------------
+# Beam / best-of-N search
+# ------------------------------
+def beam_rephrasing_and_logging(rounds=5, candidates_per_beam=4, beam_width=2,
+                                patience=2, min_improvement=0.01, dedup_threshold=DEDUP_THRESHOLD):
+    """
+    Parallel multi-candidate variant of the hill-climb.
+
+    Each round rewrites every beam ``candidates_per_beam`` times concurrently,
+    scores all new candidates with one batched compute_rewards call, and keeps
+    the top ``beam_width`` texts. Candidates near-identical to anything
+    already evaluated (or stored) are skipped before scoring. Stops early once the best score improves by
+    less than ``min_improvement`` for ``patience`` rounds in a row.
+
+    Returns a stats dict (candidates evaluated, wall time, throughput, reward
+    gain per second), which is also printed.
+    """
+    start = time.perf_counter()
+    seed_text, _ = load_seed_version()
+    seed_score = safe_float(compute_reward(seed_text).get("score", 0.0))
+
+    beams = [(seed_score, seed_text)]
+    seen = {seed_text}
+    dedup = NearDuplicateFilter(dedup_threshold)
+    dedup.filter([seed_text])
+    metrics_by_text = {}
+    evaluated = 0
+    stale_rounds = 0
+    rounds_run = 0
+
+    with ThreadPoolExecutor(max_workers=candidates_per_beam * beam_width) as executor:
+        for r in range(rounds):
+            rounds_run += 1
+            print(f"\n Round {r+1}: {len(beams)} beam(s) x {candidates_per_beam} candidates")
+
+            futures = [
+                executor.submit(rephrase_with_ollama, text, sample=f"beam-{r}-{b}-{k}")
+                for b, (_, text) in enumerate(beams)
+                for k in range(candidates_per_beam)
+            ]
+            candidates = []
+            for future in futures:
+                try:
+                    text = future.result()
+                except Exception as e:
+                    print(f"Rewrite failed: {e}")
+                    continue
+                if text and text not in seen:
+                    seen.add(text)
+                    candidates.append(text)
+            candidates = dedup.filter(candidates)
+
+            if candidates:
+                # One batched reward call for the whole round
+                rewards = compute_rewards(candidates)
+                evaluated += len(candidates)
+                scored = [(safe_float(m.get("score", 0.0)), text) for m, text in zip(rewards, candidates)]
+                metrics_by_text.update(zip(candidates, rewards))
+            else:
+                scored = []
+
+            previous_best = beams[0][0]
+            beams = sorted(beams + scored, key=lambda b: b[0], reverse=True)[:beam_width]
+            print(f"Best score: {beams[0][0]:.2f} ({len(candidates)} new candidates scored)")
+
+            if beams[0][0] - previous_best < min_improvement:
+                stale_rounds += 1
+                if stale_rounds >= patience:
+                    print("Score plateaued, stopping early.")
+                    break
+            else:
+                stale_rounds = 0
+
+    best_score, best_text = beams[0]
+    if best_score > seed_score:
+        print("New version accepted.")
+        save_accepted_version(best_text, allocate_version(collection=collection), metrics_by_text[best_text])
+    else:
+        print("New version discarded. No improvement.")
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "rounds": rounds_run,
+        "candidates_evaluated": evaluated,
+        "near_duplicates_skipped": dedup.skipped,
+        "seconds": round(elapsed, 2),
+        "candidates_per_minute": round(evaluated / elapsed * 60, 2) if elapsed else 0.0,
+        "seed_score": round(seed_score, 3),
+        "final_score": round(best_score, 3),
+        "reward_gain_per_second": round((best_score - seed_score) / elapsed, 4) if elapsed else 0.0,
+    }
+    print("\n Beam rephrasing complete:", stats)
+    return stats
+
 if __name__ == "__main__":
-    iterative_rephrasing_and_logging(iterations=5)
+    parser = argparse.ArgumentParser(description="Iteratively rephrase the latest version and keep improvements.")
+    parser.add_argument("--iterations", type=int, default=5, help="Iterations (hill-climb) or rounds (beam)")
+    parser.add_argument("--beam-width", type=int, default=0,
+                        help="Keep the top-B texts per round (0 = original sequential hill-climb)")
+    parser.add_argument("--candidates", type=int, default=4, help="Concurrent rewrites per beam per round")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="Skip candidates whose chunk-aligned cosine similarity to one already evaluated "
+                             f"is >= this (0 = off, the default; e.g. {NEAR_DUPLICATE_THRESHOLD})")
+    args = parser.parse_args()
+
+    if args.beam_width > 0:
+        beam_rephrasing_and_logging(rounds=args.iterations, candidates_per_beam=args.candidates,
+                                    beam_width=args.beam_width, dedup_threshold=args.dedup_threshold)
+    else:
+        iterative_rephrasing_and_logging(iterations=args.iterations, dedup_threshold=args.dedup_threshold)
@@ -1,48 +1,193 @@
+import atexit
+import hashlib
+import os
 import sqlite3
+import threading
+import time
 from datetime import datetime
 
-DB_NAME = "reward_logs.db"
+DB_NAME = os.getenv("REWARD_LOG_DB", "reward_logs.db")
+FLUSH_ROWS = int(os.getenv("REWARD_LOG_FLUSH_ROWS", "500"))
+FLUSH_SECONDS = float(os.getenv("REWARD_LOG_FLUSH_SECONDS", "2.0"))
+
+
+def _hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest() if text is not None else None
+
+
+class RewardLogWriter:
+    """
+    Buffered reward log on one long-lived WAL connection.
+
+    ``log`` only appends to an in-memory buffer; rows are written with
+    ``executemany`` once ``flush_rows`` are pending or ``flush_seconds``
+    have passed (a daemon thread covers idle periods), and on exit. Text
+    bodies are stored once per SHA-256 in ``reward_texts``; each log row
+    only references them. Reads flush first, so they see every logged row.
+    """
+
+    def __init__(self, path=DB_NAME, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._rows = []
+        self._texts = {}
+        self._last_flush = time.monotonic()
+        self.flushes = 0
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+        CREATE TABLE IF NOT EXISTS reward_texts (
+            hash TEXT PRIMARY KEY,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS reward_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text_hash TEXT,
+            reference_hash TEXT,
+            score REAL,
+            similarity REAL,
+            readability REAL,
+            errors INTEGER,
+            reward_version TEXT,
+            timestamp TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_reward_entries_timestamp ON reward_entries(timestamp);
+        CREATE INDEX IF NOT EXISTS idx_reward_entries_score ON reward_entries(score);
+        """)
+        self._migrate_legacy()
+        self._conn.commit()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="reward-log-flusher", daemon=True)
+        self._thread.start()
+
+    def _migrate_legacy(self):
+        """Move rows from the original one-table layout (full text per row), once."""
+        legacy = self._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'reward_logs'"
+        ).fetchone()
+        if not legacy:
+            return
+        self._conn.create_function("sha256", 1, _hash, deterministic=True)
+        self._conn.executescript("""
+        INSERT OR IGNORE INTO reward_texts (hash, body)
+            SELECT sha256(text), text FROM reward_logs WHERE text IS NOT NULL
+            UNION SELECT sha256(reference_text), reference_text FROM reward_logs WHERE reference_text IS NOT NULL;
+        INSERT INTO reward_entries (text_hash, reference_hash, score, similarity, readability, errors, timestamp)
+            SELECT sha256(text), sha256(reference_text), score, similarity, readability, errors, timestamp
+            FROM reward_logs ORDER BY id;
+        DROP TABLE reward_logs;
+        """)
+
+    def log(self, text, reference_text, metrics):
+        text_hash, reference_hash = _hash(text), _hash(reference_text)
+        row = (
+            text_hash,
+            reference_hash,
+            metrics.get("score"),
+            metrics.get("similarity"),
+            metrics.get("readability"),
+            metrics.get("errors"),
+            metrics.get("reward_version"),
+            datetime.now().isoformat(),
+        )
+        with self._lock:
+            if text_hash:
+                self._texts.setdefault(text_hash, text)
+            if reference_hash:
+                self._texts.setdefault(reference_hash, reference_text)
+            self._rows.append(row)
+            due = len(self._rows) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffer in one transaction; on failure it is rolled back and the rows stay buffered."""
+        with self._lock:
+            rows, texts = self._rows, self._texts
+            self._last_flush = time.monotonic()
+            if not rows:
+                return 0
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO reward_texts (hash, body) VALUES (?, ?)", texts.items()
+                )
+                self._conn.executemany(
+                    "INSERT INTO reward_entries (text_hash, reference_hash, score, similarity, readability, "
+                    "errors, reward_version, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._rows, self._texts = [], {}
+            self.flushes += 1
+            return len(rows)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Reward log flush failed: {e}")
+
+    def _select(self, where="", params=(), order="e.id DESC", limit=10):
+        self.flush()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT e.id, t.body, r.body, e.score, e.similarity, e.readability, e.errors, e.timestamp "
+                "FROM reward_entries e "
+                "LEFT JOIN reward_texts t ON t.hash = e.text_hash "
+                "LEFT JOIN reward_texts r ON r.hash = e.reference_hash "
+                f"{where} ORDER BY {order} LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+
+    def fetch(self, limit=10, since=None):
+        """Newest rows first (optionally only those logged at/after ``since``, ISO string)."""
+        if since:
+            return self._select("WHERE e.timestamp >= ?", (since,), "e.timestamp DESC", limit)
+        return self._select(limit=limit)
+
+    def top(self, limit=10):
+        """Highest-scored rows (served by the score index)."""
+        return self._select(order="e.score DESC", limit=limit)
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+# ------------------------------
+# Module-level API (same calls as before)
+# ------------------------------
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = RewardLogWriter()
+            atexit.register(_writer.close)
+        return _writer
+
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS reward_logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        text TEXT,
-        reference_text TEXT,
-        score REAL,
-        similarity REAL,
-        readability REAL,
-        errors INTEGER,
-        timestamp TEXT
-    )
-    """)
-    conn.commit()
-    conn.close()
+    get_writer()
+
 
 def log_reward(text, reference_text, metrics: dict):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("""
-    INSERT INTO reward_logs (text, reference_text, score, similarity, readability, errors, timestamp)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (
-        text,
-        reference_text,
-        metrics.get("score"),
-        metrics.get("similarity"),
-        metrics.get("readability"),
-        metrics.get("errors"),
-        datetime.now().isoformat()
-    ))
-    conn.commit()
-    conn.close()
+    get_writer().log(text, reference_text, metrics)
+
 
 def fetch_logs(limit=10):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM reward_logs ORDER BY id DESC LIMIT ?", (limit,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    """Rows as (id, text, reference_text, score, similarity, readability, errors, timestamp)."""
+    return get_writer().fetch(limit)
@@ -0,0 +1,80 @@
+import os
+import threading
+
+from smart_reward_function import REWARD_VERSION, WEIGHTS, compute_rewards
+
+# ------------------------------
+# Reward functions by version id
+# ------------------------------
+# Every stored score carries the id of the formula that produced it
+# (metadata "reward_version"). Changing a formula means registering a new id
+# and making it current; versions scored under another id are then stale and
+# get re-scored in the background (see rl_search_algorithm.BackgroundRescorer).
+# Never change the weights of an id that is already in use.
+
+_rewards = {}
+_lock = threading.Lock()
+
+
+def register_reward(reward_version, weights, reference_text=None, description=""):
+    """
+    Register a reward formula: (similarity, readability, errors) ``weights``
+    and an optional fixed ``reference_text`` for similarity (otherwise the
+    caller's reference, if any, is used).
+    """
+    with _lock:
+        if reward_version in _rewards and _rewards[reward_version]["weights"] != tuple(weights):
+            raise ValueError(f"Reward {reward_version!r} is already registered with other weights")
+        _rewards[reward_version] = {
+            "id": reward_version,
+            "weights": tuple(weights),
+            "reference_text": reference_text,
+            "description": description,
+        }
+
+
+register_reward(REWARD_VERSION, WEIGHTS, description="smart_reward_function (dashboard, editor, rephrasing loop)")
+register_reward(
+    "leaderboard-v0",
+    (0.4, 0.5, -0.1),
+    reference_text="This is the original reference content of the chapter.",
+    description="original leaderboard_viewer formula against its fixed reference",
+)
+
+_current = os.getenv("REWARD_VERSION", REWARD_VERSION)
+
+
+def get_reward(reward_version=None):
+    reward_version = reward_version or _current
+    try:
+        return _rewards[reward_version]
+    except KeyError:
+        raise KeyError(f"Unknown reward version {reward_version!r}; registered: {sorted(_rewards)}") from None
+
+
+def current_version():
+    """Id of the formula new scores and leaderboards should use."""
+    return _current
+
+
+def set_current_version(reward_version):
+    global _current
+    get_reward(reward_version)
+    _current = reward_version
+
+
+def list_rewards():
+    return [dict(r) for r in _rewards.values()]
+
+
+def score_texts(texts, reward_version=None, reference_text=None):
+    """
+    Score ``texts`` with one registered formula (batched). Each dict has
+    score/similarity/readability/errors plus ``reward_version``.
+    """
+    reward = get_reward(reward_version)
+    reference = reward["reference_text"] or reference_text
+    return [
+        {**metrics, "reward_version": reward["id"]}
+        for metrics in compute_rewards(texts, reference, weights=reward["weights"])
+    ]
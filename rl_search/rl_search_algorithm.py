@@ -0,0 +1,259 @@
+import argparse
+import threading
+import time
+
+from reward_registry import current_version, score_texts
+from smart_reward_function import metrics_fields
+from version_store import (
+    BATCH_SIZE, collection_for, counter_key, find_versions, get_best_index, get_collection, get_documents,
+    read_metadata,
+)
+
+# ------------------------------
+# Best-version retrieval
+# ------------------------------
+# Scores are written with each version (store_version(..., **metrics_fields(m))),
+# and version_store keeps a top-K index per chapter. Selecting the best
+# version is an indexed lookup; a chapter is only scanned (and its stale or
+# unscored versions scored) the first time it is asked for under a reward
+# version.
+
+
+def is_stale(row, reward_version=None):
+    """Scored, but by another reward formula (re-scored in the background)."""
+    return "score" in row and row.get("reward_version") != (reward_version or current_version())
+
+
+def is_unscored(row):
+    """Never scored (e.g. a plain save); scored on demand by build_index(), not in the background."""
+    return "score" not in row
+
+
+def rescore(rows, collection, reward_version=None, batch_size=BATCH_SIZE):
+    """
+    Score ``rows`` (metadata dicts with ``id``) with ``reward_version``
+    (default: the current one) in batches, write the metrics back to Chroma,
+    offer them to the top-K index and return the rows with new metrics.
+    """
+    reward_version = reward_version or current_version()
+    index = get_best_index()
+    rescored = []
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        texts = get_documents([r["id"] for r in chunk], collection=collection)
+        chunk = [r for r in chunk if r["id"] in texts]
+        metrics = score_texts([texts[r["id"]] for r in chunk], reward_version)
+        updated = [{**r, **metrics_fields(m, reward_version)} for r, m in zip(chunk, metrics)]
+        if updated:
+            collection.update(
+                ids=[r["id"] for r in updated],
+                metadatas=[{k: v for k, v in r.items() if k not in ("id", "collection")} for r in updated],
+            )
+        for r in updated:
+            index.offer(counter_key(collection.name, r.get("book_id"), r.get("chapter_id")),
+                        reward_version, r["id"], collection.name, r.get("version"), r["score"])
+        rescored.extend(updated)
+    return rescored
+
+
+def build_index(chapter_id=None, book_id=None, user_id=None, collection=None, reward_version=None):
+    """
+    Full pass over one chapter: reuse stored scores from ``reward_version``,
+    score versions that have none (or an older one), then rebuild the
+    chapter's top-K entry. Returns the number of versions (re-)scored.
+    """
+    reward_version = reward_version or current_version()
+    collection = collection or collection_for(book_id, user_id)
+    rows = find_versions(book_id, chapter_id, collection=collection)
+    stale = [r for r in rows if is_unscored(r) or is_stale(r, reward_version)]
+    fresh = [r for r in rows if not (is_unscored(r) or is_stale(r, reward_version))]
+    if stale:
+        print(f"🔁 Re-scoring {len(stale)} version(s) with reward {reward_version}...")
+        fresh += rescore(stale, collection, reward_version)
+
+    get_best_index().rebuild(
+        counter_key(collection.name, book_id, chapter_id),
+        reward_version,
+        [{**r, "collection": collection.name} for r in fresh],
+    )
+    return len(stale)
+
+
+def top_versions(k=1, chapter_id=None, book_id=None, user_id=None, collection=None,
+                 reward_version=None, include_text=True, build=True):
+    """
+    The ``k`` best versions of a chapter under ``reward_version``, best
+    first. With ``build=False`` an index that is still being filled (e.g.
+    by the background re-scorer) is served as-is instead of blocking on a
+    full pass.
+    """
+    reward_version = reward_version or current_version()
+    collection = collection or collection_for(book_id, user_id)
+    index = get_best_index()
+    key = counter_key(collection.name, book_id, chapter_id)
+    if build and not index.is_complete(key, reward_version):
+        build_index(chapter_id, book_id, user_id, collection, reward_version)
+
+    rows = index.top(key, reward_version, k)
+    if include_text and rows:
+        texts = get_documents([r["id"] for r in rows], collection=collection)
+        for row in rows:
+            row["text"] = texts.get(row["id"])
+    return rows
+
+
+def select_best_version(chapter_id=None, book_id=None, user_id=None, collection=None):
+    """Best stored version of a chapter as ``{id, version, score, text, ...}``, or None."""
+    rows = top_versions(1, chapter_id, book_id, user_id, collection)
+    if not rows:
+        print("⚠️ No versions found.")
+        return None
+
+    best = rows[0]
+    print(f"🏆 Best version: {best['version']} (score {best['score']:.2f}, reward {current_version()})")
+    return best
+
+
+# ------------------------------
+# Background re-scoring after a reward change
+# ------------------------------
+class BackgroundRescorer:
+    """
+    Incrementally brings stored scores up to the current reward version.
+
+    Each step reads one page of metadata (no bodies), re-scores the stale
+    rows on it in a batch and moves on; after a full sweep that found
+    nothing stale, every chapter seen without unscored versions is marked
+    complete in the top-K index so best-version lookups stop rebuilding.
+    Versions that were never scored are left to build_index(), so a
+    collection of plain saves never loads the scoring models here.
+
+    Once clean, a step only compares ``collection.count()`` and the reward
+    version with the last sweep; a new sweep starts when either changes.
+    Runs in a daemon thread via ``start()``, or synchronously with
+    ``run_until_clean()``.
+    """
+
+    def __init__(self, collection=None, page_size=64, idle_seconds=30.0):
+        self.collection = collection or get_collection()
+        self.page_size = page_size
+        self.idle_seconds = idle_seconds
+        self.rescored = 0
+        self.last_sweep_stale = None   # stale rows found in the last full sweep
+        self.clean = False
+        self._offset = 0
+        self._sweep_stale = 0
+        self._sweep_keys = set()
+        self._unscored_keys = set()
+        self._sweep_version = None
+        self._swept_count = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def step(self):
+        """Process one page; returns the number of rows re-scored."""
+        reward_version = current_version()
+        if reward_version != self._sweep_version:
+            # Formula changed (mid-sweep or since the last one): start over
+            self._reset_sweep()
+            self._sweep_version = reward_version
+            self.clean = False
+        elif self.clean:
+            if self.collection.count() == self._swept_count:
+                return 0   # nothing new since the last clean sweep
+            self.clean = False
+
+        results = self.collection.get(limit=self.page_size, offset=self._offset, include=["metadatas"])
+        rows = [{"id": i, **read_metadata(m)} for i, m in zip(results["ids"], results["metadatas"])]
+        for r in rows:
+            key = counter_key(self.collection.name, r.get("book_id"), r.get("chapter_id"))
+            self._sweep_keys.add(key)
+            if is_unscored(r):
+                self._unscored_keys.add(key)
+
+        stale = [r for r in rows if is_stale(r, reward_version)]
+        if stale:
+            self.clean = False
+            rescore(stale, self.collection, reward_version)
+            self.rescored += len(stale)
+            self._sweep_stale += len(stale)
+
+        if len(rows) < self.page_size:
+            self._finish_sweep(reward_version)
+        else:
+            self._offset += self.page_size
+        return len(stale)
+
+    def _reset_sweep(self):
+        self._offset, self._sweep_stale = 0, 0
+        self._sweep_keys, self._unscored_keys = set(), set()
+
+    def _finish_sweep(self, reward_version):
+        self.last_sweep_stale = self._sweep_stale
+        if self._sweep_stale == 0:
+            index = get_best_index()
+            for key in self._sweep_keys:
+                # Chapters with unscored versions stay incomplete: the next lookup scores them
+                index.mark_complete(key, reward_version, complete=key not in self._unscored_keys)
+            self._swept_count = self.collection.count()
+            self.clean = True
+        self._reset_sweep()
+
+    def run_until_clean(self, max_steps=None):
+        """Sweep (again) until a full pass finds nothing stale; returns total re-scored."""
+        self.clean = False
+        steps = 0
+        while not self.clean and (max_steps is None or steps < max_steps):
+            self.step()
+            steps += 1
+        return self.rescored
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                print(f"⚠️ Background re-scoring failed: {e}")
+                self._stop.wait(self.idle_seconds)
+                continue
+            if self.clean:
+                self._stop.wait(self.idle_seconds)   # then a count() decides whether to sweep again
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="background-rescorer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        return {
+            "reward_version": current_version(),
+            "rescored": self.rescored,
+            "clean": self.clean,
+            "last_sweep_stale": self.last_sweep_stale,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the best stored version of a chapter.")
+    parser.add_argument("--book")
+    parser.add_argument("--chapter")
+    parser.add_argument("--top", type=int, default=1, help="Show the top-N versions")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the chapter's top-K index first")
+    parser.add_argument("--rescore-all", action="store_true",
+                        help="Bring every stored score up to the current reward version, then exit")
+    args = parser.parse_args()
+
+    if args.rescore_all:
+        start = time.perf_counter()
+        count = BackgroundRescorer().run_until_clean()
+        print(f"✅ Re-scored {count} version(s) with {current_version()} in {time.perf_counter() - start:.1f}s")
+    else:
+        if args.rebuild:
+            build_index(args.chapter, args.book)
+        for rank, row in enumerate(top_versions(args.top, args.chapter, args.book), 1):
+            print(f"\n#{rank} Version {row['version']} (score {row['score']:.2f}):\n{row['text']}")
@@ -1,77 +1,119 @@
 import textstat
-import language_tool_python
-from sentence_transformers import SentenceTransformer, util
+from embedding_cache import cos_sim, encode_cached
+from model_registry import EMBEDDING_MODEL_NAME, get_embedding_model, get_grammar_service
 
-# ------------------------------
-# Load embedding model once (cached)
-# ------------------------------
-model = SentenceTransformer(
-    "sentence-transformers/all-MiniLM-L6-v2",
-    cache_folder=".cache"   # works on local + Streamlit Cloud
-)
+# Embedding model + LanguageTool come from the shared model_registry
+# (loaded lazily on first use, one instance per process).
+
+# Bump whenever the weights or components below change: stored scores carry
+# this id, and versions scored under an older id are re-scored on demand.
+REWARD_VERSION = "smart-v1"
+WEIGHTS = (0.9, 0.9, -0.3)   # similarity, readability, grammar errors
 
 # ------------------------------
-# Use embedded LanguageTool (no external server needed)
+# Reward components
 # ------------------------------
-tool = language_tool_python.LanguageTool("en-US")
+def _readability(text):
+    try:
+        return float(textstat.flesch_reading_ease(text))
+    except Exception as e:
+        print(f"Readability computation error: {e}")
+        return 0.0
+
+
+def _grammar_errors(text):
+    try:
+        return int(get_grammar_service().count_errors(text))
+    except Exception as e:
+        print(f"LanguageTool error: {e}")
+        return 0
+
+
+def combine_metrics(similarity_score, readability_score, grammar_errors, weights=WEIGHTS):
+    """Weighted reward dict from the three components (shared with incremental_scorer)."""
+    w_sim, w_read, w_errors = weights
+    final_score = float(
+        (similarity_score * w_sim) + (readability_score * w_read) + (grammar_errors * w_errors)
+    )
+
+    return {
+        "score": round(final_score, 3),
+        "similarity": round(similarity_score, 3),
+        "readability": round(readability_score, 3),
+        "errors": grammar_errors
+    }
+
+
+def metrics_fields(metrics, reward_version=REWARD_VERSION):
+    """Reward dict → version metadata fields (score, similarity, ..., reward_version)."""
+    return {
+        "score": metrics["score"],
+        "similarity": metrics["similarity"],
+        "readability": metrics["readability"],
+        "errors": metrics["errors"],
+        "reward_version": reward_version,
+    }
+
 
 # ------------------------------
-# Compute Reward Function
+# Compute Rewards (batched)
 # ------------------------------
-def compute_reward(text, reference_text=None):
+def compute_rewards(texts, reference_text=None, weights=WEIGHTS):
     """
-    Compute reward metrics for a given text.
+    Compute reward metrics for many candidate texts at once.
+
+    The reference is encoded once and all candidates are encoded in a single
+    batched forward pass (via the shared embedding cache); similarities come
+    out of one cos_sim matrix op.
 
     Args:
-        text (str): User's draft/content
+        texts (list[str]): Candidate drafts to score
         reference_text (str): Optional reference content for similarity
+        weights (tuple): (similarity, readability, errors) weights; see reward_registry
 
     Returns:
-        dict: {score (float), similarity (float), readability (float), errors (int)}
+        list[dict]: One {score, similarity, readability, errors} dict per text,
+        in the same order as ``texts``
     """
+    texts = list(texts)
+    if not texts:
+        return []
 
     # ------------------------------
     # Similarity (if reference available)
     # ------------------------------
-    similarity_score = 0.0
+    similarities = [0.0] * len(texts)
     if reference_text:
         try:
-            embedding1 = model.encode(reference_text, convert_to_tensor=True)
-            embedding2 = model.encode(text, convert_to_tensor=True)
-            similarity_score = float(util.cos_sim(embedding1, embedding2).item() or 0.0)
+            # Reference + candidates in one cached batch; unchanged texts are never re-embedded
+            embeddings = encode_cached(get_embedding_model, EMBEDDING_MODEL_NAME, [reference_text, *texts])
+            scores = cos_sim(embeddings[0], embeddings[1:])
+            similarities = [float(s or 0.0) for s in scores.tolist()]
         except Exception as e:
             print(f"Embedding similarity error: {e}")
-            similarity_score = 0.0
+            similarities = [0.0] * len(texts)
 
     # ------------------------------
-    # Readability
+    # Readability + grammar (per text), then weighted score
     # ------------------------------
-    try:
-        readability_score = float(textstat.flesch_reading_ease(text))
-    except Exception as e:
-        print(f"Readability computation error: {e}")
-        readability_score = 0.0
+    return [
+        combine_metrics(similarity, _readability(text), _grammar_errors(text), weights)
+        for text, similarity in zip(texts, similarities)
+    ]
 
-    # ------------------------------
-    # Grammar errors
-    # ------------------------------
-    try:
-        grammar_matches = tool.check(text)
-        grammar_errors = int(len(grammar_matches))
-    except Exception as e:
-        print(f"LanguageTool error: {e}")
-        grammar_errors = 0
 
-    # ------------------------------
-    # Final weighted score
-    # ------------------------------
-    final_score = float(
-        (similarity_score * 0.9) + (readability_score * 0.9) - (grammar_errors * 0.3)
-    )
+# ------------------------------
+# Compute Reward Function
+# ------------------------------
+def compute_reward(text, reference_text=None):
+    """
+    Compute reward metrics for a given text.
 
-    return {
-        "score": round(final_score, 3),
-        "similarity": round(similarity_score, 3),
-        "readability": round(readability_score, 3),
-        "errors": grammar_errors
-    }
+    Args:
+        text (str): User's draft/content
+        reference_text (str): Optional reference content for similarity
+
+    Returns:
+        dict: {score (float), similarity (float), readability (float), errors (int)}
+    """
+    return compute_rewards([text], reference_text)[0]
@@ -1,41 +1,186 @@
-from supabase import create_client
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
 import streamlit as st
+from postgrest import SyncPostgrestClient
+from supabase import create_client
+
+from supabase_outbox import SupabaseOutbox
+
+# ------------------------------
+# Single Supabase data-access layer
+# ------------------------------
+# One client (and so one HTTP connection pool) per key per process, shared by
+# auth, database, feedback_engine and the dashboard. Reads project only the
+# listed columns, page by keyset on the primary key and are cached per user;
+# the cache is dropped when that user writes and again once the write has
+# been synced (writes go through SupabaseOutbox). A user's queued writes are
+# sent with the access token they were made with, never with whichever
+# session the shared client holds by the time the outbox drains.
+
+DOCUMENT_COLUMNS = "id,user_id,version,date"     # content is loaded on demand
+REWARD_COLUMNS = "id,user_id,version,score,similarity,readability,errors,timestamp"
+PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "500"))
+READ_CACHE_TTL = float(os.getenv("SUPABASE_READ_CACHE_TTL", "300"))
+TOKEN_CLIENTS = 16   # per-user REST clients kept for draining queued writes
+
+_KEYS = {"anon": "SUPABASE_ANON_KEY", "service": "SUPABASE_SERVICE_ROLE_KEY"}
+_QUEUES = {"anon": "user", "service": "feedback"}
+
+_clients = {}
+_layers = {}
+_lock = threading.Lock()
+
+
+def _setting(name):
+    # Prefer Streamlit secrets → then env vars
+    try:
+        value = st.secrets.get(name)
+    except FileNotFoundError:
+        value = None
+    return value or os.getenv(name)
+
+
+def get_client(role="anon"):
+    """The process-wide Supabase client for ``role`` ("anon" or "service")."""
+    with _lock:
+        if role not in _clients:
+            url, key = _setting("SUPABASE_URL"), _setting(_KEYS[role])
+            if not url or not key:
+                raise RuntimeError(
+                    f"Supabase keys missing. Set SUPABASE_URL and {_KEYS[role]} "
+                    "in .streamlit/secrets.toml or environment variables."
+                )
+            _clients[role] = create_client(url, key)
+        return _clients[role]
+
 
 class SupabaseClient:
-    def __init__(self):
-        self.url = st.secrets["SUPABASE_URL"]
-        self.key = st.secrets["SUPABASE_ANON_KEY"]
-        self.client = create_client(self.url, self.key)
+    """Reads and queued writes for the ``documents`` and ``reward_logs`` tables."""
+
+    def __init__(self, client=None, role="anon", page_size=PAGE_SIZE, cache_ttl=READ_CACHE_TTL):
+        self.client = client or get_client(role)
+        self.role = role
+        self.page_size = page_size
+        self.cache_ttl = cache_ttl
+        self._cache = {}    # user_id → {(table, columns): (fetched_at, rows)}
+        self._cache_lock = threading.Lock()
+        self._token_clients = OrderedDict()
+        self._token_lock = threading.Lock()
+        self.outbox = SupabaseOutbox(
+            self.client, queue=_QUEUES.get(role, role), on_sent=self._on_sent,
+            client_for_token=self.client_for_token,
+        ).start()
+
+    def client_for_token(self, access_token):
+        """A REST client that acts as the user of ``access_token`` (RLS applies as for them)."""
+        with self._token_lock:
+            client = self._token_clients.pop(access_token, None)
+            if client is None:
+                client = SyncPostgrestClient(
+                    f"{_setting('SUPABASE_URL').rstrip('/')}/rest/v1",
+                    headers={"apikey": _setting(_KEYS[self.role]), "Authorization": f"Bearer {access_token}"},
+                )
+            self._token_clients[access_token] = client
+            while len(self._token_clients) > TOKEN_CLIENTS:
+                _, old = self._token_clients.popitem(last=False)
+                old.session.close()
+            return client
+
+    # ------------------------------
+    # Read cache
+    # ------------------------------
+    def invalidate(self, user_id):
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+
+    def _on_sent(self, table, rows):
+        for user_id in {row.get("user_id") for row in rows}:
+            self.invalidate(user_id)
+
+    def _cached(self, user_id, table, columns, order):
+        key = (table, columns)
+        with self._cache_lock:
+            hit = self._cache.get(user_id, {}).get(key)
+        if hit and time.time() - hit[0] < self.cache_ttl:
+            return hit[1]
+
+        rows = sorted(self.iter_rows(table, user_id, columns), key=lambda r: r.get(order) or 0)
+        with self._cache_lock:
+            self._cache.setdefault(user_id, {})[key] = (time.time(), rows)
+        return rows
+
+    def iter_rows(self, table, user_id, columns):
+        """All of a user's rows, ``page_size`` at a time, by keyset on ``id`` (no OFFSET scans)."""
+        if "id" not in columns.split(","):
+            columns = "id," + columns
+        last_id = None
+        while True:
+            query = self.client.table(table).select(columns).eq("user_id", user_id)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            page = query.order("id").limit(self.page_size).execute().data or []
+            yield from page
+            if len(page) < self.page_size:
+                return
+            last_id = page[-1]["id"]
+
+    # ------------------------------
+    # Writes (queued; the UI never waits on Supabase)
+    # ------------------------------
+    def insert(self, table, row, access_token=None):
+        """
+        Queue ``row``; with ``access_token`` it is written as its ``user_id``
+        (only the id is queued, the token stays in memory). Returns the row id.
+        """
+        self.invalidate(row.get("user_id"))
+        owner = row.get("user_id") if access_token else None
+        return self.outbox.enqueue(table, row, owner, access_token)
 
     # Insert a new generated document
-    def save_document(self, user_id, version, content):
-        response = self.client.table("documents").insert({
+    def save_document(self, user_id, version, content, date=None, access_token=None):
+        return self.insert("documents", {
             "user_id": user_id,
-            "version": version,
-            "date": "now()",
-            "content": content
-        }).execute()
-        return response
+            "version": int(version),
+            "date": date or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "content": content,
+        }, access_token)
 
     # Insert reward feedback
-    def save_reward(self, user_id, version, score, similarity, readability, errors):
-        response = self.client.table("reward_logs").insert({
+    def save_reward(self, user_id, version, score, similarity, readability, errors, timestamp=None,
+                    access_token=None):
+        return self.insert("reward_logs", {
             "user_id": user_id,
-            "version": version,
-            "score": score,
-            "similarity": similarity,
-            "readability": readability,
-            "errors": errors,
-            "timestamp": "now()"
-        }).execute()
-        return response
-
-    # Fetch all user documents
-    def get_documents(self, user_id):
-        response = self.client.table("documents").select("*").eq("user_id", user_id).execute()
-        return response.data
-
-    # Fetch all reward logs
+            "version": int(version),
+            "score": float(score),
+            "similarity": float(similarity),
+            "readability": float(readability),
+            "errors": int(errors),
+            "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }, access_token)
+
+    # ------------------------------
+    # Reads (projected, paged, cached per user)
+    # ------------------------------
+    def get_documents(self, user_id, include_content=False):
+        columns = DOCUMENT_COLUMNS + (",content" if include_content else "")
+        return self._cached(user_id, "documents", columns, "version")
+
+    def get_document_content(self, document_id):
+        res = self.client.table("documents").select("content").eq("id", document_id).limit(1).execute()
+        return res.data[0]["content"] if res.data else None
+
     def get_rewards(self, user_id):
-        response = self.client.table("reward_logs").select("*").eq("user_id", user_id).execute()
-        return response.data
+        return self._cached(user_id, "reward_logs", REWARD_COLUMNS, "version")
+
+
+def get_data_access(role="anon"):
+    """The process-wide data-access layer for ``role``."""
+    client = get_client(role)
+    with _lock:
+        if role not in _layers:
+            _layers[role] = SupabaseClient(client, role)
+        return _layers[role]
@@ -0,0 +1,299 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+# ------------------------------
+# Defaults (override with env vars)
+# ------------------------------
+OUTBOX_PATH = os.getenv("SUPABASE_OUTBOX_PATH", os.path.join(".cache", "supabase_outbox.sqlite3"))
+BATCH_SIZE = int(os.getenv("SUPABASE_OUTBOX_BATCH_SIZE", "100"))
+MAX_ATTEMPTS = int(os.getenv("SUPABASE_OUTBOX_MAX_ATTEMPTS", "8"))
+BASE_BACKOFF_SECONDS = float(os.getenv("SUPABASE_OUTBOX_BACKOFF_SECONDS", "1.0"))
+MAX_BACKOFF_SECONDS = float(os.getenv("SUPABASE_OUTBOX_MAX_BACKOFF_SECONDS", "300"))
+POLL_SECONDS = float(os.getenv("SUPABASE_OUTBOX_POLL_SECONDS", "5.0"))
+
+# PostgREST answers for a missing/expired/invalid JWT: the row is fine, its
+# owner has to sign in again
+AUTH_ERROR_CODES = {"401", "PGRST301", "PGRST302", "PGRST303"}
+
+
+def _needs_reauth(error):
+    code = str(getattr(error, "code", "") or "")
+    return code in AUTH_ERROR_CODES or "jwt expired" in str(error).lower()
+
+
+class SupabaseOutbox:
+    """
+    Durable write-behind queue for Supabase inserts.
+
+    ``enqueue(table, row)`` commits the row to a local SQLite outbox and
+    returns at once; a daemon worker drains it, sending each table's pending
+    rows as one multi-row upsert per batch. A failed batch is retried row by
+    row with exponential backoff (so one bad row cannot hold back its
+    neighbours) and dead-lettered after ``max_attempts``. Rows survive
+    restarts and are sent on the next start.
+
+    Every row gets its primary key (``id``, a UUID) at enqueue time and is
+    sent as ``upsert(..., on_conflict="id", ignore_duplicates=True)``, so a
+    retry after a lost response cannot insert it twice. Rows enqueued with
+    an ``owner`` are sent as that user, through ``client_for_token(token)``,
+    not as whoever is signed in on ``client`` when the worker gets to them;
+    rows without one go through ``client`` (e.g. a service-role client).
+
+    Only the owner's user id is stored on disk. Their access token is kept in
+    memory (``set_token``, or ``enqueue(..., access_token=...)``) and looked
+    up when the row is sent. Rows whose owner has no token yet (e.g. after a
+    restart), or whose token was rejected as expired, wait without using up
+    attempts until the owner's next token arrives.
+
+    ``client`` only needs the table API used here:
+    ``client.table(name).upsert(rows, on_conflict=..., ignore_duplicates=...).execute()``
+    — any local fake with that shape works. Several outboxes (e.g. one per
+    Supabase client) can share one file under different ``queue`` names.
+    ``on_sent(table, rows)`` is called after each delivered batch (e.g. to
+    invalidate read caches).
+    """
+
+    def __init__(self, client, queue="default", path=OUTBOX_PATH, batch_size=BATCH_SIZE,
+                 max_attempts=MAX_ATTEMPTS, base_backoff=BASE_BACKOFF_SECONDS,
+                 max_backoff=MAX_BACKOFF_SECONDS, poll_seconds=POLL_SECONDS, on_sent=None,
+                 client_for_token=None):
+        self.client = client
+        self.client_for_token = client_for_token
+        self.queue = queue
+        self.on_sent = on_sent
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_seconds = poll_seconds
+        self.sent = 0
+        self.failures = 0
+        self.last_sync_at = None
+        self.last_error = None
+        self._tokens = {}     # owner → latest access token (memory only)
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()   # one drainer at a time (worker vs flush())
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            queue TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            enqueued_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            dead INTEGER NOT NULL DEFAULT 0,
+            owner TEXT
+        )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outbox)")}
+        if "owner" not in columns:   # outbox files from before per-row auth
+            self._conn.execute("ALTER TABLE outbox ADD COLUMN owner TEXT")
+        if "access_token" in columns:   # files that kept bearer tokens on disk
+            self._conn.execute(
+                "UPDATE outbox SET owner = json_extract(payload, '$.user_id') WHERE access_token IS NOT NULL"
+            )
+            self._conn.execute("UPDATE outbox SET access_token = NULL")
+            self._conn.execute("ALTER TABLE outbox DROP COLUMN access_token")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(queue, dead, next_attempt_at)"
+        )
+        self._conn.commit()
+
+    # ------------------------------
+    # Producer side (UI thread)
+    # ------------------------------
+    def enqueue(self, table, row, owner=None, access_token=None):
+        """
+        Persist ``row`` for ``table`` (sent as ``owner``, if given) and wake
+        the worker; returns the row's ``id``. ``access_token`` is the owner's
+        current token; it is kept in memory only.
+        """
+        row = {**row, "id": row.get("id") or str(uuid.uuid4())}
+        if owner is not None and access_token:
+            self._tokens[owner] = access_token
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (queue, table_name, payload, enqueued_at, next_attempt_at, owner) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.queue, table, json.dumps(row, default=str), now, now, owner),
+            )
+            self._conn.commit()
+        self._wake.set()
+        return row["id"]
+
+    def set_token(self, owner, access_token):
+        """Hand over ``owner``'s fresh access token, e.g. after a sign-in or refresh."""
+        if owner is None or not access_token or self._tokens.get(owner) == access_token:
+            return
+        self._tokens[owner] = access_token
+        self._wake.set()
+
+    # ------------------------------
+    # Worker side
+    # ------------------------------
+    def _due(self, limit):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, table_name, payload, attempts, owner FROM outbox "
+                "WHERE queue = ? AND dead = 0 AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (self.queue, time.time(), limit),
+            ).fetchall()
+
+    def _client(self, access_token):
+        if access_token and self.client_for_token is not None:
+            return self.client_for_token(access_token)
+        return self.client
+
+    def _send(self, table, items, owner=None):
+        """Upsert ``items`` ([(id, row, attempts)]) in one request; True on success."""
+        access_token = self._tokens.get(owner) if owner is not None else None
+        try:
+            self._client(access_token).table(table).upsert(
+                [row for _, row, _ in items], on_conflict="id", ignore_duplicates=True,
+            ).execute()
+        except Exception as e:
+            if owner is not None and _needs_reauth(e):
+                # Not the row's fault: hold it until the owner's next token
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self._tokens.get(owner) == access_token:
+                    self._tokens.pop(owner, None)
+            else:
+                self._failed(items, e)
+            return False
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i, _, _ in items])
+            self._conn.commit()
+        self.sent += len(items)
+        self.last_sync_at = time.time()
+        if self.on_sent:
+            self.on_sent(table, [row for _, row, _ in items])
+        return True
+
+    def _failed(self, items, error):
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        now = time.time()
+        updates = []
+        for outbox_id, _, attempts in items:
+            attempts += 1
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+            updates.append((
+                attempts, now + delay * random.uniform(0.5, 1.0), self.last_error,
+                int(attempts >= self.max_attempts), outbox_id,
+            ))
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, dead = ? WHERE id = ?",
+                updates,
+            )
+            self._conn.commit()
+
+    def drain_once(self):
+        """Send one round of due rows; returns the number delivered."""
+        with self._drain_lock:
+            return self._drain()
+
+    def _drain(self):
+        first_try, retries = {}, []
+        for outbox_id, table, payload, attempts, owner in self._due(self.batch_size):
+            if owner is not None and owner not in self._tokens:
+                continue   # waiting for its owner to sign in again
+            item = (outbox_id, json.loads(payload), attempts)
+            if attempts:
+                retries.append(((table, owner), [item]))
+            else:
+                first_try.setdefault((table, owner), []).append(item)
+
+        delivered = 0
+        for (table, owner), items in list(first_try.items()) + retries:
+            if self._send(table, items, owner):
+                delivered += len(items)
+            elif retries and items is retries[0][1]:
+                break   # the oldest retry still fails: Supabase is likely down, back off
+        return delivered
+
+    def flush(self, timeout=30.0):
+        """Drain until nothing is due (or ``timeout``); returns True if the outbox is empty."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.drain_once():
+                break
+        return self.status()["depth"] == 0
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                while self.drain_once():
+                    pass
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Supabase outbox worker: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name=f"supabase-outbox-{self.queue}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # ------------------------------
+    # Observability
+    # ------------------------------
+    def status(self):
+        """Queue depth, dead letters, rows awaiting re-auth and sync lag (age of the oldest pending row)."""
+        with self._lock:
+            depth, oldest = self._conn.execute(
+                "SELECT COUNT(*), MIN(enqueued_at) FROM outbox WHERE queue = ? AND dead = 0", (self.queue,)
+            ).fetchone()
+            dead = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE queue = ? AND dead = 1", (self.queue,)
+            ).fetchone()[0]
+            owners = self._conn.execute(
+                "SELECT owner, COUNT(*) FROM outbox WHERE queue = ? AND dead = 0 AND owner IS NOT NULL "
+                "GROUP BY owner", (self.queue,)
+            ).fetchall()
+        return {
+            "queue": self.queue,
+            "depth": depth,
+            "dead": dead,
+            "awaiting_auth": sum(n for owner, n in owners if owner not in self._tokens),
+            "lag_seconds": round(time.time() - oldest, 1) if oldest else 0.0,
+            "sent": self.sent,
+            "failures": self.failures,
+            "last_sync_at": self.last_sync_at,
+            "last_error": self.last_error,
+            "running": bool(self._thread and self._thread.is_alive()),
+        }
+
+    def requeue_dead(self):
+        """Give dead-lettered rows a fresh set of attempts; returns how many."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE outbox SET dead = 0, attempts = 0, next_attempt_at = ? WHERE queue = ? AND dead = 1",
+                (time.time(), self.queue),
+            )
+            self._conn.commit()
+        self._wake.set()
+        return cur.rowcount
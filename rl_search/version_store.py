@@ -0,0 +1,707 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+import chromadb
+
+from embedding_cache import encode_cached
+from model_registry import EMBEDDING_MODEL_NAME, get_embedding_model
+
+# ------------------------------
+# Chroma location (same folder every script has always used)
+# ------------------------------
+CHROMA_PATH = os.getenv("CHROMA_PATH", ".chroma_store")
+COLLECTION_NAME = "chapter_versions"
+BATCH_SIZE = int(os.getenv("CHROMA_BATCH_SIZE", "512"))
+# "single" → everything in chapter_versions (original layout)
+# "book"   → one collection per book_id
+# "tenant" → one collection per user_id (+ book_id when given)
+LAYOUT = os.getenv("CHROMA_LAYOUT", "single")
+
+# ------------------------------
+# Metadata schema (Chroma metadata values must be str / int / float / bool)
+# ------------------------------
+SCHEMA = {
+    "book_id": str,
+    "chapter_id": str,
+    "user_id": str,
+    "version": int,
+    "score": float,
+    "similarity": float,
+    "readability": float,
+    "errors": int,
+    "reward_version": str,   # which reward formula produced score/similarity/...
+    "created_at": int,   # epoch seconds, so range filters work
+    "date": str,         # human-readable, kept for existing views
+}
+
+_client = None
+_collections = {}
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            _client = chromadb.PersistentClient(path=CHROMA_PATH)
+        return _client
+
+
+def get_collection(name=COLLECTION_NAME):
+    client = get_client()
+    with _lock:
+        if name not in _collections:
+            _collections[name] = client.get_or_create_collection(name)
+        return _collections[name]
+
+
+def forget_collection(name=COLLECTION_NAME):
+    """Drop the cached handle, e.g. after the collection was deleted/reset."""
+    with _lock:
+        _collections.pop(name, None)
+
+
+def _slug(value):
+    slug = re.sub(r"[^a-zA-Z0-9_-]+", "-", str(value)).strip("-_") or "x"
+    return slug[:40]
+
+
+def collection_name_for(book_id=None, user_id=None, layout=None):
+    """Collection that holds versions for this book/tenant under ``layout``."""
+    layout = layout or LAYOUT
+    if layout == "book" and book_id:
+        name = f"book_{_slug(book_id)}"
+    elif layout == "tenant" and user_id:
+        name = f"tenant_{_slug(user_id)}" + (f"_book_{_slug(book_id)}" if book_id else "")
+    else:
+        return COLLECTION_NAME
+    if len(name) > 63:   # Chroma name limit; keep it unique with a short hash
+        name = name[:54] + "_" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+    return name
+
+
+def collection_for(book_id=None, user_id=None, layout=None):
+    return get_collection(collection_name_for(book_id, user_id, layout))
+
+
+def version_id(version_number, book_id=None, chapter_id=None):
+    """``version_<n>`` for the legacy single-chapter layout, else chapter-scoped."""
+    if book_id is None and chapter_id is None:
+        return f"version_{version_number}"
+    return f"{book_id or '-'}:{chapter_id or '-'}:version_{version_number}"
+
+
+def _to_int(value):
+    """"3" / 3.0 → 3; "3.7" is rejected rather than truncated."""
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"{value!r} is not a whole number")
+    return int(number)
+
+
+def normalize_metadata(metadata):
+    """
+    Coerce metadata to SCHEMA types (e.g. "3" → 3 for version) and drop
+    None values, which Chroma rejects. Unknown keys are kept as-is; a
+    non-integral version ("3.7") raises ValueError, other invalid values
+    are dropped.
+    """
+    out = {}
+    for key, value in (metadata or {}).items():
+        if value is None:
+            continue
+        cast = SCHEMA.get(key)
+        if cast is not None:
+            try:
+                value = _to_int(value) if cast is int else cast(value)
+            except (TypeError, ValueError):
+                if key == "version":
+                    raise ValueError(f"version must be an integer, got {value!r}")
+                continue
+        out[key] = value
+    return out
+
+
+def read_metadata(metadata):
+    """
+    Stored metadata as SCHEMA types, for rows written before the schema
+    (string versions etc.) that migrate_metadata() has not rewritten yet.
+    """
+    try:
+        return normalize_metadata(metadata)
+    except ValueError:
+        return dict(metadata or {})
+
+
+def where_filter(**fields):
+    """Chroma ``where`` clause for equality on the given (non-None) fields."""
+    clauses = [{k: v} for k, v in normalize_metadata(fields).items()]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _embed(texts):
+    """
+    Embed with the same model Chroma's default embedding function uses
+    (all-MiniLM-L6-v2), through the shared cache, so texts already encoded
+    for scoring are not encoded again. Returns None if the model is
+    unavailable; Chroma then embeds the documents itself.
+    """
+    try:
+        return [list(map(float, v)) for v in encode_cached(get_embedding_model, EMBEDDING_MODEL_NAME, texts)]
+    except RuntimeError as e:
+        print(f"⚠️ Embedding model unavailable, letting Chroma embed: {e}")
+        return None
+
+
+def _upsert(collection, ids, documents, metadatas, embeddings, batch_size):
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.upsert(
+            ids=ids[start:end],
+            documents=documents[start:end],
+            metadatas=metadatas[start:end],
+            embeddings=embeddings[start:end] if embeddings is not None else None,
+        )
+
+
+def store_versions(batch, collection=None, embed=True, batch_size=BATCH_SIZE):
+    """
+    Upsert many versions with as few Chroma calls as possible.
+
+    ``batch`` is an iterable of dicts with ``text`` and ``version`` and
+    optionally ``book_id``, ``chapter_id``, ``user_id``, ``score``,
+    ``embedding`` (precomputed vector), ``metadata`` (extra fields) and
+    ``id`` (defaults to version_id()). Without an explicit ``collection``
+    each item goes to collection_for(book_id, user_id); callers that read
+    and count a collection themselves should pass it, so writes land where
+    they look.
+
+    Writes are idempotent upserts: re-running an ingest or saving the same
+    version twice overwrites instead of failing on a duplicate id (within a
+    batch the last entry for an id wins). Missing embeddings are filled in
+    one batched call when ``embed`` is true. Returns the ids written.
+    """
+    now = datetime.now()
+    defaults = {"date": now.strftime("%Y-%m-%d %H:%M:%S"), "created_at": int(now.timestamp())}
+
+    groups = {}   # collection name → {id: (text, metadata, embedding)}
+    targets = {}
+    all_ids = []
+    for item in batch:
+        fields = {k: item[k] for k in SCHEMA if k in item}
+        metadata = normalize_metadata({**defaults, **(item.get("metadata") or {}), **fields})
+        target = collection or collection_for(metadata.get("book_id"), metadata.get("user_id"))
+        doc_id = item.get("id") or version_id(metadata["version"], metadata.get("book_id"), metadata.get("chapter_id"))
+        targets[target.name] = target
+        groups.setdefault(target.name, {})[doc_id] = (item["text"], metadata, item.get("embedding"))
+        all_ids.append(doc_id)
+    if not groups:
+        return []
+
+    counter = get_version_counter()
+    for name, items in groups.items():
+        ids = list(items)
+        documents = [items[i][0] for i in ids]
+        metadatas = [items[i][1] for i in ids]
+        embeddings = [items[i][2] for i in ids]
+
+        missing = [k for k, e in enumerate(embeddings) if e is None]
+        if missing and embed:
+            computed = _embed([documents[k] for k in missing])
+            if computed is not None:
+                for k, vector in zip(missing, computed):
+                    embeddings[k] = vector
+        if any(e is None for e in embeddings):
+            embeddings = None   # Chroma needs all or none per call
+        else:
+            embeddings = [list(map(float, e)) for e in embeddings]
+
+        _upsert(targets[name], ids, documents, metadatas, embeddings, batch_size)
+
+        latest = {}
+        for m in metadatas:
+            key = counter_key(name, m.get("book_id"), m.get("chapter_id"))
+            latest[key] = max(latest.get(key, m["version"]), m["version"])
+        for key, version in latest.items():
+            counter.observe(key, version)
+
+        # Keep the per-chapter top-K index current so "best version" never rescans
+        index = get_best_index()
+        for doc_id, m in zip(ids, metadatas):
+            if "score" in m and "reward_version" in m:
+                index.offer(counter_key(name, m.get("book_id"), m.get("chapter_id")), m["reward_version"],
+                            doc_id, name, m["version"], m["score"])
+
+    return list(dict.fromkeys(all_ids))
+
+
+def store_version(text, version_number, metadata=None, embedding=None, collection=None, **fields):
+    """
+    Single-version convenience wrapper around store_versions(); ``fields``
+    are schema fields such as book_id, chapter_id, user_id, score.
+    """
+    item = {"text": text, "version": version_number, "metadata": metadata, "embedding": embedding, **fields}
+    return store_versions([item], collection=collection)[0]
+
+
+def migrate_metadata(collection=None, batch_size=BATCH_SIZE):
+    """
+    One-off: rewrite existing metadata to SCHEMA types (string versions →
+    int, created_at from date) so ``where`` filters match old rows too.
+    Returns the number of rows updated.
+    """
+    collection = collection or get_collection()
+    total = collection.count()
+    updated = 0
+    for offset in range(0, total, batch_size):
+        results = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+        ids, metadatas = [], []
+        for doc_id, meta in zip(results["ids"], results["metadatas"]):
+            meta = dict(meta or {})
+            if "created_at" not in meta and meta.get("date"):
+                try:
+                    meta["created_at"] = int(datetime.strptime(meta["date"], "%Y-%m-%d %H:%M:%S").timestamp())
+                except ValueError:
+                    pass
+            try:
+                fixed = normalize_metadata(meta)
+            except ValueError:
+                continue
+            if fixed != meta or any(type(fixed[k]) is not type(meta[k]) for k in fixed if k in meta):
+                ids.append(doc_id)
+                metadatas.append(fixed)
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+    return updated
+
+
+# ------------------------------
+# Filtered queries (Chroma ``where``; only the matching rows are read)
+# ------------------------------
+def find_versions(book_id=None, chapter_id=None, user_id=None, where=None, limit=None,
+                  include_documents=False, collection=None):
+    """
+    Versions matching the given fields (plus any extra ``where`` clause),
+    as metadata rows with ``id`` (and ``text`` when ``include_documents``).
+    """
+    collection = collection or collection_for(book_id, user_id)
+    clause = where_filter(book_id=book_id, chapter_id=chapter_id, user_id=user_id)
+    if where:
+        clause = {"$and": [clause, where]} if clause else where
+    include = ["metadatas", "documents"] if include_documents else ["metadatas"]
+    results = collection.get(where=clause, limit=limit, include=include)
+    rows = [{"id": i, **read_metadata(m)} for i, m in zip(results["ids"], results["metadatas"])]
+    if include_documents:
+        for row, doc in zip(rows, results["documents"]):
+            row["text"] = doc
+    return rows
+
+
+# ------------------------------
+# Browsing (paged, metadata-only; bodies loaded on demand)
+# ------------------------------
+def count_versions(collection=None):
+    return (collection or get_collection()).count()
+
+
+def list_versions(limit=20, offset=0, newest_first=True, collection=None):
+    """
+    One page of version metadata (no document bodies, no embeddings).
+
+    Chroma pages in insertion order; with ``newest_first`` the page is taken
+    from the end so page 0 holds the latest saves. Each row is the stored
+    metadata plus its ``id``.
+    """
+    collection = collection or get_collection()
+    if newest_first:
+        total = collection.count()
+        end = max(total - offset, 0)
+        offset, limit = max(end - limit, 0), min(limit, end)
+        if limit == 0:
+            return []
+    results = collection.get(limit=limit, offset=offset, include=["metadatas"])
+    rows = [{"id": i, **read_metadata(m)} for i, m in zip(results["ids"], results["metadatas"])]
+    return rows[::-1] if newest_first else rows
+
+
+def get_documents(ids, collection=None):
+    """Document bodies for just ``ids``, as ``{id: text}``."""
+    if not ids:
+        return {}
+    results = (collection or get_collection()).get(ids=list(ids), include=["documents"])
+    return dict(zip(results["ids"], results["documents"]))
+
+
+# ------------------------------
+# Semantic search (Chroma HNSW index over the stored embeddings)
+# ------------------------------
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.97"))
+
+
+def _to_similarity(distance, collection):
+    """Chroma distance → cosine similarity for the collection's HNSW space (unit vectors)."""
+    space = (getattr(collection, "metadata", None) or {}).get("hnsw:space", "l2")
+    if space == "l2":
+        return 1.0 - distance / 2.0   # squared L2 between unit vectors = 2 - 2cos
+    return 1.0 - distance             # cosine / ip distances
+
+
+def embed_query(texts):
+    """Unit-length query embeddings (same model as the stored ones), or None."""
+    vectors = _embed(list(texts))
+    if vectors is None:
+        return None
+    out = []
+    for v in vectors:
+        norm = sum(x * x for x in v) ** 0.5 or 1.0
+        out.append([x / norm for x in v])
+    return out
+
+
+def similar_versions_many(embeddings, k=5, book_id=None, chapter_id=None, user_id=None,
+                          collection=None, include_documents=False):
+    """
+    One ``collection.query`` for many query vectors. Returns, per query, up
+    to ``k`` rows (metadata + ``id`` + ``similarity``), most similar first.
+    """
+    collection = collection or collection_for(book_id, user_id)
+    if not embeddings:
+        return []
+    total = collection.count()
+    if not total:
+        return [[] for _ in embeddings]
+
+    include = ["metadatas", "distances"] + (["documents"] if include_documents else [])
+    results = collection.query(
+        query_embeddings=[list(map(float, e)) for e in embeddings],
+        n_results=min(k, total),
+        where=where_filter(book_id=book_id, chapter_id=chapter_id, user_id=user_id),
+        include=include,
+    )
+    out = []
+    for q in range(len(embeddings)):
+        rows = []
+        for j, doc_id in enumerate(results["ids"][q]):
+            row = {"id": doc_id, **read_metadata(results["metadatas"][q][j])}
+            row["similarity"] = round(_to_similarity(results["distances"][q][j], collection), 4)
+            if include_documents:
+                row["text"] = results["documents"][q][j]
+            rows.append(row)
+        out.append(rows)
+    return out
+
+
+def similar_versions(text=None, embedding=None, k=5, book_id=None, chapter_id=None, user_id=None,
+                     collection=None, include_documents=False):
+    """Stored versions closest to ``text`` (or a precomputed ``embedding``)."""
+    if embedding is None:
+        embeddings = embed_query([text])
+        if embeddings is None:
+            return []
+        embedding = embeddings[0]
+    return similar_versions_many([embedding], k, book_id, chapter_id, user_id, collection, include_documents)[0]
+
+
+def duplicate_candidates(threshold=NEAR_DUPLICATE_THRESHOLD, k=5, page_size=64, collection=None):
+    """
+    Near-duplicate pairs across a collection: each page of stored
+    embeddings is queried against the index in one call. Returns
+    ``(id_a, id_b, similarity)`` tuples, each pair once, most similar first.
+    """
+    collection = collection or get_collection()
+    pairs = {}
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        page = collection.get(limit=page_size, offset=offset, include=["embeddings"])
+        if not page["ids"]:
+            break
+        matches = similar_versions_many(page["embeddings"], k + 1, collection=collection)
+        for doc_id, rows in zip(page["ids"], matches):
+            for row in rows:
+                if row["id"] != doc_id and row["similarity"] >= threshold:
+                    pair = tuple(sorted((doc_id, row["id"])))
+                    pairs[pair] = max(pairs.get(pair, 0.0), row["similarity"])
+    return sorted(((a, b, sim) for (a, b), sim in pairs.items()), key=lambda p: p[2], reverse=True)
+
+
+# ------------------------------
+# Version numbers (atomic, O(1) per save)
+# ------------------------------
+COUNTER_PATH = os.getenv("VERSION_COUNTER_PATH", os.path.join(CHROMA_PATH, "version_counters.sqlite3"))
+
+
+def counter_key(name=COLLECTION_NAME, book_id=None, chapter_id=None):
+    if book_id is None and chapter_id is None:
+        return name
+    return f"{name}/{book_id or '-'}/{chapter_id or '-'}"
+
+
+def _max_version(collection, where=None):
+    """One-off scan used only to seed a chapter's counter from existing data."""
+    results = collection.get(where=where, include=["metadatas"])
+    versions = []
+    for meta in results.get("metadatas") or []:
+        try:
+            versions.append(int((meta or {}).get("version")))
+        except (TypeError, ValueError):
+            continue
+    return max(versions, default=0)
+
+
+class VersionCounter:
+    """
+    Per-chapter "last version number" in SQLite.
+
+    ``allocate`` increments inside a ``BEGIN IMMEDIATE`` transaction, so two
+    editors (threads or processes) saving at the same time always get
+    different numbers. The collection is scanned once per chapter, the
+    first time a counter is created, never on ordinary saves.
+    """
+
+    def __init__(self, path=COUNTER_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS version_counters (
+            chapter TEXT PRIMARY KEY,
+            last_version INTEGER NOT NULL
+        )
+        """)
+
+    def allocate(self, chapter, seed=None):
+        """Return the next version number for ``chapter``; ``seed()`` gives the starting max."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT last_version FROM version_counters WHERE chapter = ?", (chapter,)
+                ).fetchone()
+                version = (row[0] if row else (seed() if seed else 0)) + 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO version_counters (chapter, last_version) VALUES (?, ?)",
+                    (chapter, version),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return version
+
+    def observe(self, chapter, version):
+        """Keep an existing counter ahead of a version number written explicitly."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE version_counters SET last_version = ? WHERE chapter = ? AND last_version < ?",
+                (version, chapter, version),
+            )
+
+    def reset(self, name):
+        """Forget the counters of a collection (all its chapters)."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM version_counters WHERE chapter = ? OR chapter LIKE ?", (name, f"{name}/%")
+            )
+
+
+_counter = None
+
+
+def get_version_counter():
+    global _counter
+    with _lock:
+        if _counter is None:
+            _counter = VersionCounter()
+        return _counter
+
+
+def allocate_version(name=None, collection=None, book_id=None, chapter_id=None, user_id=None):
+    """
+    Atomically reserve the next version number for a chapter (O(1) once its
+    counter exists). Without book/chapter ids the whole collection is one
+    chapter, as in the original single-chapter layout.
+    """
+    collection = collection or (get_collection(name) if name else collection_for(book_id, user_id))
+    where = where_filter(book_id=book_id, chapter_id=chapter_id)
+    return get_version_counter().allocate(
+        counter_key(collection.name, book_id, chapter_id),
+        seed=lambda: _max_version(collection, where),
+    )
+
+
+# ------------------------------
+# Per-chapter top-K index by stored score
+# ------------------------------
+INDEX_PATH = os.getenv("BEST_INDEX_PATH", os.path.join(CHROMA_PATH, "best_versions.sqlite3"))
+TOP_K = int(os.getenv("BEST_VERSIONS_TOP_K", "10"))
+
+
+class TopKIndex:
+    """
+    The ``k`` highest-scored versions per (chapter, reward_version).
+
+    Fed on every write that carries a score, so the best version is an
+    indexed lookup. A (chapter, reward_version) pair is marked ``complete``
+    once it has been built from a full pass over the chapter; until then
+    the index may only know about versions written since, and callers
+    should rebuild it first.
+
+    Entries are trimmed to ``k``, so when an indexed version comes back with
+    a lower score a trimmed one may now belong in the top-K: the pair then
+    needs a rebuild, and only ``rebuild`` makes it complete again.
+    """
+
+    def __init__(self, path=INDEX_PATH, k=TOP_K):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.k = k
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS best_versions (
+            chapter TEXT NOT NULL,
+            reward_version TEXT NOT NULL,
+            doc_id TEXT NOT NULL,
+            collection TEXT NOT NULL,
+            version INTEGER,
+            score REAL NOT NULL,
+            PRIMARY KEY (chapter, reward_version, doc_id)
+        )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_best_score ON best_versions(chapter, reward_version, score DESC)"
+        )
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS best_index_state (
+            chapter TEXT NOT NULL,
+            reward_version TEXT NOT NULL,
+            complete INTEGER NOT NULL,
+            PRIMARY KEY (chapter, reward_version)
+        )
+        """)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS best_index_rebuild (
+            chapter TEXT NOT NULL,
+            reward_version TEXT NOT NULL,
+            PRIMARY KEY (chapter, reward_version)
+        )
+        """)
+        self._conn.commit()
+
+    def _offer(self, chapter, reward_version, doc_id, collection, version, score):
+        """Insert/replace one entry and trim to ``k``; True if an indexed score dropped in a full entry."""
+        previous = self._conn.execute(
+            "SELECT score FROM best_versions WHERE chapter = ? AND reward_version = ? AND doc_id = ?",
+            (chapter, reward_version, doc_id),
+        ).fetchone()
+        size = self._conn.execute(
+            "SELECT COUNT(*) FROM best_versions WHERE chapter = ? AND reward_version = ?",
+            (chapter, reward_version),
+        ).fetchone()[0]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO best_versions VALUES (?, ?, ?, ?, ?, ?)",
+            (chapter, reward_version, doc_id, collection, version, float(score)),
+        )
+        self._conn.execute(
+            "DELETE FROM best_versions WHERE chapter = ? AND reward_version = ? AND doc_id NOT IN "
+            "(SELECT doc_id FROM best_versions WHERE chapter = ? AND reward_version = ? "
+            "ORDER BY score DESC LIMIT ?)",
+            (chapter, reward_version, chapter, reward_version, self.k),
+        )
+        return previous is not None and float(score) < previous[0] and size >= self.k
+
+    def offer(self, chapter, reward_version, doc_id, collection, version, score):
+        with self._lock:
+            if self._offer(chapter, reward_version, doc_id, collection, version, score):
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO best_index_rebuild VALUES (?, ?)", (chapter, reward_version)
+                )
+            self._conn.commit()
+
+    def rebuild(self, chapter, reward_version, rows):
+        """Replace the entry with ``rows`` (dicts with id, collection, version, score) and mark it complete."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM best_versions WHERE chapter = ? AND reward_version = ?", (chapter, reward_version)
+            )
+            for row in rows:
+                self._offer(chapter, reward_version, row["id"], row["collection"], row.get("version"), row["score"])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO best_index_state VALUES (?, ?, 1)", (chapter, reward_version)
+            )
+            self._conn.execute(
+                "DELETE FROM best_index_rebuild WHERE chapter = ? AND reward_version = ?", (chapter, reward_version)
+            )
+            self._conn.commit()
+
+    def mark_complete(self, chapter, reward_version, complete=True):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO best_index_state VALUES (?, ?, ?)", (chapter, reward_version, int(complete))
+            )
+            self._conn.commit()
+
+    def is_complete(self, chapter, reward_version):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT complete FROM best_index_state WHERE chapter = ? AND reward_version = ?",
+                (chapter, reward_version),
+            ).fetchone()
+            needs_rebuild = self._conn.execute(
+                "SELECT 1 FROM best_index_rebuild WHERE chapter = ? AND reward_version = ?",
+                (chapter, reward_version),
+            ).fetchone()
+        return bool(row and row[0]) and not needs_rebuild
+
+    def top(self, chapter, reward_version, k=1):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, collection, version, score FROM best_versions "
+                "WHERE chapter = ? AND reward_version = ? ORDER BY score DESC, version DESC LIMIT ?",
+                (chapter, reward_version, k),
+            ).fetchall()
+        return [{"id": r[0], "collection": r[1], "version": r[2], "score": r[3]} for r in rows]
+
+    def forget(self, name):
+        """Drop every entry of a collection (e.g. after it was reset)."""
+        with self._lock:
+            for table in ("best_versions", "best_index_state", "best_index_rebuild"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE chapter = ? OR chapter LIKE ?", (name, f"{name}/%")
+                )
+            self._conn.commit()
+
+
+_best_index = None
+
+
+def get_best_index():
+    global _best_index
+    with _lock:
+        if _best_index is None:
+            _best_index = TopKIndex()
+        return _best_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Version store maintenance.")
+    parser.add_argument("--migrate", action="store_true",
+                        help="Rewrite stored metadata to the typed schema (string versions → int, created_at)")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    args = parser.parse_args()
+
+    target = get_collection(args.collection)
+    if args.migrate:
+        print(f"✅ Migrated {migrate_metadata(target)} row(s) in {args.collection}")
+    print(f"📊 {target.count()} version(s) in {args.collection}")
@@ -0,0 +1,108 @@
+import asyncio
+import io
+import os
+import time
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow, "webp" falls back to JPEG
+    Image = None
+
+# ------------------------------
+# Defaults (override with env vars or crawl() arguments)
+# ------------------------------
+# Off unless asked for: any screenshot mode launches Chromium, even for pages read over HTTP
+SCREENSHOT_MODE = os.getenv("SCREENSHOT_MODE", "off")          # inline | deferred | off
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "webp")     # webp | jpeg | png
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "70"))
+MAX_TILES = int(os.getenv("SCREENSHOT_MAX_TILES", "20"))      # 0 = no cap
+
+_EXTENSIONS = {"webp": "webp", "jpeg": "jpg", "png": "png"}
+
+
+def normalize_mode(screenshots):
+    """Accept the old boolean flag as well as "inline" / "deferred" / "off"."""
+    if screenshots is True:
+        return "inline"
+    if screenshots in (False, None):
+        return "off"
+    if screenshots not in ("inline", "deferred", "off"):
+        raise ValueError(f"Unknown screenshot mode: {screenshots!r}")
+    return screenshots
+
+
+def _to_webp(png_bytes, quality):
+    """Re-encode a lossless capture as WebP (Playwright only emits PNG/JPEG)."""
+    image = Image.open(io.BytesIO(png_bytes))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+async def _capture_tile(page, clip, fmt, quality):
+    if fmt == "webp" and Image is not None:
+        png = await page.screenshot(clip=clip, full_page=True, type="png")
+        return await asyncio.to_thread(_to_webp, png, quality), "webp"
+    if fmt in ("webp", "jpeg"):
+        return await page.screenshot(clip=clip, full_page=True, type="jpeg", quality=quality), "jpeg"
+    return await page.screenshot(clip=clip, full_page=True, type="png"), "png"
+
+
+async def capture(page, out_base, fmt=SCREENSHOT_FORMAT, quality=SCREENSHOT_QUALITY, max_tiles=MAX_TILES):
+    """
+    Capture the already-loaded ``page`` as viewport-sized tiles.
+
+    Tiles are written as ``<out_base>_screenshot_<n>.<ext>`` from the top of
+    the page down, at most ``max_tiles`` of them (0 or less: no cap). A page
+    longer than the cap is cut off rather than rendered as one huge bitmap,
+    with a warning and ``"truncated": true`` in the record. Returns the
+    manifest record: format, quality, tiles (path + bytes), total bytes and
+    seconds.
+    """
+    started = time.perf_counter()
+    viewport = page.viewport_size or {"width": 1280, "height": 720}
+    width, tile_height = viewport["width"], viewport["height"]
+    page_height = await page.evaluate("document.documentElement.scrollHeight")
+
+    tiles = []
+    used = fmt
+    y = 0
+    while y < page_height and (max_tiles <= 0 or len(tiles) < max_tiles):
+        clip = {"x": 0, "y": y, "width": width, "height": min(tile_height, page_height - y)}
+        data, used = await _capture_tile(page, clip, fmt, quality)
+        path = f"{out_base}_screenshot_{len(tiles) + 1}.{_EXTENSIONS[used]}"
+        with open(path, "wb") as f:
+            f.write(data)
+        tiles.append({"path": path, "bytes": len(data)})
+        y += tile_height
+
+    if y < page_height:
+        print(f"⚠️ Screenshot of {out_base} cut off after {len(tiles)} tiles "
+              f"({y}/{page_height}px); raise --max-tiles / SCREENSHOT_MAX_TILES to capture it all")
+
+    return {
+        "status": "ok",
+        "format": used,
+        "quality": None if used == "png" else quality,
+        "tiles": tiles,
+        "truncated": y < page_height,
+        "page_height": page_height,
+        "bytes": sum(t["bytes"] for t in tiles),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+async def capture_url(browser, limiter, chapter_url, out_base, **options):
+    """Deferred path: load ``chapter_url`` in a pooled page, then ``capture()`` it."""
+    page = await browser.acquire()
+    try:
+        await limiter.wait(chapter_url)
+        await page.goto(chapter_url)
+        return await capture(page, out_base, **options)
+    except Exception as e:
+        print(f"❌ Screenshot {chapter_url}: {e}")
+        return {"status": "error", "error": str(e)}
+    finally:
+        browser.release(page)
@@ -1,33 +1,66 @@
-import requests
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
 import time
 
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "rl_search"))
+import llm_cache  # noqa: E402
+from llm_cache import LLMCacheMiss, cached_generate  # noqa: E402
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+INPUT_FILE = "scraper/output/chapter1_content.txt"
+OUTPUT_FILE = "chapter1_output.txt"
+
+
+PROMPT_TEMPLATE = "Rephrase this paragraph while retaining meaning:\n\n{text}\n\nRewritten paragraph:"
+
+
+def build_prompt(paragraph):
+    return PROMPT_TEMPLATE.format(text=paragraph)
+
+
 # Function to get response from local Ollama LLM
-def get_ollama_response(prompt, model="llama3"):
-    url = "http://localhost:11434/api/generate"
+def get_ollama_response(prompt, model="llama3", url=OLLAMA_URL, session=None, timeout=None):
     payload = {
         "model": model,
         "prompt": prompt,
         "stream": False
     }
-    response = requests.post(url, json=payload)
+    response = (session or requests).post(url, json=payload, timeout=timeout)
     if response.status_code == 200:
         return response.json()["response"].strip()
     else:
         print(f"Error {response.status_code}: {response.text}")
         return None
 
-def spin_text():
-    input_file = "scraper/output/chapter1_content.txt"
-    output_file = "chapter1_output.txt"
+def rewrite_paragraph(paragraph, model="llama3", url=OLLAMA_URL, session=None, timeout=None):
+    """
+    Rewrite one paragraph through the LLM response cache.
+
+    Returns ``(rewritten, from_cache)``; unchanged paragraphs on a re-run are
+    served from the cache without calling Ollama.
+    """
+    return cached_generate(
+        model,
+        PROMPT_TEMPLATE,
+        paragraph,
+        lambda prompt: get_ollama_response(prompt, model, url, session, timeout),
+    )
 
+def spin_text(input_file=INPUT_FILE, output_file=OUTPUT_FILE):
     with open(input_file, "r", encoding="utf-8") as infile, open(output_file, "w", encoding="utf-8") as outfile:
         paragraphs = infile.read().split('\n\n')
         for idx, paragraph in enumerate(paragraphs, 1):
-            prompt = f"Rephrase this paragraph while retaining meaning:\n\n{paragraph}\n\nRewritten paragraph:"
             try:
                 print(f"Processing paragraph {idx}...")
 
-                rewritten_paragraph = get_ollama_response(prompt)
+                rewritten_paragraph, from_cache = rewrite_paragraph(paragraph)
 
                 if rewritten_paragraph:
                     outfile.write(rewritten_paragraph + "\n\n")
@@ -35,12 +68,206 @@ def spin_text():
                 else:
                     print(f"❌ Failed to rewrite paragraph {idx}, skipping.")
 
-                time.sleep(1.5)  # Pause to avoid overloading your system
+                if not from_cache:
+                    time.sleep(1.5)  # Pause to avoid overloading your system
 
+            except LLMCacheMiss:
+                raise   # replay mode: a missing response is a hard failure, not a flaky request
             except Exception as e:
                 print(f"❌ Error rewriting paragraph {idx}: {e}")
                 time.sleep(1)
 
+
+# ------------------------------
+# Concurrent (asyncio) spin mode
+# ------------------------------
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit driven by observed latency and errors.
+
+    Starts at ``initial`` in-flight requests. Each fast success adds one slot
+    (up to ``max_limit``); an error or a response much slower than the
+    running baseline halves the limit and adds a short back-off delay.
+    """
+
+    def __init__(self, initial=2, max_limit=4, slow_factor=2.0):
+        self.limit = max(1, min(initial, max_limit))
+        self.max_limit = max_limit
+        self.slow_factor = slow_factor
+        self.in_flight = 0
+        self.baseline = None        # EWMA of successful latencies (s)
+        self.backoff = 0.0          # extra delay before the next request (s)
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            delay = self.backoff
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def release(self, latency, ok, sample=True):
+        async with self._cond:
+            self.in_flight -= 1
+            if not sample:
+                # e.g. a cache hit: frees the slot without skewing the latency baseline
+                self._cond.notify_all()
+                return
+            slow = ok and self.baseline is not None and latency > self.baseline * self.slow_factor
+            if not ok or slow:
+                self.limit = max(1, self.limit // 2)
+                self.backoff = min(max(self.backoff * 2, 0.5), 10.0)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1)
+                self.backoff = 0.0
+            if ok:
+                self.baseline = latency if self.baseline is None else 0.8 * self.baseline + 0.2 * latency
+            self._cond.notify_all()
+
+
+def _thread_sessions(pool_size):
+    """
+    Hand out one pooled ``requests.Session`` per worker thread.
+
+    ``requests.Session`` is not thread-safe, so each thread that runs a
+    blocking request gets its own; returns ``(get_session, close_all)``.
+    """
+    local = threading.local()
+    sessions = []
+    sessions_lock = threading.Lock()
+
+    def get_session():
+        session = getattr(local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            local.session = session
+            with sessions_lock:
+                sessions.append(session)
+        return session
+
+    def close_all():
+        with sessions_lock:
+            for session in sessions:
+                session.close()
+            sessions.clear()
+
+    return get_session, close_all
+
+
+async def spin_paragraphs_async(paragraphs, model="llama3", url=OLLAMA_URL,
+                                concurrency=4, retries=2, timeout=300):
+    """
+    Rewrite ``paragraphs`` with up to ``concurrency`` requests in flight.
+
+    Requests are blocking ``requests`` calls run on worker threads, each
+    thread keeping its own keep-alive session. Returns a list aligned with
+    ``paragraphs`` (None where rewriting failed), so callers can write
+    results in original order. In replay mode a cache miss raises
+    ``LLMCacheMiss`` instead of being retried.
+    """
+    limiter = AdaptiveLimiter(initial=min(2, concurrency), max_limit=concurrency)
+    results = [None] * len(paragraphs)
+    get_session, close_sessions = _thread_sessions(pool_size=1)
+
+    def rewrite(paragraph):
+        return rewrite_paragraph(paragraph, model, url, get_session(), timeout)
+
+    async def worker(idx, paragraph):
+        for attempt in range(retries + 1):
+            await limiter.acquire()
+            start = time.perf_counter()
+            ok = False
+            from_cache = False
+            try:
+                rewritten, from_cache = await asyncio.to_thread(rewrite, paragraph)
+                ok = bool(rewritten)
+                if ok:
+                    results[idx] = rewritten
+                    print(f"✅ Rewrote paragraph {idx + 1}")
+                    return
+            except LLMCacheMiss:
+                from_cache = True   # nothing was sent, so don't feed the latency baseline
+                raise
+            except Exception as e:
+                print(f"❌ Error rewriting paragraph {idx + 1} (attempt {attempt + 1}): {e}")
+            finally:
+                await limiter.release(time.perf_counter() - start, ok, sample=not from_cache)
+        print(f"❌ Failed to rewrite paragraph {idx + 1}, skipping.")
+
+    tasks = [asyncio.ensure_future(worker(i, p)) for i, p in enumerate(paragraphs)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        close_sessions()
+    return results
+
+
+def spin_text_concurrent(input_file=INPUT_FILE, output_file=OUTPUT_FILE, concurrency=4, url=OLLAMA_URL):
+    with open(input_file, "r", encoding="utf-8") as infile:
+        paragraphs = infile.read().split('\n\n')
+
+    start = time.perf_counter()
+    results = asyncio.run(spin_paragraphs_async(paragraphs, url=url, concurrency=concurrency))
+
+    with open(output_file, "w", encoding="utf-8") as outfile:
+        for rewritten_paragraph in results:
+            if rewritten_paragraph:
+                outfile.write(rewritten_paragraph + "\n\n")
+
+    done = sum(1 for r in results if r)
+    print(f"✅ Rewrote {done}/{len(paragraphs)} paragraphs in {time.perf_counter() - start:.1f}s")
+    return results
+
+
+def spin_manifest(manifest_path, concurrency=0):
+    """
+    Spin every chapter listed in a crawler manifest.
+
+    Chapters the incremental crawl marked ``"changed": false`` are skipped
+    when their spun output already exists; the rest are written next to the
+    scraped text as ``<slug>_spun.txt``.
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    for chapter in manifest.get("chapters", []):
+        text_path = chapter.get("text_path")
+        if chapter.get("status") == "error" or not text_path:
+            continue
+        spun_path = text_path.replace("_content.txt", "_spun.txt")
+        if chapter.get("changed") is False and os.path.exists(spun_path):
+            print(f"⏭️ {chapter['slug']} unchanged, skipping spin")
+            continue
+
+        print(f"✍️ Spinning {chapter['slug']}...")
+        if concurrency > 0:
+            spin_text_concurrent(text_path, spun_path, concurrency=concurrency)
+        else:
+            spin_text(text_path, spun_path)
+
+
 if __name__ == "__main__":
-    spin_text()
+    parser = argparse.ArgumentParser(description="Rewrite a chapter paragraph by paragraph with Ollama.")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="Rewrite up to N paragraphs in parallel (0 = original sequential mode)")
+    parser.add_argument("--cache-mode", choices=["on", "off", "replay"], default=llm_cache.MODE,
+                        help="LLM response cache: on (default), off, or replay (cached responses only)")
+    parser.add_argument("--manifest", help="Spin every changed chapter listed in a crawler manifest.json")
+    args = parser.parse_args()
+    llm_cache.MODE = args.cache_mode
 
+    if args.manifest:
+        spin_manifest(args.manifest, concurrency=args.concurrency)
+    elif args.concurrency > 0:
+        spin_text_concurrent(concurrency=args.concurrency)
+    else:
+        spin_text()
@@ -0,0 +1,76 @@
+import re
+import shutil
+
+import pytest
+
+from grammar_service import GrammarService, split_into_chunks, split_paragraphs
+
+SAMPLE = (
+    "This is teh first paragraph. It has a \"quote that opens here.\n\n"
+    "The second paragraph closes it\" and repeats teh mistake. "
+    "The writer likes color. The writer also likes colour.\n\n"
+    "Then then the third paragraph starts. Then it ends without a full stop"
+)
+
+
+class _FakeMatch:
+    def __init__(self, offset, length):
+        self.offset = offset
+        self.errorLength = length
+
+
+class _FakeTool:
+    """Flags every "teh" (a paragraph-local rule); ignores text-level rules."""
+
+    def __init__(self, text_level_only=False):
+        self.text_level_only = text_level_only
+
+    def check(self, text):
+        if self.text_level_only:
+            return []
+        return [_FakeMatch(m.start(), 3) for m in re.finditer(r"\bteh\b", text)]
+
+    def close(self):
+        pass
+
+
+def _fake_factory(language, disabled_rules=None, enabled_rules_only=None):
+    return _FakeTool(text_level_only=bool(enabled_rules_only))
+
+
+def test_chunks_cover_text_exactly():
+    text = SAMPLE * 20
+    chunks = split_into_chunks(text, chunk_chars=300)
+    assert "".join(chunk for _, chunk in chunks) == text
+    for start, chunk in chunks:
+        assert text[start:start + len(chunk)] == chunk
+
+
+def test_chunk_offsets_map_back_to_the_original_text():
+    service = GrammarService(pool_size=2, chunk_chars=80, tool_factory=_fake_factory)
+    text = SAMPLE * 5
+    matches = service.check(text)
+    assert [m.offset for m in matches] == [m.start() for m in re.finditer(r"\bteh\b", text)]
+
+    paragraphs = [text[s:e] for s, e in split_paragraphs(text)]
+    per_paragraph = service.check_paragraphs(paragraphs)
+    assert sum(len(m) for m in per_paragraph) == len(matches)
+    service.close()
+
+
+@pytest.mark.skipif(shutil.which("java") is None, reason="LanguageTool needs Java")
+def test_chunked_count_matches_a_single_whole_text_check():
+    language_tool_python = pytest.importorskip("language_tool_python")
+    text = "\n\n".join([SAMPLE] * 6)
+    whole = language_tool_python.LanguageTool("en-US")
+    service = GrammarService(pool_size=2, chunk_chars=400)
+    try:
+        expected = whole.check(text)
+        got = service.check(text)
+        assert len(got) == len(expected), (
+            sorted({m.ruleId for m in expected} ^ {m.ruleId for m in got})
+        )
+        assert sorted(m.offset for m in got) == sorted(m.offset for m in expected)
+    finally:
+        whole.close()
+        service.close()
@@ -0,0 +1,68 @@
+import asyncio
+import os
+
+import pytest
+
+import html_extract
+
+pytestmark = pytest.mark.skipif(not html_extract.available(), reason="lxml not installed")
+
+CHAPTERS = ("Chapter_1.html", "Chapter_2.html")
+
+
+def _read(name):
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", "Book", name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_extracts_content_like_inner_text():
+    title, text = html_extract.extract_content(_read("Chapter_1.html"))
+
+    assert title == "Chapter 1 - The Book"
+    assert text == (
+        "Chapter One\n\n"
+        "The ship came in at dawn, slowly, and the harbour woke.\n\n"
+        "Line one\nline two\nline three\n\n"
+        "First verse\nSecond verse\n"
+        "Name\tPort\nDawn Star\tKingston\n\n"
+        "It was not the end."
+    )
+
+
+def test_script_built_content_is_left_to_the_browser():
+    assert html_extract.extract_content(_read("Chapter_3_js.html")) is None
+
+
+def test_index_links_are_absolute_and_scoped_to_the_content():
+    links = html_extract.extract_links(_read("index.html"), "http://example.org/Book/")
+
+    assert links == [
+        "http://example.org/Book/Chapter_1.html",
+        "http://example.org/Book/Chapter_2.html",
+        "http://example.org/Book/Chapter_1.html#section",
+        "http://example.org/elsewhere.html",
+    ]
+
+
+def test_parity_with_playwright_inner_text(fixture_server):
+    async_api = pytest.importorskip("playwright.async_api")
+
+    async def render_all():
+        async with async_api.async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            page = await browser.new_page()
+            rendered = {}
+            for name in CHAPTERS:
+                await page.goto(f"{fixture_server}/Book/{name}")
+                rendered[name] = await page.locator("#mw-content-text").inner_text()
+            await browser.close()
+            return rendered
+
+    try:
+        rendered = asyncio.run(render_all())
+    except Exception as e:   # browsers not downloaded (playwright install)
+        pytest.skip(f"Chromium unavailable: {e}")
+
+    for name in CHAPTERS:
+        _, text = html_extract.extract_content(_read(name))
+        assert html_extract.normalize_for_parity(text) == html_extract.normalize_for_parity(rendered[name]), name
@@ -0,0 +1,96 @@
+import re
+import time
+
+import pytest
+
+textstat = pytest.importorskip("textstat")
+
+from incremental_scorer import IncrementalScorer  # noqa: E402
+
+
+class _Match:
+    def __init__(self, offset, length):
+        self.offset = offset
+        self.errorLength = length
+
+
+class FakeGrammar:
+    """Paragraph rule: "teh". Text-level rule: "XX" (recorded to check window sizes)."""
+
+    def __init__(self):
+        self.text_level_calls = []
+
+    def check_paragraphs(self, paragraphs):
+        return [[_Match(m.start(), 3) for m in re.finditer(r"\bteh\b", p)] for p in paragraphs]
+
+    def check_text_level(self, text):
+        self.text_level_calls.append(len(text))
+        return [_Match(m.start(), 2) for m in re.finditer(r"\bXX\b", text)]
+
+
+def _document(n=40):
+    return "\n\n".join(
+        f"Paragraph {i} tells teh story of a quiet harbour town. "
+        f"The boats came back at dusk{' XX' if i % 7 == 0 else ''}. Nobody minded the rain."
+        for i in range(n)
+    )
+
+
+def _scorer(grammar, debounce=60.0):
+    return IncrementalScorer(debounce_seconds=debounce, grammar_factory=lambda: grammar)
+
+
+TEXTS = [
+    "Short text.",
+    "The cat sat on the mat. It was happy!\n\nA second paragraph follows here; it is longer, "
+    "with several clauses, and some unusually polysyllabic vocabulary.",
+    _document(12),
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_readability_matches_textstat(text):
+    scorer = _scorer(FakeGrammar())
+    assert scorer.score(text)["readability"] == textstat.flesch_reading_ease(text)
+
+
+def test_readability_matches_textstat_after_an_edit():
+    scorer = _scorer(FakeGrammar())
+    text = _document(12)
+    scorer.score(text)
+    edited = text.replace("Paragraph 5 tells", "Paragraph 5 extraordinarily narrates", 1)
+    assert scorer.score(edited)["readability"] == textstat.flesch_reading_ease(edited)
+    assert scorer.last_stats["rescored"] == 1
+
+
+def test_edit_rechecks_only_a_window_for_text_level_rules():
+    grammar = FakeGrammar()
+    scorer = _scorer(grammar)
+    text = _document()
+    first = scorer.score(text)
+    assert scorer.last_stats["text_level"] == "full"
+
+    edited = text.replace("Paragraph 20 tells", "Paragraph 20 XX tells", 1)
+    second = scorer.score(edited)
+    assert scorer.last_stats["text_level"] == "window"
+    assert grammar.text_level_calls[-1] < len(edited) / 10
+    assert second["errors"] == first["errors"] + 1
+
+    # Same error count as a from-scratch scorer
+    assert second["errors"] == _scorer(FakeGrammar()).score(edited)["errors"]
+
+
+def test_debounced_full_pass_makes_the_count_exact():
+    grammar = FakeGrammar()
+    scorer = _scorer(grammar, debounce=0.01)
+    text = _document()
+    scorer.score(text)
+    edited = text.replace("Paragraph 3 tells", "Paragraph 3 XX tells", 1)
+    scorer.score(edited)
+
+    deadline = time.monotonic() + 2
+    while grammar.text_level_calls[-1] != len(edited) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert grammar.text_level_calls[-1] == len(edited)
+    scorer.score(edited)
+    assert scorer.last_stats["text_level"] == "cached"
@@ -0,0 +1,64 @@
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+import metrics_store  # noqa: E402
+from leaderboard_service import LeaderboardService  # noqa: E402
+from metrics_store import MetricsStore  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.duckdb"), import_legacy_files=False, keep_open_seconds=60)
+    yield store
+    store.close()
+
+
+def _fill(store):
+    # Version 1's best run has no readability: its row must not borrow
+    # readability from the weaker run
+    store.append(1, 0.4, similarity=0.1, readability=70.0, errors=5, reward_version="smart-v1")
+    store.append(1, 0.9, similarity=0.8, readability=None, errors=1, reward_version="smart-v1")
+    store.append(2, 0.6, similarity=0.5, readability=40.0, errors=2, reward_version="smart-v1")
+    store.append(3, None, reward_version="smart-v1")
+
+
+def test_leaderboard_returns_whole_best_rows(store):
+    _fill(store)
+
+    rows = store.leaderboard()
+
+    assert [(r["version"], r["score"], r["runs"]) for r in rows] == [(1, 0.9, 2), (2, 0.6, 1)]
+    assert (rows[0]["similarity"], rows[0]["readability"], rows[0]["errors"]) == (0.8, None, 1)
+
+
+def test_seeded_leaderboard_matches_the_store(store):
+    _fill(store)
+
+    best = {r["version"]: r for r in LeaderboardService(store).view("smart-v1")["leaderboard"]}
+
+    assert best[1]["score"] == 0.9 and best[1]["readability"] is None and best[1]["errors"] == 1
+    assert set(best) == {1, 2}
+
+
+def test_calls_share_one_connection_until_idle(store, monkeypatch):
+    opened = []
+    connect = duckdb.connect
+    monkeypatch.setattr(metrics_store.duckdb, "connect", lambda path: opened.append(path) or connect(path))
+
+    store.close()
+    _fill(store)
+    store.leaderboard()
+    assert len(opened) == 1
+
+    store.close()
+    store.count()
+    assert len(opened) == 2
+
+
+def test_zero_keep_open_releases_the_file_after_each_call(tmp_path):
+    store = MetricsStore(str(tmp_path / "metrics.duckdb"), import_legacy_files=False, keep_open_seconds=0)
+
+    store.append(1, 0.5)
+
+    assert store._conn is None
+    assert store.count() == 1
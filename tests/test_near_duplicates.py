@@ -0,0 +1,69 @@
+import hashlib
+import importlib
+
+import numpy as np
+import pytest
+
+from embedding_cache import aligned_similarity, split_for_embedding
+
+MODEL_WINDOW = 256   # MiniLM only reads this many tokens
+
+
+def fake_embed(texts):
+    """Bag-of-words vectors that, like MiniLM, ignore everything past the model window."""
+    out = []
+    for text in texts:
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.split()[:MODEL_WINDOW]:
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        out.append(vector / max(np.linalg.norm(vector), 1e-12))
+    return out
+
+
+def _words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+HEAD = _words("head", 300)
+VERSION_A = HEAD + "\n\n" + _words("ending", 120)
+VERSION_B = HEAD + "\n\n" + _words("twist", 120)
+
+
+def test_chunks_stay_inside_the_model_window():
+    chunks = split_for_embedding(VERSION_A)
+
+    assert all(len(c.split()) <= 128 for c in chunks)
+    assert " ".join(chunks).split() == VERSION_A.split()
+
+
+def test_whole_text_embeddings_cannot_tell_different_tails_apart():
+    a, b = fake_embed([VERSION_A, VERSION_B])
+    assert float(a @ b) > 0.99
+
+
+def test_different_tails_are_not_near_duplicates():
+    chunks_a = fake_embed(split_for_embedding(VERSION_A))
+    chunks_b = fake_embed(split_for_embedding(VERSION_B))
+
+    assert aligned_similarity(chunks_a, chunks_a) == pytest.approx(1.0)
+    assert aligned_similarity(chunks_a, chunks_b) < 0.97
+
+
+def test_filter_keeps_versions_with_different_tails(monkeypatch):
+    pytest.importorskip("chromadb")
+    import chromadb
+    import version_store
+
+    monkeypatch.setattr(version_store, "_client", chromadb.EphemeralClient())
+    monkeypatch.setattr(version_store, "_collections", {})
+    try:
+        rephrasing_loop = importlib.import_module("rephrasing_loop")
+    except ImportError as e:
+        pytest.skip(f"rephrasing loop dependencies missing: {e}")
+
+    assert rephrasing_loop.NearDuplicateFilter().filter([VERSION_A, VERSION_A]) == [VERSION_A, VERSION_A]
+
+    dedup = rephrasing_loop.NearDuplicateFilter(0.97, check_store=False, embed=fake_embed)
+    assert dedup.filter([VERSION_A]) == [VERSION_A]
+    assert dedup.filter([VERSION_B, VERSION_A]) == [VERSION_B]
+    assert dedup.skipped == 1
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import html_extract
+import playwright_scraper
+
+pytestmark = pytest.mark.skipif(not html_extract.available(), reason="lxml not installed")
+
+
+def _fixture_text(name):
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", "Book", name), encoding="utf-8") as f:
+        return html_extract.extract_content(f.read())[1]
+
+
+def _crawl(**options):
+    options.setdefault("screenshots", "off")
+    options.setdefault("per_host_per_second", 0)
+    return asyncio.run(playwright_scraper.crawl(**options))
+
+
+def test_index_crawl_over_http_never_launches_the_browser(fixture_server, tmp_path):
+    manifest = _crawl(index_url=f"{fixture_server}/Book/", book_dir=str(tmp_path), backend="http")
+
+    assert [c["url"] for c in manifest["chapters"]] == [
+        f"{fixture_server}/Book/Chapter_1.html",
+        f"{fixture_server}/Book/Chapter_2.html",
+    ]
+    assert manifest["browser_launches"] == 0
+    for chapter, name in zip(manifest["chapters"], ("Chapter_1.html", "Chapter_2.html")):
+        assert chapter["backend"] == "http"
+        with open(chapter["text_path"], encoding="utf-8") as f:
+            assert f.read() == _fixture_text(name)
+    with open(tmp_path / "manifest.json", encoding="utf-8") as f:
+        assert json.load(f)["changed"] == 2
+
+
+def test_incremental_recrawl_skips_unchanged_chapters(fixture_server, tmp_path, monkeypatch):
+    ingest_state = playwright_scraper.IngestState
+    monkeypatch.setattr(playwright_scraper, "IngestState", lambda: ingest_state(str(tmp_path / "state.sqlite3")))
+    urls = [f"{fixture_server}/Book/Chapter_1.html", f"{fixture_server}/Book/Chapter_2.html"]
+
+    first = _crawl(chapter_urls=urls, book_dir=str(tmp_path), incremental=True)
+    second = _crawl(chapter_urls=urls, book_dir=str(tmp_path), incremental=True)
+
+    assert first["changed"] == 2
+    assert second["changed"] == 0
+    assert [c["status"] for c in second["chapters"]] == ["unchanged", "unchanged"]
+
+
+def test_default_run_writes_the_text_the_spin_step_reads(fixture_server, tmp_path):
+    playwright_scraper.scrape_default(
+        f"{fixture_server}/Book/Chapter_1.html", str(tmp_path), screenshots="off", per_host_per_second=0,
+    )
+
+    with open(tmp_path / playwright_scraper.LEGACY_TEXT_NAME, encoding="utf-8") as f:
+        assert f.read() == _fixture_text("Chapter_1.html")
+
+
+def test_script_built_page_falls_back_to_the_browser(fixture_server, tmp_path):
+    pytest.importorskip("playwright")
+    manifest = _crawl(chapter_urls=[f"{fixture_server}/Book/Chapter_3_js.html"], book_dir=str(tmp_path))
+
+    chapter = manifest["chapters"][0]
+    assert chapter["backend"] == "browser"
+    assert manifest["browser_launches"] == 1
+    with open(chapter["text_path"], encoding="utf-8") as f:
+        assert f.read().strip() == "Built by script."
+
+
+def test_default_screenshot_mode_keeps_http_crawls_browserless(fixture_server, tmp_path):
+    manifest = asyncio.run(playwright_scraper.crawl(
+        [f"{fixture_server}/Book/Chapter_2.html"], book_dir=str(tmp_path), per_host_per_second=0,
+    ))
+
+    assert manifest["screenshots"]["mode"] == "off"
+    assert manifest["browser_launches"] == 0
@@ -0,0 +1,40 @@
+import sqlite3
+
+import pytest
+
+from reward_logger import RewardLogWriter
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = RewardLogWriter(str(tmp_path / "rewards.db"), flush_rows=1000, flush_seconds=3600)
+    yield writer
+    writer.close()
+
+
+def test_logged_rows_are_buffered_until_flushed(writer):
+    writer.log("a", "ref", {"score": 1.0})
+    writer.log("b", "ref", {"score": 2.0})
+    assert writer.flushes == 0
+
+    assert [row[1] for row in writer.top()] == ["b", "a"]
+    assert writer.flushes == 1
+
+
+def test_a_failed_flush_keeps_the_rows_buffered(writer, tmp_path):
+    writer.log("a", "ref", {"score": 1.0})
+    writer.log("b", "ref", {"score": 2.0})
+
+    # Another writer holds the write lock: the flush fails with "database is locked"
+    writer._conn.execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(str(tmp_path / "rewards.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        writer.flush()
+    assert not writer._conn.in_transaction
+    assert writer.flushes == 0
+    other.execute("ROLLBACK")
+    other.close()
+
+    assert writer.flush() == 2
+    assert sorted(row[1] for row in writer.fetch()) == ["a", "b"]
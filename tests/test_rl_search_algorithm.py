@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip("chromadb")
+import rl_search_algorithm  # noqa: E402
+import version_store  # noqa: E402
+from reward_registry import current_version  # noqa: E402
+
+
+class _FakeCollection:
+    """The slice of a Chroma collection the re-scorer uses, counting reads."""
+
+    name = "fake_versions"
+
+    def __init__(self, metadatas):
+        self.rows = {f"v{i}": dict(m) for i, m in enumerate(metadatas)}
+        self.gets = 0
+        self.counts = 0
+
+    def get(self, ids=None, limit=None, offset=0, include=()):
+        self.gets += 1
+        keys = list(ids) if ids is not None else list(self.rows)[offset:offset + (limit or len(self.rows))]
+        return {"ids": keys, "metadatas": [self.rows[k] for k in keys], "documents": [f"text {k}" for k in keys]}
+
+    def count(self):
+        self.counts += 1
+        return len(self.rows)
+
+    def update(self, ids, metadatas):
+        for doc_id, meta in zip(ids, metadatas):
+            self.rows[doc_id] = meta
+
+
+@pytest.fixture(autouse=True)
+def best_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(version_store, "_best_index", version_store.TopKIndex(str(tmp_path / "best.sqlite3")))
+
+
+def _fake_scores(texts, reward_version):
+    return [{"score": 1.0, "similarity": 0.5, "readability": 60.0, "errors": 0, "reward_version": reward_version}
+            for _ in texts]
+
+
+def test_unscored_versions_are_left_for_on_demand_scoring(monkeypatch):
+    def no_scoring(*args, **kwargs):
+        raise AssertionError("the background sweep must not load the scoring models")
+
+    monkeypatch.setattr(rl_search_algorithm, "score_texts", no_scoring)
+    collection = _FakeCollection([{"version": 1}, {"version": 2}])
+
+    rescorer = rl_search_algorithm.BackgroundRescorer(collection)
+    rescorer.run_until_clean()
+
+    assert rescorer.clean and rescorer.rescored == 0
+    assert not version_store.get_best_index().is_complete(collection.name, current_version())
+
+
+def test_stale_versions_are_rescored_then_polling_is_a_count(monkeypatch):
+    monkeypatch.setattr(rl_search_algorithm, "score_texts", _fake_scores)
+    collection = _FakeCollection([{"version": 1, "score": 3.0, "reward_version": "leaderboard-v0"}])
+
+    rescorer = rl_search_algorithm.BackgroundRescorer(collection)
+    assert rescorer.run_until_clean() == 1
+    assert collection.rows["v0"]["reward_version"] == current_version()
+
+    gets = collection.gets
+    for _ in range(3):
+        rescorer.step()
+    assert collection.gets == gets   # clean and unchanged: no metadata pages read
+
+    collection.rows["v1"] = {"version": 2, "score": 2.0, "reward_version": "leaderboard-v0"}
+    rescorer.step()
+    assert collection.rows["v1"]["reward_version"] == current_version()
@@ -0,0 +1,33 @@
+import asyncio
+
+import screenshot_stage
+
+
+class _FakePage:
+    viewport_size = {"width": 100, "height": 100}
+
+    def __init__(self, height):
+        self.height = height
+
+    async def evaluate(self, script):
+        return self.height
+
+    async def screenshot(self, clip, full_page, type, quality=None):
+        return b"x" * clip["height"]
+
+
+def test_cap_cuts_long_pages_with_a_warning(tmp_path, capsys):
+    shot = asyncio.run(screenshot_stage.capture(_FakePage(450), str(tmp_path / "ch"), fmt="png", max_tiles=2))
+
+    assert len(shot["tiles"]) == 2
+    assert shot["truncated"] is True
+    assert "cut off after 2 tiles" in capsys.readouterr().out
+
+
+def test_zero_cap_captures_the_whole_page(tmp_path, capsys):
+    shot = asyncio.run(screenshot_stage.capture(_FakePage(450), str(tmp_path / "ch"), fmt="png", max_tiles=0))
+
+    assert len(shot["tiles"]) == 5
+    assert shot["truncated"] is False
+    assert shot["bytes"] == 450
+    assert "cut off" not in capsys.readouterr().out
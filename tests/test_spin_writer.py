@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import llm_cache
+import spin_writer_ollama
+from llm_cache import LLMCache, LLMCacheMiss
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    """Answers /api/generate like Ollama: upper-cases the paragraph after a short delay."""
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        paragraph = payload["prompt"].split("\n\n")[1]
+        with server.lock:
+            server.requests.append(paragraph)
+            server.in_flight += 1
+            server.peak = max(server.peak, server.in_flight)
+            fail = server.failures.get(paragraph, 0)
+            if fail:
+                server.failures[paragraph] = fail - 1
+        time.sleep(0.05)
+        with server.lock:
+            server.in_flight -= 1
+        if fail:
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b"boom")
+            return
+        body = json.dumps({"response": paragraph.upper()}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ollama():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllama)
+    server.lock = threading.Lock()
+    server.requests, server.failures = [], {}
+    server.in_flight = server.peak = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    store = LLMCache(path=str(tmp_path / "llm.sqlite3"))
+    monkeypatch.setattr(llm_cache, "_cache", store)
+    return store
+
+
+def test_concurrent_results_keep_paragraph_order(ollama, monkeypatch):
+    monkeypatch.setattr(llm_cache, "MODE", "off")
+    paragraphs = [f"paragraph {i}" for i in range(12)]
+
+    results = asyncio.run(spin_writer_ollama.spin_paragraphs_async(
+        paragraphs, url=ollama.url, concurrency=4, timeout=5))
+
+    assert results == [p.upper() for p in paragraphs]
+    assert 1 < ollama.peak <= 4
+
+
+def test_failed_requests_are_retried(ollama, monkeypatch):
+    monkeypatch.setattr(llm_cache, "MODE", "off")
+    ollama.failures["flaky"] = 1
+
+    results = asyncio.run(spin_writer_ollama.spin_paragraphs_async(
+        ["steady", "flaky"], url=ollama.url, concurrency=2, retries=2, timeout=5))
+
+    assert results == ["STEADY", "FLAKY"]
+    assert ollama.requests.count("flaky") == 2
+
+
+def test_replay_miss_propagates_without_calling_ollama(ollama, cache, monkeypatch):
+    monkeypatch.setattr(llm_cache, "MODE", "on")
+    asyncio.run(spin_writer_ollama.spin_paragraphs_async(["cached"], url=ollama.url, timeout=5))
+    sent = len(ollama.requests)
+
+    monkeypatch.setattr(llm_cache, "MODE", "replay")
+    with pytest.raises(LLMCacheMiss):
+        asyncio.run(spin_writer_ollama.spin_paragraphs_async(
+            ["cached", "not cached"], url=ollama.url, concurrency=2, retries=3, timeout=5))
+
+    assert len(ollama.requests) == sent
@@ -0,0 +1,184 @@
+import json
+import sqlite3
+
+import pytest
+
+from supabase_outbox import SupabaseOutbox
+
+
+class FakeTables:
+    """
+    In-memory stand-in for the Supabase table API: ``upsert`` with
+    ``ignore_duplicates`` keeps the first row per ``id``. ``fail`` raises
+    before writing; ``lose_ack`` writes, then raises (a response lost in
+    transit), as many times as set.
+    """
+
+    def __init__(self, token=None, log=None):
+        self.token = token
+        self.rows = {}
+        self.fail = 0
+        self.lose_ack = 0
+        self.requests = 0
+        self.log = log if log is not None else []
+        self.expired = set()
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+class JWTError(Exception):
+    code = "PGRST301"
+
+
+class _Query:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+
+    def upsert(self, rows, on_conflict="", ignore_duplicates=False):
+        assert on_conflict == "id" and ignore_duplicates
+        self.rows = rows
+        return self
+
+    def execute(self):
+        db = self.db
+        db.requests += 1
+        if db.token in db.expired:
+            raise JWTError("JWT expired")
+        if db.fail:
+            db.fail -= 1
+            raise ConnectionError("Supabase unavailable")
+        for row in self.rows:
+            db.rows.setdefault((self.name, row["id"]), row)
+            db.log.append((db.token, row["id"]))
+        if db.lose_ack:
+            db.lose_ack -= 1
+            raise TimeoutError("response lost")
+
+
+@pytest.fixture
+def make_outbox(tmp_path):
+    outboxes = []
+
+    def make(client, **options):
+        options.setdefault("base_backoff", 0.0)
+        outbox = SupabaseOutbox(client, path=str(tmp_path / "outbox.sqlite3"), **options)
+        outboxes.append(outbox)
+        return outbox
+
+    yield make
+    for outbox in outboxes:
+        outbox.stop()
+
+
+def test_rows_get_client_ids_and_failed_batches_are_retried(make_outbox):
+    db = FakeTables()
+    db.fail = 1
+    outbox = make_outbox(db)
+
+    ids = [outbox.enqueue("reward_logs", {"user_id": "u1", "version": v}) for v in (1, 2)]
+    assert outbox.drain_once() == 0
+    assert outbox.status()["depth"] == 2
+
+    assert outbox.flush(timeout=5)
+    assert sorted(key[1] for key in db.rows) == sorted(ids)
+    assert outbox.status()["failures"] == 1
+
+
+def test_rows_are_dead_lettered_after_max_attempts_and_can_be_requeued(make_outbox):
+    db = FakeTables()
+    db.fail = 10
+    outbox = make_outbox(db, max_attempts=2)
+    outbox.enqueue("documents", {"user_id": "u1", "version": 1})
+
+    for _ in range(3):
+        outbox.drain_once()
+    status = outbox.status()
+    assert (status["depth"], status["dead"]) == (0, 1)
+    assert "Supabase unavailable" in status["last_error"]
+
+    db.fail = 0
+    assert outbox.requeue_dead() == 1
+    assert outbox.flush(timeout=5)
+    assert len(db.rows) == 1
+
+
+def test_a_retry_after_a_lost_response_does_not_duplicate_the_row(make_outbox):
+    db = FakeTables()
+    db.lose_ack = 1
+    outbox = make_outbox(db)
+    row_id = outbox.enqueue("documents", {"user_id": "u1", "version": 1})
+
+    assert outbox.drain_once() == 0   # written, but the client saw an error
+    assert outbox.drain_once() == 1
+    assert outbox.status()["depth"] == 0
+    assert db.requests == 2
+    assert [r for _, r in db.log] == [row_id, row_id]   # sent twice...
+    assert list(db.rows) == [("documents", row_id)]     # ...stored once
+
+
+def test_rows_are_sent_with_the_token_they_were_queued_with(make_outbox):
+    log = []
+    shared = FakeTables(token="whoever-is-signed-in-now", log=log)
+    outbox = make_outbox(shared, client_for_token=lambda token: FakeTables(token, log))
+
+    alice = outbox.enqueue("documents", {"user_id": "alice", "version": 1}, "alice", "alice-jwt")
+    bob = outbox.enqueue("documents", {"user_id": "bob", "version": 1}, "bob", "bob-jwt")
+    service = outbox.enqueue("reward_logs", {"user_id": "carol", "version": 1})
+
+    assert outbox.flush(timeout=5)
+    assert sorted(log) == sorted([
+        ("alice-jwt", alice), ("bob-jwt", bob), ("whoever-is-signed-in-now", service),
+    ])
+
+
+def test_tokens_are_not_stored_and_rows_wait_for_a_fresh_one(make_outbox, tmp_path):
+    log = []
+    expired = {"old-jwt"}
+
+    def client_for_token(token):
+        db = FakeTables(token, log)
+        db.expired = expired
+        return db
+
+    outbox = make_outbox(FakeTables(), client_for_token=client_for_token, max_attempts=1)
+    row_id = outbox.enqueue("documents", {"user_id": "alice", "version": 1}, "alice", "old-jwt")
+    assert not any(b"old-jwt" in f.read_bytes() for f in tmp_path.glob("outbox.sqlite3*"))
+
+    # An expired token neither uses up attempts nor dead-letters the row
+    for _ in range(3):
+        assert outbox.drain_once() == 0
+    status = outbox.status()
+    assert (status["depth"], status["dead"], status["awaiting_auth"]) == (1, 0, 1)
+
+    # After a restart the token is gone; the row waits for the owner's next one
+    outbox.stop()
+    restarted = make_outbox(FakeTables(), client_for_token=client_for_token)
+    assert restarted.drain_once() == 0
+    assert restarted.status()["awaiting_auth"] == 1
+
+    restarted.set_token("alice", "new-jwt")
+    assert restarted.flush(timeout=5)
+    assert log == [("new-jwt", row_id)]
+
+
+def test_legacy_outbox_tokens_are_dropped_and_rows_kept_by_owner(make_outbox, tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "outbox.sqlite3"))
+    conn.execute("""
+    CREATE TABLE outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, queue TEXT NOT NULL, table_name TEXT NOT NULL,
+        payload TEXT NOT NULL, enqueued_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL, last_error TEXT, dead INTEGER NOT NULL DEFAULT 0, access_token TEXT
+    )""")
+    conn.execute(
+        "INSERT INTO outbox (queue, table_name, payload, enqueued_at, next_attempt_at, access_token) "
+        "VALUES ('default', 'documents', ?, 0, 0, 'legacy-jwt')",
+        (json.dumps({"id": "r1", "user_id": "alice"}),),
+    )
+    conn.commit()
+    conn.close()
+
+    outbox = make_outbox(FakeTables())
+    columns = {row[1] for row in outbox._conn.execute("PRAGMA table_info(outbox)")}
+    assert "access_token" not in columns
+    assert outbox.status()["awaiting_auth"] == 1
@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip("chromadb")
+import chromadb  # noqa: E402
+
+import version_store  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """version_store on a throwaway Chroma directory, counters and top-K index."""
+    monkeypatch.setattr(version_store, "_client", chromadb.PersistentClient(path=str(tmp_path / "chroma")))
+    monkeypatch.setattr(version_store, "_collections", {})
+    monkeypatch.setattr(version_store, "_counter", version_store.VersionCounter(str(tmp_path / "counters.sqlite3")))
+    monkeypatch.setattr(version_store, "_best_index", version_store.TopKIndex(str(tmp_path / "best.sqlite3")))
+    return version_store
+
+
+def test_normalize_coerces_whole_numbers_and_rejects_fractions():
+    assert version_store.normalize_metadata({"version": "3", "errors": 2.0, "score": "0.5"}) == {
+        "version": 3, "errors": 2, "score": 0.5,
+    }
+    with pytest.raises(ValueError):
+        version_store.normalize_metadata({"version": "3.7"})
+    assert "errors" not in version_store.normalize_metadata({"version": 1, "errors": "2.5"})
+
+
+def test_tenant_writes_land_where_they_are_read_and_counted(store, monkeypatch):
+    monkeypatch.setattr(store, "LAYOUT", "tenant")
+    collection = store.collection_for(user_id="user-1")
+    version = store.allocate_version(collection.name, collection)
+
+    store.store_version("Draft.", version, embedding=[1.0, 0.0, 0.0], collection=collection, user_id="user-1")
+
+    assert collection.name != store.COLLECTION_NAME
+    assert store.count_versions(collection) == 1
+    assert [r["version"] for r in store.list_versions(collection=collection)] == [version]
+    assert store.allocate_version(collection.name, collection) == version + 1
+
+
+def test_legacy_string_versions_are_read_as_ints_and_migrated(store):
+    collection = store.get_collection()
+    collection.add(ids=["version_3"], documents=["Old."], embeddings=[[0.0, 1.0, 0.0]],
+                   metadatas=[{"version": "3", "date": "2025-07-02 16:00:00"}])
+
+    assert store.find_versions(collection=collection)[0]["version"] == 3
+    assert store.migrate_metadata(collection) == 1
+    meta = collection.get(ids=["version_3"], include=["metadatas"])["metadatas"][0]
+    assert meta["version"] == 3 and isinstance(meta["created_at"], int)
+
+
+def test_a_lower_score_for_an_indexed_version_needs_a_rebuild(tmp_path):
+    index = version_store.TopKIndex(str(tmp_path / "best.sqlite3"), k=2)
+    rows = [{"id": f"v{i}", "collection": "c", "version": i, "score": s} for i, s in enumerate((0.9, 0.8, 0.7))]
+    index.rebuild("c", "r1", rows)
+    assert [r["id"] for r in index.top("c", "r1", k=2)] == ["v0", "v1"]   # v2 trimmed
+
+    index.offer("c", "r1", "v0", "c", 0, 0.95)   # a higher score keeps the entry exact
+    assert index.is_complete("c", "r1")
+
+    index.offer("c", "r1", "v0", "c", 0, 0.1)    # v2 (0.7) now belongs in the top-K
+    assert not index.is_complete("c", "r1")
+    index.mark_complete("c", "r1")               # a sweep without a rebuild does not fix it
+    assert not index.is_complete("c", "r1")
+
+    rows[0]["score"] = 0.1
+    index.rebuild("c", "r1", rows)
+    assert index.is_complete("c", "r1")
+    assert [r["id"] for r in index.top("c", "r1", k=2)] == ["v1", "v2"]